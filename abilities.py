@@ -0,0 +1,178 @@
+"""
+Local ability dictionary: gameID -> {"name", "icon", "school"}, shared by all
+scripts and kept across runs in one JSON file.
+
+Event queries ask for bare abilityGameIDs (no translate: true), so pages stay
+small; names are looked up here only when something is printed. Missing ids are
+filled lazily: fill_from_report() takes a report's whole masterData ability list
+in one query (the only source that also has the school), and resolve() asks
+gameData for whatever is still unknown, many ids per query via aliases. Ids the
+API doesn't know are remembered as unnamed so they aren't asked for again.
+Offline, or without credentials, lookups just return what is already cached,
+except that a report bundle carries its report's ability list (bundle.py).
+
+WCL_ABILITY_CACHE picks the file (default abilities.json).
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import requests
+
+import wcl
+
+ABILITY_CACHE = os.getenv("WCL_ABILITY_CACHE", "abilities.json")
+
+# gameData aliases per query
+BATCH = 50
+
+REPORT_ABILITIES_QUERY = """
+query($code: String!) {
+  reportData {
+    report(code: $code) {
+      masterData { abilities { gameID name icon type } }
+    }
+  }
+}
+"""
+
+
+def report_abilities(headers: Dict[str, str], code: str, api_url: str = wcl.API_URL) -> Optional[List[Dict[str, Any]]]:
+    """
+    The report's masterData ability list, or None when it can't be fetched.
+    """
+    try:
+        data = wcl.gql(headers, REPORT_ABILITIES_QUERY, {"code": code}, api_url=api_url)
+    except (RuntimeError, requests.RequestException):  # offline (wcl.OfflineError), no credentials, API error
+        return None
+    return ((data["reportData"]["report"] or {}).get("masterData") or {}).get("abilities") or []
+
+
+class AbilityDictionary:
+    def __init__(self, path: str = ABILITY_CACHE):
+        self.path = path
+        self.entries: Dict[int, Dict[str, Any]] = {}
+        self.reports: Set[str] = set()
+        self._dirty = False
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            self.entries = {int(k): v for k, v in (data.get("abilities") or {}).items()}
+            self.reports = set(data.get("reports") or [])
+
+    def get(self, ability_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        return self.entries.get(ability_id) if isinstance(ability_id, int) else None
+
+    def name(self, ability_id: Optional[int], default: Optional[str] = None) -> Optional[str]:
+        entry = self.get(ability_id)
+        return (entry or {}).get("name") or default
+
+    def _put(self, ability_id: int, name: Optional[str], icon: Optional[str] = None, school: Optional[int] = None) -> None:
+        old = self.entries.get(ability_id) or {}
+        new = {
+            "name": name or old.get("name"),
+            "icon": icon or old.get("icon"),
+            "school": school if school is not None else old.get("school"),
+        }
+        if new != old:
+            self.entries[ability_id] = new
+            self._dirty = True
+
+    def fill_from_report(self, headers: Dict[str, str], code: str, api_url: str = wcl.API_URL) -> int:
+        """
+        Adds every ability the report's masterData lists (once per report). Returns how many it listed.
+        A backend that carries the list (a bundle) answers instead of the API.
+        """
+        with self._lock:
+            if code in self.reports:
+                return 0
+            listed = getattr(wcl.get_backend(), "report_abilities", None)
+            abilities = listed(code) if listed is not None else None
+            if abilities is None:
+                abilities = report_abilities(headers, code, api_url=api_url)
+            if abilities is None:
+                return 0
+            for a in abilities:
+                if isinstance(a, dict) and isinstance(a.get("gameID"), int):
+                    self._put(a["gameID"], a.get("name"), a.get("icon"), a.get("type"))
+            self.reports.add(code)
+            self._dirty = True
+            self.save()
+            return len(abilities)
+
+    def listing(self, ability_ids: Iterable[Optional[int]]) -> List[Dict[str, Any]]:
+        """
+        Known entries for ability_ids in masterData's shape ({gameID, name, icon, type}).
+        """
+        out = []
+        for i in sorted({i for i in ability_ids if isinstance(i, int)}):
+            entry = self.entries.get(i)
+            if entry and entry.get("name"):
+                out.append({"gameID": i, "name": entry["name"], "icon": entry.get("icon"), "type": entry.get("school")})
+        return out
+
+    def resolve(
+        self,
+        headers: Dict[str, str],
+        ability_ids: Iterable[Optional[int]],
+        api_url: str = wcl.API_URL,
+    ) -> Dict[int, Optional[str]]:
+        """
+        {id: name or None}, querying gameData only for ids never seen before.
+        """
+        ids = {i for i in ability_ids if isinstance(i, int)}
+        with self._lock:
+            missing = sorted(i for i in ids if i not in self.entries)
+            for n in range(0, len(missing), BATCH):
+                chunk = missing[n:n + BATCH]
+                fields = "\n".join(f"    a{i}: ability(id: {i}) {{ id name icon }}" for i in chunk)
+                try:
+                    data = wcl.gql(headers, f"query {{\n  gameData {{\n{fields}\n  }}\n}}", {}, api_url=api_url)
+                except (RuntimeError, requests.RequestException):
+                    break
+                game = data.get("gameData") or {}
+                for i in chunk:
+                    a = game.get(f"a{i}") or {}
+                    self._put(i, a.get("name"), a.get("icon"))
+                    if i not in self.entries:  # unknown to the API: don't ask again
+                        self.entries[i] = {"name": None, "icon": None, "school": None}
+                        self._dirty = True
+            self.save()
+        return {i: self.name(i) for i in ids}
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        data = {
+            "reports": sorted(self.reports),
+            "abilities": {str(k): v for k, v in sorted(self.entries.items())},
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+_DICTIONARY: Optional[AbilityDictionary] = None
+
+
+def get_dictionary() -> AbilityDictionary:
+    global _DICTIONARY
+    if _DICTIONARY is None:
+        _DICTIONARY = AbilityDictionary()
+    return _DICTIONARY
+
+
+def ability_names(headers: Dict[str, str], ability_ids: Iterable[Optional[int]], code: Optional[str] = None) -> Dict[int, Optional[str]]:
+    """
+    Names for display from the shared dictionary; with code, the report's ability list is
+    loaded first so most lookups need no gameData query.
+    """
+    d = get_dictionary()
+    ids = list(ability_ids)
+    if code is not None and any(isinstance(i, int) and i not in d.entries for i in ids):
+        d.fill_from_report(headers, code)
+    return d.resolve(headers, ids)
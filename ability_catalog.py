@@ -0,0 +1,216 @@
+"""
+Per-fight ability catalog, collected as a side effect of any stream pass.
+
+For each (ability, event type, source side, target side) we keep the count,
+first and last timestamp and per-target counts. Sides are "player" (the fight's
+friendlyPlayers), "enemy" (its enemyNPCs) or "other" (pets, environment, ...).
+Once a pull has been streamed, "when did X first happen", "did X happen at all"
+and "which pulls can contain X" are dictionary lookups. Catalogs are saved per
+report as JSON so later runs can skip fights that cannot match without fetching.
+"""
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from wcl import fight_player_ids
+
+CATALOG_DIR = os.getenv("WCL_CATALOG_DIR", "catalogs")
+
+Key = Tuple[int, str, str, str]
+
+
+def _ability_id(e: Dict[str, Any]) -> Optional[int]:
+    abid = e.get("abilityGameID")
+    if isinstance(abid, int):
+        return abid
+    ab = e.get("ability")
+    if isinstance(ab, dict):
+        for k in ("gameID", "id", "guid"):
+            if isinstance(ab.get(k), int):
+                return ab[k]
+    return None
+
+
+class AbilityCatalog:
+    def __init__(self, fight: Dict[str, Any]):
+        self.fight_id = fight.get("id")
+        self.players: Set[int] = fight_player_ids(fight)
+        self.enemies: Set[int] = {
+            n["id"] for n in (fight.get("enemyNPCs") or [])
+            if isinstance(n, dict) and isinstance(n.get("id"), int)
+        }
+        self.entries: Dict[Key, Dict[str, Any]] = {}
+        self.names: Dict[int, str] = {}
+
+    def side(self, actor_id: Any) -> str:
+        if actor_id in self.players:
+            return "player"
+        if actor_id in self.enemies:
+            return "enemy"
+        return "other"
+
+    def add_event(self, e: Dict[str, Any]) -> None:
+        ts = e.get("timestamp")
+        abid = _ability_id(e)
+        if not (isinstance(ts, int) and isinstance(abid, int)):
+            return
+        et = (e.get("type") or "").lower()
+        sid, tid = e.get("sourceID"), e.get("targetID")
+        key = (abid, et, self.side(sid), self.side(tid))
+
+        ent = self.entries.get(key)
+        if ent is None:
+            ent = self.entries[key] = {"count": 0, "first": ts, "last": ts, "targets": {}}
+        ent["count"] += 1
+        if ts < ent["first"]:
+            ent["first"] = ts
+        if ts > ent["last"]:
+            ent["last"] = ts
+        if isinstance(tid, int):
+            ent["targets"][tid] = ent["targets"].get(tid, 0) + 1
+
+        ab = e.get("ability")
+        if isinstance(ab, dict) and isinstance(ab.get("name"), str) and abid not in self.names:
+            self.names[abid] = ab["name"]
+
+    def tap(self, events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Pass-through generator: catalogs every event while the caller consumes the stream.
+        """
+        for e in events:
+            self.add_event(e)
+            yield e
+
+    # -------------------- QUERIES --------------------
+
+    def _matching(
+        self,
+        ability_id: Optional[int],
+        types: Optional[Iterable[str]] = None,
+        source_side: Optional[str] = None,
+        target_side: Optional[str] = None,
+    ) -> List[Tuple[Key, Dict[str, Any]]]:
+        wanted = None if types is None else {t.lower() for t in types}
+        return [
+            (k, v) for k, v in self.entries.items()
+            if (ability_id is None or k[0] == ability_id)
+            and (wanted is None or k[1] in wanted)
+            and (source_side is None or k[2] == source_side)
+            and (target_side is None or k[3] == target_side)
+        ]
+
+    def first(self, ability_id: int, types: Optional[Iterable[str]] = None,
+              source_side: Optional[str] = None, target_side: Optional[str] = None) -> Optional[int]:
+        hits = self._matching(ability_id, types, source_side, target_side)
+        return min((v["first"] for _, v in hits), default=None)
+
+    def last(self, ability_id: int, types: Optional[Iterable[str]] = None,
+             source_side: Optional[str] = None, target_side: Optional[str] = None) -> Optional[int]:
+        hits = self._matching(ability_id, types, source_side, target_side)
+        return max((v["last"] for _, v in hits), default=None)
+
+    def count(self, ability_id: int, types: Optional[Iterable[str]] = None,
+              source_side: Optional[str] = None, target_side: Optional[str] = None) -> int:
+        return sum(v["count"] for _, v in self._matching(ability_id, types, source_side, target_side))
+
+    def present(self, ability_id: int, types: Optional[Iterable[str]] = None,
+                source_side: Optional[str] = None, target_side: Optional[str] = None) -> bool:
+        return bool(self._matching(ability_id, types, source_side, target_side))
+
+    def targets(self, ability_id: int, types: Optional[Iterable[str]] = None) -> Set[int]:
+        out: Set[int] = set()
+        for _, v in self._matching(ability_id, types):
+            out.update(v["targets"])
+        return out
+
+    def counts_on_targets(self, target_ids: Iterable[int], types: Optional[Iterable[str]] = None) -> Dict[int, int]:
+        """
+        {ability_id: events landing on any of target_ids}
+        """
+        wanted = set(target_ids)
+        out: Dict[int, int] = {}
+        for (abid, _, _, _), v in self._matching(None, types):
+            n = sum(c for tid, c in v["targets"].items() if tid in wanted)
+            if n:
+                out[abid] = out.get(abid, 0) + n
+        return out
+
+    # -------------------- PERSISTENCE --------------------
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fight_id": self.fight_id,
+            "names": {str(k): v for k, v in self.names.items()},
+            "entries": [
+                {
+                    "ability": k[0], "type": k[1], "source_side": k[2], "target_side": k[3],
+                    "count": v["count"], "first": v["first"], "last": v["last"],
+                    "targets": {str(t): c for t, c in v["targets"].items()},
+                }
+                for k, v in self.entries.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, fight: Dict[str, Any], data: Dict[str, Any]) -> "AbilityCatalog":
+        cat = cls(fight)
+        cat.names = {int(k): v for k, v in (data.get("names") or {}).items()}
+        for r in data.get("entries") or []:
+            cat.entries[(r["ability"], r["type"], r["source_side"], r["target_side"])] = {
+                "count": r["count"], "first": r["first"], "last": r["last"],
+                "targets": {int(t): c for t, c in (r.get("targets") or {}).items()},
+            }
+        return cat
+
+
+def catalog_path(code: str, directory: str = CATALOG_DIR) -> str:
+    return os.path.join(directory, f"{code}.json")
+
+
+def save_catalogs(code: str, catalogs: Dict[int, AbilityCatalog], directory: str = CATALOG_DIR) -> None:
+    """
+    Merges catalogs into the report's file (fights already on disk are kept).
+    """
+    path = catalog_path(code, directory)
+    data: Dict[str, Any] = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    for fid, cat in catalogs.items():
+        data[str(fid)] = cat.to_dict()
+    os.makedirs(directory, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh)
+    os.replace(tmp, path)
+
+
+def load_catalogs(code: str, fights: List[Dict[str, Any]], directory: str = CATALOG_DIR) -> Dict[int, AbilityCatalog]:
+    path = catalog_path(code, directory)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as fh:
+        data = json.load(fh)
+    out: Dict[int, AbilityCatalog] = {}
+    for f in fights:
+        if isinstance(f, dict) and str(f.get("id")) in data:
+            out[f["id"]] = AbilityCatalog.from_dict(f, data[str(f["id"])])
+    return out
+
+
+def fights_that_may_contain(
+    fights: List[Dict[str, Any]],
+    catalogs: Dict[int, AbilityCatalog],
+    ability_id: int,
+    types: Optional[Iterable[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Fights without a catalog are kept (unknown); cataloged fights are kept only if they saw ability_id.
+    A catalog only knows the streams it was fed, so query it with the same dataType family.
+    """
+    out = []
+    for f in fights:
+        cat = catalogs.get(f.get("id"))
+        if cat is None or cat.present(ability_id, types):
+            out.append(f)
+    return out
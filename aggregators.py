@@ -0,0 +1,358 @@
+"""
+Mergeable aggregators: init / update / merge / finalize.
+
+An analysis written as an Aggregator can fold any slice of a stream into a
+partial state, and partial states from adjacent slices merge into exactly the
+state of the whole stream. That lets a pull be split into time shards, fetched
+and folded in parallel, and combined, or a saved state be extended as new
+events arrive.
+
+merge(a, b) expects a to cover the earlier slice. It is associative, so shards
+can be combined pairwise in any grouping as long as their order is kept.
+
+WCL_SHARDS sets how many time shards the analyzers split a pull into (default 4;
+1 turns sharding off). Each sharded run fetches its shards in parallel, so it
+opens that many concurrent event streams.
+"""
+import os
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from aura_engine import AURA_EVENT_KINDS, REMOVE, REMOVE_STACK
+from wcl import iter_events
+
+Event = Dict[str, Any]
+Predicate = Callable[[Event], bool]
+
+SHARDS = max(1, int(os.getenv("WCL_SHARDS", "4")))
+
+
+class Aggregator(ABC):
+    @abstractmethod
+    def init(self) -> Any:
+        """
+        State for an empty slice.
+        """
+
+    @abstractmethod
+    def update(self, state: Any, e: Event) -> Any:
+        """
+        State after one more event (may mutate and return state).
+        """
+
+    @abstractmethod
+    def merge(self, a: Any, b: Any) -> Any:
+        """
+        State of a's slice followed by b's.
+        """
+
+    def finalize(self, state: Any) -> Any:
+        return state
+
+
+def _ts(e: Event) -> Optional[int]:
+    ts = e.get("timestamp")
+    return ts if isinstance(ts, int) else None
+
+
+class MinTimestamp(Aggregator):
+    def __init__(self, predicate: Optional[Predicate] = None):
+        self.predicate = predicate
+
+    def init(self) -> Optional[int]:
+        return None
+
+    def update(self, state: Optional[int], e: Event) -> Optional[int]:
+        ts = _ts(e)
+        if ts is None or (self.predicate is not None and not self.predicate(e)):
+            return state
+        return ts if state is None or ts < state else state
+
+    def merge(self, a: Optional[int], b: Optional[int]) -> Optional[int]:
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return min(a, b)
+
+
+class Sum(Aggregator):
+    def __init__(self, value: Callable[[Event], int], predicate: Optional[Predicate] = None):
+        self.value = value
+        self.predicate = predicate
+
+    def init(self) -> int:
+        return 0
+
+    def update(self, state: int, e: Event) -> int:
+        if self.predicate is not None and not self.predicate(e):
+            return state
+        return state + (self.value(e) or 0)
+
+    def merge(self, a: int, b: int) -> int:
+        return a + b
+
+
+class Count(Sum):
+    def __init__(self, predicate: Optional[Predicate] = None):
+        super().__init__(lambda e: 1, predicate)
+
+
+class TopK(Aggregator):
+    """
+    Exact top-k by count: partial states keep full counts, only finalize truncates.
+    """
+
+    def __init__(self, key: Callable[[Event], Optional[Hashable]], k: int = 10):
+        self.key = key
+        self.k = k
+
+    def init(self) -> Counter:
+        return Counter()
+
+    def update(self, state: Counter, e: Event) -> Counter:
+        k = self.key(e)
+        if k is not None:
+            state[k] += 1
+        return state
+
+    def merge(self, a: Counter, b: Counter) -> Counter:
+        a.update(b)
+        return a
+
+    def finalize(self, state: Counter) -> List[Tuple[Hashable, int]]:
+        return state.most_common(self.k)
+
+
+class MinTimestampByLabel(Aggregator):
+    """
+    {label: earliest timestamp}; label(e) returns None for events to ignore.
+    """
+
+    def __init__(self, label: Callable[[Event], Optional[Hashable]], labels: Iterable[Hashable] = ()):
+        self.label = label
+        self.labels = list(labels)
+
+    def init(self) -> Dict[Hashable, Optional[int]]:
+        return {k: None for k in self.labels}
+
+    def update(self, state: Dict[Hashable, Optional[int]], e: Event) -> Dict[Hashable, Optional[int]]:
+        ts = _ts(e)
+        k = self.label(e) if ts is not None else None
+        if k is not None:
+            cur = state.get(k)
+            if cur is None or ts < cur:
+                state[k] = ts
+        return state
+
+    def merge(self, a: Dict[Hashable, Optional[int]], b: Dict[Hashable, Optional[int]]) -> Dict[Hashable, Optional[int]]:
+        for k, v in b.items():
+            cur = a.get(k)
+            if cur is None or (v is not None and v < cur):
+                a[k] = v
+        return a
+
+
+class TimestampsByLabel(Aggregator):
+    """
+    {label: sorted timestamps}; label(e) returns None for events to ignore.
+    """
+
+    def __init__(self, label: Callable[[Event], Optional[Hashable]], labels: Iterable[Hashable] = ()):
+        self.label = label
+        self.labels = list(labels)
+
+    def init(self) -> Dict[Hashable, List[int]]:
+        return {k: [] for k in self.labels}
+
+    def update(self, state: Dict[Hashable, List[int]], e: Event) -> Dict[Hashable, List[int]]:
+        ts = _ts(e)
+        k = self.label(e) if ts is not None else None
+        if k is not None:
+            state.setdefault(k, []).append(ts)
+        return state
+
+    def merge(self, a: Dict[Hashable, List[int]], b: Dict[Hashable, List[int]]) -> Dict[Hashable, List[int]]:
+        for k, v in b.items():
+            a.setdefault(k, []).extend(v)
+        return a
+
+    def finalize(self, state: Dict[Hashable, List[int]]) -> Dict[Hashable, List[int]]:
+        for v in state.values():
+            v.sort()
+        return state
+
+
+class IntervalUnion(Aggregator):
+    """
+    Aura on/off intervals per key (key(e) -> e.g. (ability, target), None to ignore),
+    with the same rules as AuraIntervals: apply/stack/refresh turn on, remove turns
+    off, removestack changes nothing, a remove with nothing open is ignored.
+
+    A shard can't know whether an aura was already up when it starts, so a leading
+    remove is kept as [None, ts] and settled by merge(); a trailing open interval is
+    [start, None]. finalize() drops unsettled leading segments and closes open ones
+    at fight_end, returning {key: [(start, end), ...]}.
+    """
+
+    def __init__(self, key: Callable[[Event], Optional[Hashable]], fight_end: int):
+        self.key = key
+        self.fight_end = fight_end
+
+    def init(self) -> Dict[Hashable, List[List[Optional[int]]]]:
+        return {}
+
+    def update(self, state: Dict[Hashable, List[List[Optional[int]]]], e: Event) -> Dict[Hashable, List[List[Optional[int]]]]:
+        kind = AURA_EVENT_KINDS.get((e.get("type") or "").lower())
+        ts = _ts(e)
+        if kind is None or kind == REMOVE_STACK or ts is None:
+            return state
+        k = self.key(e)
+        if k is None:
+            return state
+        segs = state.setdefault(k, [])
+        is_open = bool(segs) and segs[-1][1] is None
+        if kind == REMOVE:
+            if is_open:
+                segs[-1][1] = ts
+            elif not segs:
+                segs.append([None, ts])
+        elif not is_open:
+            segs.append([ts, None])
+        return state
+
+    def merge(self, a: Dict[Hashable, List[List[Optional[int]]]], b: Dict[Hashable, List[List[Optional[int]]]]) -> Dict[Hashable, List[List[Optional[int]]]]:
+        for k, bsegs in b.items():
+            asegs = a.get(k)
+            if not asegs:
+                a[k] = bsegs
+                continue
+            if not bsegs:
+                continue
+            if asegs[-1][1] is None:
+                # up at the end of a: runs until b's first close, whether or not b saw it open
+                asegs[-1][1] = bsegs[0][1]
+                bsegs = bsegs[1:]
+            elif bsegs[0][0] is None:
+                # b starts with a remove but a ended with the aura down
+                bsegs = bsegs[1:]
+            asegs.extend(bsegs)
+        return a
+
+    def finalize(self, state: Dict[Hashable, List[List[Optional[int]]]]) -> Dict[Hashable, List[Tuple[int, int]]]:
+        out: Dict[Hashable, List[Tuple[int, int]]] = {}
+        for k, segs in state.items():
+            rows = [
+                (s, max(s, self.fight_end if e is None else e))
+                for s, e in segs if s is not None
+            ]
+            if rows:
+                out[k] = rows
+        return out
+
+
+class Group(Aggregator):
+    """
+    Several aggregators over the same pass; state and result are dicts by name.
+    """
+
+    def __init__(self, **aggs: Aggregator):
+        self.aggs = aggs
+
+    def init(self) -> Dict[str, Any]:
+        return {n: a.init() for n, a in self.aggs.items()}
+
+    def update(self, state: Dict[str, Any], e: Event) -> Dict[str, Any]:
+        for n, a in self.aggs.items():
+            state[n] = a.update(state[n], e)
+        return state
+
+    def merge(self, a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+        return {n: agg.merge(a[n], b[n]) for n, agg in self.aggs.items()}
+
+    def finalize(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        return {n: agg.finalize(state[n]) for n, agg in self.aggs.items()}
+
+
+# -------------------- RUNNING --------------------
+
+def fold(agg: Aggregator, events: Iterable[Event], state: Any = None) -> Any:
+    """
+    Partial state for events, continuing from state if given (incremental updates).
+    """
+    if state is None:
+        state = agg.init()
+    for e in events:
+        state = agg.update(state, e)
+    return state
+
+
+def run(agg: Aggregator, events: Iterable[Event]) -> Any:
+    return agg.finalize(fold(agg, events))
+
+
+def run_sharded(agg: Aggregator, shards: List[Iterable[Event]], workers: int = 1) -> Any:
+    """
+    Folds each shard (in parallel with workers > 1), then merges states in shard order.
+    """
+    if workers > 1 and len(shards) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            states = list(pool.map(lambda s: fold(agg, s), shards))
+    else:
+        states = [fold(agg, s) for s in shards]
+    if not states:
+        return agg.finalize(agg.init())
+    return agg.finalize(reduce(agg.merge, states))
+
+
+def time_windows(start: int, end: int, n: int) -> List[Tuple[int, int]]:
+    n = max(1, n)
+    step = max(1, -(-(end - start) // n))
+    return [(lo, min(end, lo + step)) for lo in range(start, end, step)] or [(start, end)]
+
+
+def _before(events: Iterable[Event], hi: int) -> Iterable[Event]:
+    for e in events:
+        ts = e.get("timestamp")
+        if isinstance(ts, int) and ts >= hi:
+            break
+        yield e
+
+
+def fight_shards(
+    headers: Dict[str, str],
+    code: str,
+    fight: Dict[str, Any],
+    data_type: str,
+    n: int,
+    **iter_kwargs: Any,
+) -> List[Iterable[Event]]:
+    """
+    n lazy event streams over consecutive time windows of the pull. Windows are
+    half-open [lo, hi) except the last, so no event lands in two shards.
+    """
+    windows = time_windows(fight["startTime"], fight["endTime"], n)
+    shards: List[Iterable[Event]] = []
+    for i, (lo, hi) in enumerate(windows):
+        stream = iter_events(
+            headers, code, fight["id"], fight["startTime"], fight["endTime"], data_type,
+            start_override=lo, end_override=hi, **iter_kwargs,
+        )
+        shards.append(stream if i == len(windows) - 1 else _before(stream, hi))
+    return shards
+
+
+def run_fight(
+    agg: Aggregator,
+    headers: Dict[str, str],
+    code: str,
+    fight: Dict[str, Any],
+    data_type: str,
+    shards: int = 1,
+    workers: int = 1,
+    **iter_kwargs: Any,
+) -> Any:
+    return run_sharded(agg, fight_shards(headers, code, fight, data_type, shards, **iter_kwargs), workers=workers)
@@ -20,7 +20,8 @@ const ABILITIES = {
   shellConcussion: 136431,
 };
 
-const QUETZAL_MAX_HP = 399065355;
+// (gameID, difficulty, raid size) -> max HP, learned from HP snapshots on fetched events
+const NPC_STATS_KEY = "wcl-npc-stats";
 
 const DOG_KEYS = {
   "Ro'Shak": ["ro", "shak"],
@@ -336,8 +337,8 @@ async function fetchReport(baseUrl, token, code) {
       reportData {
         report(code: $code) {
           title
-          fights { id name kill startTime endTime }
-          masterData { actors { id name type subType } }
+          fights { id name kill startTime endTime difficulty size }
+          masterData { actors { id name type subType gameID } }
         }
       }
     }
@@ -346,6 +347,47 @@ async function fetchReport(baseUrl, token, code) {
   return data.reportData.report;
 }
 
+function loadNpcStats() {
+  try {
+    return JSON.parse(localStorage.getItem(NPC_STATS_KEY) || "{}");
+  } catch {
+    return {};
+  }
+}
+
+function npcStatsKey(gameID, fight) {
+  return `${gameID}:${fight.difficulty ?? "?"}:${fight.size ?? "?"}`;
+}
+
+function learnNpcMaxHp(events, actorById, fight) {
+  const stats = loadNpcStats();
+  let changed = false;
+  for (const e of events) {
+    const mhp = e.maxHitPoints;
+    if (typeof mhp !== "number" || mhp <= 0) continue;
+    const actorId = e.resourceActor === 1 ? e.sourceID : e.targetID;
+    const gameID = actorById.get(actorId)?.gameID;
+    if (typeof gameID !== "number" || isPlayerActor(actorById.get(actorId))) continue;
+    const key = npcStatsKey(gameID, fight);
+    if (!(stats[key] >= mhp)) {
+      stats[key] = mhp;
+      changed = true;
+    }
+  }
+  if (changed) localStorage.setItem(NPC_STATS_KEY, JSON.stringify(stats));
+}
+
+function npcMaxHp(actorIds, actorById, fight) {
+  const stats = loadNpcStats();
+  let best = null;
+  for (const id of actorIds) {
+    const gameID = actorById.get(id)?.gameID;
+    const mhp = typeof gameID === "number" ? stats[npcStatsKey(gameID, fight)] : undefined;
+    if (typeof mhp === "number" && (best === null || mhp > best)) best = mhp;
+  }
+  return best;
+}
+
 function findActorIdsFuzzy(actors, requiredSubstrings) {
   const req = requiredSubstrings.map(norm);
   const hits = [];
@@ -802,6 +844,8 @@ async function buildIronQon(baseUrl, token, code, report, actorById) {
           windTs,
           "DamageDone"
         );
+        learnNpcMaxHp(dmgEvents, actorById, fight);
+        const maxHp = npcMaxHp(quetIds, actorById, fight);
         let dmg = 0;
         for (const e of dmgEvents) {
           const et = norm(e.type || "");
@@ -811,8 +855,10 @@ async function buildIronQon(baseUrl, token, code, report, actorById) {
           const amt = e.amount;
           if (typeof amt === "number" && amt > 0) dmg += amt;
         }
-        dmg = Math.max(0, Math.min(dmg, QUETZAL_MAX_HP));
-        quetHp = 100 * (1 - dmg / QUETZAL_MAX_HP);
+        if (maxHp) {
+          dmg = Math.max(0, Math.min(dmg, maxHp));
+          quetHp = 100 * (1 - dmg / maxHp);
+        }
       }
     }
     rows.push(["Quetzal HP @ Windstorm", quetHp === null ? "-" : `${quetHp.toFixed(1)}% (approx)`]);
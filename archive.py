@@ -0,0 +1,325 @@
+"""
+Compact, memory-mappable binary archive of one report.
+
+Layout (little-endian):
+
+    b"WCLARC01"  u64 header_len  header (UTF-8 JSON)  [8-byte aligned column blocks]
+
+The header holds the report title, fights, actors, the string table and, per
+fight, where its blocks live. Per fight:
+  - ts      fight-relative timestamps, delta + LEB128 varint encoded
+  - type    u16 index into the string table (event type as logged)
+  - source / target / ability  i32, amount  i64  (MISSING when absent)
+  - extra   zlib'd JSON of every other event field, only read to rebuild events
+
+Readers mmap the file; fixed-width columns come back as zero-copy np.frombuffer
+views and timestamps are decoded with a few vectorized numpy ops. An Archive can
+also be wcl's backend (wcl.set_backend(Archive(path))). There is no separate
+page cache in this tree, so the converters go to and from the SQLite event store:
+
+    py archive.py pack vFYGaXZgdTk9P6tz             # event store -> vFYGaXZgdTk9P6tz.wcla
+    py archive.py unpack vFYGaXZgdTk9P6tz.wcla      # archive -> event store
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from event_index import MISSING, FightEventIndex
+from event_store import DEFAULT_DB, EventStore, page_rows
+
+MAGIC = b"WCLARC01"
+MISSING_AMOUNT = -(2 ** 63)
+
+INT_FIELDS = (("source", "sourceID", "<i4", MISSING), ("target", "targetID", "<i4", MISSING),
+              ("ability", "abilityGameID", "<i4", MISSING), ("amount", "amount", "<i8", MISSING_AMOUNT))
+CORE_KEYS = {"timestamp", "type", "sourceID", "targetID", "abilityGameID", "amount"}
+
+
+def varint_encode(values: np.ndarray) -> bytes:
+    """
+    LEB128 for non-negative integers.
+    """
+    out = bytearray()
+    for v in values.tolist():
+        while v >= 0x80:
+            out.append((v & 0x7F) | 0x80)
+            v >>= 7
+        out.append(v)
+    return bytes(out)
+
+
+def varint_decode(buf: np.ndarray) -> np.ndarray:
+    if len(buf) == 0:
+        return np.empty(0, dtype=np.int64)
+    ends = np.flatnonzero(buf < 0x80)
+    starts = np.r_[0, ends[:-1] + 1]
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shift = (np.arange(len(buf)) - starts[group]) * 7
+    parts = (buf & 0x7F).astype(np.uint64) << shift.astype(np.uint64)
+    return np.add.reduceat(parts, starts).astype(np.int64)
+
+
+def _fits(v: Any, lo: int, hi: int) -> bool:
+    return isinstance(v, int) and not isinstance(v, bool) and lo <= v <= hi
+
+
+def encode_archive(
+    code: str,
+    title: str,
+    fights: List[Dict[str, Any]],
+    actors: List[Dict[str, Any]],
+    events_by_fight: Dict[int, List[Dict[str, Any]]],
+) -> bytes:
+    strings: List[str] = []
+    string_idx: Dict[str, int] = {}
+    blocks: List[bytes] = []
+    fight_meta: List[Dict[str, Any]] = []
+    offset = 0
+
+    def add_block(data: bytes) -> Tuple[int, int]:
+        nonlocal offset
+        pad = (-len(data)) % 8
+        blocks.append(data + b"\0" * pad)
+        at = offset
+        offset += len(data) + pad
+        return at, len(data)
+
+    for f in fights:
+        evs = sorted(events_by_fight.get(f["id"], []), key=lambda e: e["timestamp"])
+        n = len(evs)
+        rel = np.asarray([e["timestamp"] - f["startTime"] for e in evs], dtype=np.int64)
+        base = int(rel[0]) if n else 0
+        deltas = np.diff(rel, prepend=base) if n else rel
+
+        types = np.empty(n, dtype="<u2")
+        cols = {name: np.full(n, miss, dtype=dt) for name, _, dt, miss in INT_FIELDS}
+        extra: List[Dict[str, Any]] = []
+        for i, e in enumerate(evs):
+            t = e.get("type") or ""
+            if t not in string_idx:
+                string_idx[t] = len(strings)
+                strings.append(t)
+            types[i] = string_idx[t]
+            rest = {k: v for k, v in e.items() if k not in CORE_KEYS}
+            for name, key, dt, miss in INT_FIELDS:
+                v = e.get(key)
+                lo, hi = (-(2 ** 31) + 1, 2 ** 31 - 1) if dt == "<i4" else (-(2 ** 63) + 1, 2 ** 63 - 1)
+                if _fits(v, lo, hi):
+                    cols[name][i] = v
+                elif key in e:
+                    rest[key] = v  # keep odd values losslessly
+            extra.append(rest)
+
+        meta = {"id": f["id"], "n": n, "ts_base": base, "columns": {}}
+        meta["columns"]["ts"] = add_block(varint_encode(deltas))
+        meta["columns"]["type"] = add_block(types.tobytes())
+        for name, _, _, _ in INT_FIELDS:
+            meta["columns"][name] = add_block(cols[name].tobytes())
+        meta["columns"]["extra"] = add_block(zlib.compress(json.dumps(extra, separators=(",", ":")).encode("utf-8")))
+        fight_meta.append(meta)
+
+    header = json.dumps({
+        "code": code, "title": title, "fights": fights, "actors": actors,
+        "strings": strings, "layout": fight_meta,
+    }, separators=(",", ":")).encode("utf-8")
+    pre = MAGIC + struct.pack("<Q", len(header)) + header
+    pre += b"\0" * ((-len(pre)) % 8)
+    return pre + b"".join(blocks)
+
+
+def write_archive(
+    path: str,
+    code: str,
+    title: str,
+    fights: List[Dict[str, Any]],
+    actors: List[Dict[str, Any]],
+    events_by_fight: Dict[int, List[Dict[str, Any]]],
+) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(encode_archive(code, title, fights, actors, events_by_fight))
+    os.replace(tmp, path)
+
+
+class Archive:
+    def __init__(self, path: str, data: Optional[bytes] = None):
+        """
+        Maps the file at path, or reads an archive already in memory (data; path is then just a name).
+        """
+        self.path = path
+        self._fh = None
+        self._mm: Any = data
+        if data is None:
+            self._fh = open(path, "rb")
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:8] != MAGIC:
+            raise ValueError(f"{path}: not a WCL archive")
+        (hlen,) = struct.unpack_from("<Q", self._mm, 8)
+        self.header = json.loads(self._mm[16:16 + hlen].decode("utf-8"))
+        self._data_start = 16 + hlen + ((-(16 + hlen)) % 8)
+        self.code: str = self.header["code"]
+        self.title: str = self.header["title"]
+        self.fights: List[Dict[str, Any]] = self.header["fights"]
+        self.actors: List[Dict[str, Any]] = self.header["actors"]
+        self.strings: List[str] = self.header["strings"]
+        self._layout = {m["id"]: m for m in self.header["layout"]}
+        self._starts = {f["id"]: f["startTime"] for f in self.fights}
+        self._enemies = {
+            f["id"]: {n["id"] for n in (f.get("enemyNPCs") or []) if isinstance(n, dict) and isinstance(n.get("id"), int)}
+            for f in self.fights
+        }
+        self._extra: Dict[int, List[Dict[str, Any]]] = {}
+        self._indexes: Dict[int, FightEventIndex] = {}
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._mm.close()
+            self._fh.close()
+
+    def _view(self, fight_id: int, name: str, dtype: str) -> np.ndarray:
+        meta = self._layout[fight_id]
+        at, nbytes = meta["columns"][name]
+        count = nbytes // np.dtype(dtype).itemsize
+        return np.frombuffer(self._mm, dtype=dtype, count=count, offset=self._data_start + at)
+
+    def columns(self, fight_id: int) -> Dict[str, np.ndarray]:
+        """
+        {"ts" (absolute), "type", "source", "target", "ability", "amount"}; all but ts are
+        read-only views into the mapped file. Missing ints are MISSING / MISSING_AMOUNT.
+        """
+        meta = self._layout[fight_id]
+        out = {name: self._view(fight_id, name, dt) for name, _, dt, _ in INT_FIELDS}
+        out["type"] = self._view(fight_id, "type", "<u2")
+        out["ts"] = np.cumsum(varint_decode(self._view(fight_id, "ts", "u1"))) + self._starts[fight_id]
+        if meta["n"] and meta["ts_base"]:
+            out["ts"] += meta["ts_base"]
+        return out
+
+    def type_code(self, event_type: str) -> Optional[int]:
+        try:
+            return self.strings.index(event_type)
+        except ValueError:
+            return None
+
+    def _extras(self, fight_id: int) -> List[Dict[str, Any]]:
+        if fight_id not in self._extra:
+            at, nbytes = self._layout[fight_id]["columns"]["extra"]
+            raw = self._mm[self._data_start + at:self._data_start + at + nbytes]
+            self._extra[fight_id] = json.loads(zlib.decompress(raw).decode("utf-8"))
+        return self._extra[fight_id]
+
+    def events(self, fight_id: int, rows: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        Rebuilt event dicts (all rows, or the given row indexes), identical to what was archived.
+        """
+        cols = self.columns(fight_id)
+        extras = self._extras(fight_id)
+        idx = range(len(cols["ts"])) if rows is None else rows.tolist()
+        out: List[Dict[str, Any]] = []
+        for i in idx:
+            e: Dict[str, Any] = {"timestamp": int(cols["ts"][i]), "type": self.strings[int(cols["type"][i])]}
+            for name, key, _, miss in INT_FIELDS:
+                v = int(cols[name][i])
+                if v != miss:
+                    e[key] = v
+            e.update(extras[i])
+            out.append(e)
+        return out
+
+    # -------------------- wcl BACKEND --------------------
+
+    def fetch_report(self, code: str) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+        self._check(code)
+        return self.title, self.fights, self.actors
+
+    def _check(self, code: str, fight_id: Optional[int] = None) -> None:
+        if code != self.code:
+            raise KeyError(f"archive {self.path!r} holds {self.code!r}, not {code!r}")
+        if fight_id is not None and fight_id not in self._layout:
+            raise KeyError(f"archive {self.path!r} has no events for fight {fight_id}")
+
+    def event_index(self, code: str, fight_id: int) -> FightEventIndex:
+        if fight_id not in self._indexes:
+            c = self.columns(fight_id)
+            amount = np.where(c["amount"] == MISSING_AMOUNT, 0, c["amount"])
+            self._indexes[fight_id] = FightEventIndex(
+                c["ts"], c["type"], self.strings, c["source"], c["target"], c["ability"], amount,
+            )
+        return self._indexes[fight_id]
+
+    def events_at(self, code: str, fight_id: int, rows: np.ndarray) -> List[Dict[str, Any]]:
+        return self.events(fight_id, rows)
+
+    def fetch_events_page(
+        self,
+        code: str,
+        fight_id: Union[int, Sequence[int]],
+        start: int,
+        end: int,
+        data_type: str,
+        hostility_type: Optional[str] = None,
+        ability_id: Optional[int] = None,
+        target_id: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        out: List[Dict[str, Any]] = []
+        for fid in ([fight_id] if isinstance(fight_id, int) else list(fight_id)):
+            self._check(code, fid)
+            rows = page_rows(self.event_index(code, fid), self._enemies[fid], start, end, data_type,
+                             hostility_type=hostility_type, ability_id=ability_id, target_id=target_id)
+            out.extend(self.events(fid, rows))
+        out.sort(key=lambda e: e["timestamp"])
+        return out, None
+
+
+# -------------------- CONVERTERS --------------------
+
+def archive_from_store(store: EventStore, code: str, path: str) -> None:
+    title, fights, actors = store.fetch_report(code)
+    events_by_fight: Dict[int, List[Dict[str, Any]]] = {}
+    for fid, data in store.db.execute("SELECT fight, data FROM events WHERE code = ? ORDER BY fight, timestamp, id", (code,)):
+        events_by_fight.setdefault(fid, []).append(json.loads(data))
+    write_archive(path, code, title, fights, actors, events_by_fight)
+
+
+def archive_to_store(source: Union[str, Archive], store: EventStore) -> int:
+    arc = Archive(source) if isinstance(source, str) else source
+    try:
+        events_by_fight = {f["id"]: arc.events(f["id"]) for f in arc.fights}
+        return store.import_report(arc.code, arc.title, arc.fights, arc.actors, events_by_fight)
+    finally:
+        if arc is not source:
+            arc.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Pack/unpack binary report archives.")
+    ap.add_argument("--db", default=DEFAULT_DB, help=f"SQLite event store (default: {DEFAULT_DB})")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("pack", help="Event store report -> archive")
+    p.add_argument("code")
+    p.add_argument("--out", help="Archive path (default: <code>.wcla)")
+    u = sub.add_parser("unpack", help="Archive -> event store")
+    u.add_argument("path")
+    args = ap.parse_args()
+
+    store = EventStore(args.db)
+    try:
+        if args.cmd == "pack":
+            out = args.out or f"{args.code}.wcla"
+            archive_from_store(store, args.code, out)
+            print(f"{args.code} -> {out} ({os.path.getsize(out):,} bytes)")
+        else:
+            n = archive_to_store(args.path, store)
+            print(f"{args.path} -> {args.db} ({n:,} events)")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
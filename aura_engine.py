@@ -0,0 +1,249 @@
+"""
+Aura interval engine: one Buffs/Debuffs stream -> intervals for every (ability, target).
+
+Events are sorted once by (ability, target, timestamp, stream order); the on/off
+state after each event is just "not a remove", so interval opens/closes, stacks,
+uptime and application counts all fall out of array operations instead of a
+per-aura Python state machine. Intervals still open at the end of the stream are
+truncated at fight end.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+APPLY, APPLY_STACK, REFRESH, REMOVE_STACK, REMOVE = 0, 1, 2, 3, 4
+
+AURA_EVENT_KINDS: Dict[str, int] = {
+    "applybuff": APPLY, "applydebuff": APPLY,
+    "applybuffstack": APPLY_STACK, "applydebuffstack": APPLY_STACK,
+    "refreshbuff": REFRESH, "refreshdebuff": REFRESH,
+    "refreshbuffstack": REFRESH, "refreshdebuffstack": REFRESH,
+    "removebuffstack": REMOVE_STACK, "removedebuffstack": REMOVE_STACK,
+    "removebuff": REMOVE, "removedebuff": REMOVE,
+}
+
+
+def _ability_id(e: Dict[str, Any]) -> Optional[int]:
+    ab = e.get("ability")
+    if isinstance(ab, dict):
+        for k in ("id", "gameID", "guid"):
+            if isinstance(ab.get(k), int):
+                return ab[k]
+    for k in ("abilityGameID", "abilityID", "spellID", "guid"):
+        v = e.get(k)
+        if isinstance(v, int):
+            return v
+    return None
+
+
+def _target_id(e: Dict[str, Any]) -> Optional[int]:
+    tid = e.get("targetID")
+    if isinstance(tid, int):
+        return tid
+    target = e.get("target")
+    if isinstance(target, dict):
+        tid = target.get("id")
+        return tid if isinstance(tid, int) else None
+    return target if isinstance(target, int) else None
+
+
+def union_intervals(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge [start, end) intervals into disjoint segments. Intervals that only touch
+    (start == previous end) stay separate, so a remove+reapply counts twice.
+    """
+    if len(starts) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    order = np.lexsort((ends, starts))
+    s = starts[order]
+    e = ends[order]
+    run_max = np.maximum.accumulate(e)
+    new_seg = np.ones(len(s), dtype=bool)
+    new_seg[1:] = s[1:] >= run_max[:-1]
+    return s[new_seg], np.maximum.reduceat(e, np.flatnonzero(new_seg))
+
+
+class AuraIntervals:
+    """
+    Interval arrays (one row per interval): ability, target, start, end, max_stacks.
+    event_counts holds the number of aura events seen per (ability, target).
+    """
+
+    def __init__(self, fight_start: int, fight_end: int):
+        self.fight_start = fight_start
+        self.fight_end = fight_end
+        self.ability = np.empty(0, dtype=np.int64)
+        self.target = np.empty(0, dtype=np.int64)
+        self.start = np.empty(0, dtype=np.int64)
+        self.end = np.empty(0, dtype=np.int64)
+        self.max_stacks = np.empty(0, dtype=np.int64)
+        self.event_counts: Dict[Tuple[int, int], int] = {}
+        self.names: Dict[int, str] = {}
+
+    @classmethod
+    def from_events(cls, events: Iterable[Dict[str, Any]], fight_start: int, fight_end: int) -> "AuraIntervals":
+        ts_l: List[int] = []
+        ab_l: List[int] = []
+        tg_l: List[int] = []
+        kind_l: List[int] = []
+        stack_l: List[int] = []
+        out = cls(fight_start, fight_end)
+
+        for e in events:
+            kind = AURA_EVENT_KINDS.get((e.get("type") or "").lower())
+            if kind is None:
+                continue
+            ts = e.get("timestamp")
+            abid = _ability_id(e)
+            tid = _target_id(e)
+            if not (isinstance(ts, int) and isinstance(abid, int) and isinstance(tid, int)):
+                continue
+            ab = e.get("ability")
+            if isinstance(ab, dict) and isinstance(ab.get("name"), str) and abid not in out.names:
+                out.names[abid] = ab["name"]
+            stack = e.get("stack")
+            ts_l.append(ts)
+            ab_l.append(abid)
+            tg_l.append(tid)
+            kind_l.append(kind)
+            stack_l.append(stack if isinstance(stack, int) else -1)
+
+        out._build(
+            np.asarray(ts_l, dtype=np.int64),
+            np.asarray(ab_l, dtype=np.int64),
+            np.asarray(tg_l, dtype=np.int64),
+            np.asarray(kind_l, dtype=np.int8),
+            np.asarray(stack_l, dtype=np.int64),
+        )
+        return out
+
+    def _build(self, ts: np.ndarray, ab: np.ndarray, tg: np.ndarray, kind: np.ndarray, stack: np.ndarray) -> None:
+        n = len(ts)
+        if n == 0:
+            return
+
+        order = np.lexsort((np.arange(n), ts, tg, ab))
+        ts, ab, tg, kind, stack = ts[order], ab[order], tg[order], kind[order], stack[order]
+
+        group_start = np.ones(n, dtype=bool)
+        group_start[1:] = (ab[1:] != ab[:-1]) | (tg[1:] != tg[:-1])
+        group_id = np.cumsum(group_start) - 1
+
+        first = np.flatnonzero(group_start)
+        counts = np.diff(np.r_[first, n])
+        for i, c in zip(first, counts):
+            self.event_counts[(int(ab[i]), int(tg[i]))] = int(c)
+
+        # On/off after each event. removestack alone doesn't change state (matches the
+        # old Shell Concussion loop, which ignored it), so carry the last decisive event.
+        decisive = kind != REMOVE_STACK
+        last_dec = np.maximum.accumulate(np.where(decisive, np.arange(n), -1))
+        group_first = first[group_id]
+        on = np.where(last_dec >= group_first, kind[np.maximum(last_dec, 0)] != REMOVE, False)
+        prev_on = np.zeros(n, dtype=bool)
+        prev_on[1:] = on[:-1]
+        prev_on[group_start] = False
+        opens = on & ~prev_on
+        closes = ~on & prev_on
+
+        # Stack count after each event: explicit stack field, 1 on plain apply,
+        # 0 on remove, otherwise carried forward within the group (refresh).
+        val = np.where(stack >= 0, stack, -1)
+        val = np.where((kind == APPLY) & (stack < 0), 1, val)
+        val = np.where(kind == REMOVE, 0, val)
+        val = np.where(group_start & (val < 0), 1, val)
+        has = val >= 0
+        last_idx = np.maximum.accumulate(np.where(has, np.arange(n), 0))
+        stacks = val[last_idx]
+
+        toggles = np.flatnonzero(opens | closes)
+        if len(toggles) == 0:
+            return
+        t_open = opens[toggles]
+        t_group = group_id[toggles]
+
+        nxt_same = np.zeros(len(toggles), dtype=bool)
+        nxt_same[:-1] = t_group[1:] == t_group[:-1]
+        nxt_is_close = np.zeros(len(toggles), dtype=bool)
+        nxt_is_close[:-1] = ~t_open[1:]
+
+        open_pos = np.flatnonzero(t_open)
+        open_idx = toggles[open_pos]
+        closed = nxt_same[open_pos] & nxt_is_close[open_pos]
+        close_idx = np.where(closed, toggles[np.minimum(open_pos + 1, len(toggles) - 1)], -1)
+
+        starts = ts[open_idx]
+        ends = np.where(closed, ts[close_idx], self.fight_end)
+        ends = np.maximum(ends, starts)
+
+        # max stacks over [open, close) — break the event axis at every toggle and group start
+        breaks = np.union1d(toggles, first)
+        seg_max = np.maximum.reduceat(stacks, breaks)
+        self.max_stacks = seg_max[np.searchsorted(breaks, open_idx)]
+
+        self.ability = ab[open_idx]
+        self.target = tg[open_idx]
+        self.start = starts
+        self.end = ends
+
+    # -------------------- QUERIES --------------------
+
+    def _mask(self, ability_id: Optional[int], target_ids: Optional[Iterable[int]]) -> np.ndarray:
+        m = np.ones(len(self.start), dtype=bool)
+        if ability_id is not None:
+            m &= self.ability == ability_id
+        if target_ids is not None:
+            m &= np.isin(self.target, np.fromiter(target_ids, dtype=np.int64))
+        return m
+
+    def uptime(self, ability_id: int, target_ids: Optional[Iterable[int]] = None) -> Tuple[int, List[int]]:
+        """
+        (uptime_ms, application timestamps) for ability_id on the union of target_ids
+        (all targets if None). Overlapping intervals on different targets count once.
+        """
+        m = self._mask(ability_id, None if target_ids is None else list(target_ids))
+        seg_s, seg_e = union_intervals(self.start[m], self.end[m])
+        return int((seg_e - seg_s).sum()), [int(t) for t in seg_s]
+
+    def event_count(self, ability_id: int, target_ids: Optional[Iterable[int]] = None) -> int:
+        wanted = None if target_ids is None else set(target_ids)
+        return sum(
+            c for (ab, tg), c in self.event_counts.items()
+            if ab == ability_id and (wanted is None or tg in wanted)
+        )
+
+    def table(self) -> List[Dict[str, Any]]:
+        """
+        One row per (ability, target): applications, uptime, stacks, application times.
+        """
+        n = len(self.start)
+        if n == 0:
+            return []
+        fight_len = max(0, self.fight_end - self.fight_start)
+        order = np.lexsort((self.start, self.target, self.ability))
+        ab, tg = self.ability[order], self.target[order]
+        st, en, stk = self.start[order], self.end[order], self.max_stacks[order]
+
+        first = np.ones(n, dtype=bool)
+        first[1:] = (ab[1:] != ab[:-1]) | (tg[1:] != tg[:-1])
+        bounds = np.flatnonzero(first)
+        dur = en - st
+        uptime = np.add.reduceat(dur, bounds)
+        max_stacks = np.maximum.reduceat(stk, bounds)
+        apps = np.diff(np.r_[bounds, n])
+
+        rows: List[Dict[str, Any]] = []
+        for k, b in enumerate(bounds):
+            abid, tid = int(ab[b]), int(tg[b])
+            rows.append({
+                "ability": abid,
+                "name": self.names.get(abid),
+                "target": tid,
+                "applications": int(apps[k]),
+                "uptime_ms": int(uptime[k]),
+                "uptime_pct": float(uptime[k] / fight_len * 100.0) if fight_len > 0 else 0.0,
+                "max_stacks": int(max_stacks[k]),
+                "events": self.event_counts.get((abid, tid), 0),
+                "application_times": [int(t) for t in st[b:b + apps[k]]],
+            })
+        return rows
@@ -0,0 +1,171 @@
+"""
+Hermetic report bundles: one compressed, checksummed file per report that every
+analyzer can run from with no network and no credentials.
+
+    py bundle.py export vFYGaXZgdTk9P6tz                 # API (or --db store) -> vFYGaXZgdTk9P6tz.wclb
+    py bundle.py verify vFYGaXZgdTk9P6tz.wclb
+    py bundle.py import vFYGaXZgdTk9P6tz.wclb            # -> event store
+    $env:WCL_BUNDLE="vFYGaXZgdTk9P6tz.wclb"; py megaera.py
+
+Layout: b"WCLBND01", u64 manifest length, manifest JSON (code, title, counts,
+the report's masterData abilities, sha256 of the payload), then the payload: an archive.py image (fights, actors
+and every event of every exported fight from both All passes) compressed with
+lzma. Any dataType / hostility / ability / target query is answered from those
+events, so the bundle covers all the scripts' event streams. With WCL_BUNDLE set,
+wcl is offline: the bundle serves fetch_report / iter_events, asking for another
+report or an unexported fight raises KeyError, the ability dictionary is filled
+from the manifest (so names print offline), and anything that would reach gql()
+raises wcl.OfflineError.
+"""
+import argparse
+import hashlib
+import json
+import lzma
+import os
+import struct
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import wcl
+from abilities import get_dictionary, report_abilities
+from archive import Archive, archive_to_store, encode_archive
+from event_store import DEFAULT_DB, EventStore
+
+MAGIC = b"WCLBND01"
+
+
+def _read(path: str) -> Tuple[Dict[str, Any], bytes]:
+    with open(path, "rb") as fh:
+        raw = fh.read()
+    if raw[:8] != MAGIC:
+        raise ValueError(f"{path}: not a WCL bundle")
+    (mlen,) = struct.unpack_from("<Q", raw, 8)
+    manifest = json.loads(raw[16:16 + mlen].decode("utf-8"))
+    payload = raw[16 + mlen:]
+    digest = hashlib.sha256(payload).hexdigest()
+    if digest != manifest.get("sha256"):
+        raise ValueError(f"{path}: checksum mismatch (expected {manifest.get('sha256')}, got {digest})")
+    return manifest, payload
+
+
+class BundleArchive(Archive):
+    """
+    An in-memory Archive that also lists its report's abilities (abilities.fill_from_report).
+    """
+
+    def __init__(self, path: str, data: bytes, abilities: List[Dict[str, Any]]):
+        super().__init__(path, data=data)
+        self.abilities = abilities
+
+    def report_abilities(self, code: str) -> List[Dict[str, Any]]:
+        self._check(code)
+        return self.abilities
+
+
+def write_bundle(
+    path: str,
+    store: EventStore,
+    code: str,
+    abilities: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """
+    Writes code (already in store) to path. Returns the manifest.
+    abilities is the report's masterData ability list; without it, whatever the local
+    ability dictionary knows about the abilities in the events is stored.
+    """
+    title, fights, actors = store.fetch_report(code)
+    events_by_fight: Dict[int, List[Dict[str, Any]]] = {}
+    for fid, data in store.db.execute("SELECT fight, data FROM events WHERE code = ? ORDER BY fight, timestamp, id", (code,)):
+        events_by_fight.setdefault(fid, []).append(json.loads(data))
+
+    if abilities is None:
+        abilities = get_dictionary().listing(
+            e.get("abilityGameID") for evs in events_by_fight.values() for e in evs
+        )
+
+    payload = lzma.compress(encode_archive(code, title, fights, actors, events_by_fight), preset=6)
+    manifest = {
+        "code": code,
+        "title": title,
+        "created_at": time.time(),
+        "fights": len(fights),
+        "events": sum(len(v) for v in events_by_fight.values()),
+        "abilities": abilities,
+        "compression": "lzma",
+        "sha256": hashlib.sha256(payload).hexdigest(),
+    }
+    head = json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(MAGIC + struct.pack("<Q", len(head)) + head + payload)
+    os.replace(tmp, path)
+    return manifest
+
+
+def load_bundle(path: str) -> BundleArchive:
+    """
+    Verified, decompressed bundle as an in-memory Archive (a wcl backend).
+    """
+    manifest, payload = _read(path)
+    return BundleArchive(path, lzma.decompress(payload), manifest.get("abilities") or [])
+
+
+def export_report(
+    headers: Dict[str, str],
+    code: str,
+    path: str,
+    store: Optional[EventStore] = None,
+) -> Dict[str, Any]:
+    """
+    Bundles code from store when it's already there, else fetches it from the API first
+    (every pull: wipe counts need the wipes too). With credentials, the report's ability
+    list comes from the API; otherwise from the local ability dictionary.
+    """
+    if store is None or not store.has_report(code):
+        store = EventStore(":memory:")
+        store.ingest(headers, code)
+    abilities = report_abilities(headers, code) if headers else None
+    return write_bundle(path, store, code, abilities)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Export/verify/import hermetic report bundles.")
+    ap.add_argument("--db", default=DEFAULT_DB, help=f"SQLite event store (default: {DEFAULT_DB})")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="Report -> bundle (from the event store if present, else the API)")
+    ex.add_argument("code")
+    ex.add_argument("--out", help="Bundle path (default: <code>.wclb)")
+    ve = sub.add_parser("verify", help="Check a bundle's checksum and print its manifest")
+    ve.add_argument("path")
+    im = sub.add_parser("import", help="Bundle -> event store")
+    im.add_argument("path")
+    args = ap.parse_args()
+
+    if args.cmd == "verify":
+        manifest, _ = _read(args.path)
+        manifest["abilities"] = len(manifest.get("abilities") or [])
+        print(json.dumps(manifest, indent=2))
+        return
+
+    wcl.set_backend(None)  # export fetches from the API when the store doesn't have the report
+    store = EventStore(args.db) if os.path.exists(args.db) or args.cmd == "import" else None
+    try:
+        if args.cmd == "export":
+            out = args.out or f"{args.code}.wclb"
+            headers: Dict[str, str] = {}
+            if store is None or not store.has_report(args.code):
+                token = wcl.get_token(os.getenv("WCL_CLIENT_ID", ""), os.getenv("WCL_CLIENT_SECRET", ""))
+                headers = {"Authorization": f"Bearer {token}"}
+            m = export_report(headers, args.code, out, store=store)
+            print(f"{args.code} -> {out}: {m['fights']} fights, {m['events']:,} events, {len(m['abilities'])} abilities, "
+                  f"{os.path.getsize(out):,} bytes, sha256 {m['sha256'][:12]}")
+        else:
+            n = archive_to_store(load_bundle(args.path), store)
+            print(f"{args.path} -> {args.db} ({n:,} events)")
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
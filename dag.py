@@ -0,0 +1,134 @@
+"""
+Small dependency-aware executor for analysis steps.
+
+Each step names the steps whose outputs it needs; a step starts as soon as its
+inputs are done, so independent work (different kills, different bosses, or
+unrelated queries within a kill) runs concurrently on a thread pool. Most steps
+wait on the network, so threads are enough.
+
+Outputs found in the cache dict are reused without running the step. After a
+run, timings hold each step's start/end and critical_path() gives the chain of
+dependent steps that bounded the wall time.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+class Dag:
+    def __init__(self, cache: Optional[Dict[Hashable, Any]] = None):
+        self.steps: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...], Hashable]] = {}
+        self.cache: Dict[Hashable, Any] = {} if cache is None else cache
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        self.cached: List[str] = []
+        self.wall_s = 0.0
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = (), cache_key: Optional[Hashable] = None) -> str:
+        """
+        fn is called with the outputs of deps as positional arguments, in order.
+        cache_key defaults to name.
+        """
+        if name in self.steps:
+            raise ValueError(f"duplicate step {name!r}")
+        self.steps[name] = (fn, tuple(deps), name if cache_key is None else cache_key)
+        return name
+
+    def _check(self) -> None:
+        for name, (_, deps, _) in self.steps.items():
+            for d in deps:
+                if d not in self.steps:
+                    raise ValueError(f"step {name!r} depends on unknown step {d!r}")
+        # Kahn's algorithm, only to reject cycles before anything runs
+        indeg = {n: len(deps) for n, (_, deps, _) in self.steps.items()}
+        users: Dict[str, List[str]] = {n: [] for n in self.steps}
+        for n, (_, deps, _) in self.steps.items():
+            for d in deps:
+                users[d].append(n)
+        ready = [n for n, k in indeg.items() if k == 0]
+        seen = 0
+        while ready:
+            n = ready.pop()
+            seen += 1
+            for u in users[n]:
+                indeg[u] -= 1
+                if indeg[u] == 0:
+                    ready.append(u)
+        if seen != len(self.steps):
+            raise ValueError("step dependencies contain a cycle")
+
+    def run(self, workers: int = 4) -> Dict[str, Any]:
+        self._check()
+        t0 = time.perf_counter()
+        pending = dict(self.steps)
+        running: Dict[Future, str] = {}
+
+        def launch(pool: ThreadPoolExecutor) -> None:
+            for name in list(pending):
+                fn, deps, key = pending[name]
+                if not all(d in self.results for d in deps):
+                    continue
+                del pending[name]
+                if key in self.cache:
+                    self.results[name] = self.cache[key]
+                    self.cached.append(name)
+                    now = time.perf_counter() - t0
+                    self.timings[name] = (now, now)
+                    continue
+                args = [self.results[d] for d in deps]
+                start = time.perf_counter() - t0
+
+                def call(fn=fn, args=args, start=start) -> Tuple[Any, float, float]:
+                    out = fn(*args)
+                    return out, start, time.perf_counter() - t0
+
+                running[pool.submit(call)] = name
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            # cache hits can unblock other steps immediately, so launch until stable
+            before = -1
+            while len(pending) != before:
+                before = len(pending)
+                launch(pool)
+            while running:
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    out, start, end = fut.result()
+                    self.results[name] = out
+                    self.cache[self.steps[name][2]] = out
+                    self.timings[name] = (start, end)
+                before = -1
+                while len(pending) != before:
+                    before = len(pending)
+                    launch(pool)
+
+        self.wall_s = time.perf_counter() - t0
+        return self.results
+
+    def critical_path(self) -> Tuple[float, List[str]]:
+        """
+        (seconds, [step, ...]) for the dependency chain with the largest summed run time.
+        """
+        best: Dict[str, Tuple[float, List[str]]] = {}
+
+        def longest(name: str) -> Tuple[float, List[str]]:
+            if name not in best:
+                s, e = self.timings.get(name, (0.0, 0.0))
+                prev = max((longest(d) for d in self.steps[name][1]), default=(0.0, []), key=lambda t: t[0])
+                best[name] = (prev[0] + (e - s), prev[1] + [name])
+            return best[name]
+
+        return max((longest(n) for n in self.steps), default=(0.0, []), key=lambda t: t[0])
+
+    def report(self) -> str:
+        busy = sum(e - s for s, e in self.timings.values())
+        cp_s, cp = self.critical_path()
+        lines = [
+            f"Steps: {len(self.steps)} ({len(self.cached)} cached)   wall {self.wall_s:.2f}s   "
+            f"step time {busy:.2f}s   critical path {cp_s:.2f}s",
+        ]
+        for name in cp:
+            s, e = self.timings.get(name, (0.0, 0.0))
+            lines.append(f"  {name:<32s} {s:7.2f}s -> {e:7.2f}s  ({e - s:.2f}s)")
+        return "\n".join(lines)
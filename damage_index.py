@@ -0,0 +1,108 @@
+"""
+Per-target cumulative damage index (prefix sums) for range-damage queries.
+
+Built once from a DamageDone stream; "damage to targets T in [a, b]" is then two
+bisects and a subtraction per target.
+"""
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class DamageIndex:
+    def __init__(self) -> None:
+        self._rows: Dict[int, List[tuple]] = {}
+        self.ts: Dict[int, List[int]] = {}
+        # cum_*[tid][i] == total over the first i events (cum_*[tid][0] == 0)
+        self.cum_amount: Dict[int, List[int]] = {}
+        self.cum_absorbed: Dict[int, List[int]] = {}
+
+    @classmethod
+    def from_events(cls, events: Iterable[Dict[str, Any]]) -> "DamageIndex":
+        idx = cls()
+        for e in events:
+            idx.add_event(e)
+        idx.finalize()
+        return idx
+
+    def add_event(self, e: Dict[str, Any]) -> None:
+        if (e.get("type") or "").lower() != "damage":
+            return
+        tid = e.get("targetID")
+        ts = e.get("timestamp")
+        if not (isinstance(tid, int) and isinstance(ts, int)):
+            return
+        amt = e.get("amount")
+        absorbed = e.get("absorbed")
+        amt = amt if isinstance(amt, int) and amt > 0 else 0
+        absorbed = absorbed if isinstance(absorbed, int) and absorbed > 0 else 0
+        if amt == 0 and absorbed == 0:
+            return
+        self._rows.setdefault(tid, []).append((ts, amt, absorbed))
+
+    def finalize(self) -> "DamageIndex":
+        for tid, rows in self._rows.items():
+            # fold in anything already finalized so add_event() after finalize() still works
+            ts_old = self.ts.get(tid, [])
+            amt_old = self.cum_amount.get(tid, [0])
+            abs_old = self.cum_absorbed.get(tid, [0])
+            for i, t in enumerate(ts_old):
+                rows.append((t, amt_old[i + 1] - amt_old[i], abs_old[i + 1] - abs_old[i]))
+            rows.sort(key=lambda r: r[0])
+
+            ts: List[int] = []
+            cum_amt = [0]
+            cum_abs = [0]
+            for t, a, b in rows:
+                ts.append(t)
+                cum_amt.append(cum_amt[-1] + a)
+                cum_abs.append(cum_abs[-1] + b)
+            self.ts[tid] = ts
+            self.cum_amount[tid] = cum_amt
+            self.cum_absorbed[tid] = cum_abs
+        self._rows = {}
+        return self
+
+    def targets(self) -> List[int]:
+        return sorted(self.ts)
+
+    def _range(self, tid: int, start: Optional[int], end: Optional[int]):
+        ts = self.ts.get(tid)
+        if not ts:
+            return None
+        lo = 0 if start is None else bisect_left(ts, start)
+        hi = len(ts) if end is None else bisect_right(ts, end)
+        if hi <= lo:
+            return None
+        return lo, hi
+
+    def damage_by_target(
+        self,
+        target_ids: Iterable[int],
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        include_absorbed: bool = False,
+    ) -> Dict[int, int]:
+        """
+        {targetID: damage in [start, end]} (inclusive), omitting targets with none.
+        """
+        out: Dict[int, int] = {}
+        for tid in target_ids:
+            r = self._range(tid, start, end)
+            if r is None:
+                continue
+            lo, hi = r
+            total = self.cum_amount[tid][hi] - self.cum_amount[tid][lo]
+            if include_absorbed:
+                total += self.cum_absorbed[tid][hi] - self.cum_absorbed[tid][lo]
+            if total:
+                out[tid] = total
+        return out
+
+    def damage(
+        self,
+        target_ids: Iterable[int],
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        include_absorbed: bool = False,
+    ) -> int:
+        return sum(self.damage_by_target(target_ids, start, end, include_absorbed).values())
@@ -0,0 +1,158 @@
+"""
+Player death recaps in one pass.
+
+Each player keeps a bounded ring buffer (deque) of recent damage taken and
+healing received; when a death event arrives the buffer already holds what
+killed them, so no per-death window query is needed. Memory is bounded by
+raid size x max_events.
+"""
+import heapq
+import os
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
+
+from wcl import fetch_report, fight_player_ids, get_token, iter_events
+
+REPORT_CODE = "vFYGaXZgdTk9P6tz"
+CLIENT_ID = os.getenv("WCL_CLIENT_ID", "")
+CLIENT_SECRET = os.getenv("WCL_CLIENT_SECRET", "")
+
+
+def mmss_from_ms(ms: int) -> str:
+    s = ms // 1000
+    m, s = divmod(s, 60)
+    return f"{m}:{s:02d}"
+
+
+def _hp_pct(e: Dict[str, Any]) -> Optional[float]:
+    # hitPoints on damage/heal events describe the target unless resourceActor says source
+    if e.get("resourceActor") == 1:
+        return None
+    hp, mhp = e.get("hitPoints"), e.get("maxHitPoints")
+    if isinstance(hp, int) and isinstance(mhp, int) and mhp > 0:
+        return 100.0 * hp / mhp
+    return None
+
+
+class DeathRecorder:
+    def __init__(self, player_ids: Set[int], window_ms: int = 10_000, max_events: int = 64):
+        self.player_ids = set(player_ids)
+        self.window_ms = window_ms
+        self.buffers: Dict[int, Deque[Dict[str, Any]]] = {}
+        self.max_events = max_events
+        self.recaps: List[Dict[str, Any]] = []
+
+    def add_event(self, e: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        et = (e.get("type") or "").lower()
+        tid = e.get("targetID")
+        ts = e.get("timestamp")
+        if not (isinstance(tid, int) and isinstance(ts, int)) or tid not in self.player_ids:
+            return None
+
+        if et in {"damage", "heal", "absorbed"}:
+            buf = self.buffers.get(tid)
+            if buf is None:
+                buf = self.buffers[tid] = deque(maxlen=self.max_events)
+            amount = e.get("amount") if isinstance(e.get("amount"), int) else 0
+            buf.append({
+                "timestamp": ts,
+                "type": et,
+                "sourceID": e.get("sourceID"),
+                "abilityGameID": e.get("abilityGameID"),
+                "amount": amount,
+                "overkill": e.get("overkill") if isinstance(e.get("overkill"), int) else 0,
+                "absorbed": e.get("absorbed") if isinstance(e.get("absorbed"), int) else 0,
+                "overheal": e.get("overheal") if isinstance(e.get("overheal"), int) else 0,
+                "hp_pct": _hp_pct(e),
+            })
+            return None
+
+        if et != "death":
+            return None
+
+        buf = self.buffers.pop(tid, deque())
+        recent = [r for r in buf if r["timestamp"] >= ts - self.window_ms]
+        hits = [r for r in recent if r["type"] == "damage"]
+
+        killing_blow: Optional[Dict[str, Any]] = None
+        if hits:
+            killing_blow = next((r for r in reversed(hits) if r["overkill"] > 0), hits[-1])
+        elif isinstance(e.get("killingAbilityGameID"), int):
+            killing_blow = {
+                "timestamp": ts,
+                "type": "damage",
+                "sourceID": e.get("killerID"),
+                "abilityGameID": e["killingAbilityGameID"],
+                "amount": 0, "overkill": 0, "absorbed": 0, "overheal": 0, "hp_pct": None,
+            }
+
+        recap = {
+            "player": tid,
+            "timestamp": ts,
+            "events": recent,
+            "killing_blow": killing_blow,
+            "damage_taken": sum(r["amount"] + r["absorbed"] for r in hits),
+            "healing_received": sum(r["amount"] for r in recent if r["type"] != "damage"),
+            "hp": [(r["timestamp"], r["hp_pct"]) for r in recent if r["hp_pct"] is not None],
+        }
+        self.recaps.append(recap)
+        return recap
+
+
+def death_recaps(
+    events: Iterable[Dict[str, Any]],
+    player_ids: Set[int],
+    window_ms: int = 10_000,
+    max_events: int = 64,
+) -> List[Dict[str, Any]]:
+    rec = DeathRecorder(player_ids, window_ms=window_ms, max_events=max_events)
+    for e in events:
+        rec.add_event(e)
+    return rec.recaps
+
+
+def fight_death_recaps(
+    headers: Dict[str, str],
+    code: str,
+    fight: Dict[str, Any],
+    window_ms: int = 10_000,
+    max_events: int = 64,
+) -> List[Dict[str, Any]]:
+    """
+    DamageTaken, Healing and Deaths streams merged by timestamp and consumed once.
+    """
+    start, end, fight_id = fight["startTime"], fight["endTime"], fight["id"]
+    streams = [
+        iter_events(headers, code, fight_id, start, end, dt)
+        for dt in ("DamageTaken", "Healing", "Deaths")
+    ]
+    merged = heapq.merge(*streams, key=lambda e: e.get("timestamp") or 0)
+    return death_recaps(merged, fight_player_ids(fight), window_ms=window_ms, max_events=max_events)
+
+
+def main() -> None:
+    token = get_token(CLIENT_ID, CLIENT_SECRET)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    title, fights, players = fetch_report(headers, REPORT_CODE)
+    names = {a["id"]: a.get("name") for a in players if isinstance(a, dict) and isinstance(a.get("id"), int)}
+    print(f"\nReport: {title} ({REPORT_CODE})\n")
+
+    for f in fights:
+        if not isinstance(f, dict) or f.get("kill") is not True:
+            continue
+        recaps = fight_death_recaps(headers, REPORT_CODE, f)
+        print(f"{f['name']}  (fight id {f['id']})  deaths: {len(recaps)}")
+        for r in recaps:
+            kb = r["killing_blow"] or {}
+            print(
+                f"  {mmss_from_ms(r['timestamp'] - f['startTime'])}  "
+                f"{str(names.get(r['player'], r['player'])):<16s} "
+                f"killing blow: ability {kb.get('abilityGameID', '-')} from {kb.get('sourceID', '-')}  "
+                f"taken {r['damage_taken']:,} / healed {r['healing_received']:,} in last {len(r['events'])} events"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,20 @@
 # council_analysis_kills_only.py
 import os
-import requests
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Optional
+
+from aggregators import SHARDS
+from dag import Dag
+from encounters import ENCOUNTERS, run_encounter
+from memo import memoized, report as memo_report
+from warehouse import record
+from wcl import fetch_report, get_token
 
 REPORT_CODE = "vFYGaXZgdTk9P6tz"
 CLIENT_ID = os.getenv("WCL_CLIENT_ID", "")
 CLIENT_SECRET = os.getenv("WCL_CLIENT_SECRET", "")
 
-API_URL = "https://classic.warcraftlogs.com/api/v2/client"
-TOKEN_URL = "https://classic.warcraftlogs.com/oauth/token"
-
 COUNCIL_FIGHT_NAME = "Council of Elders"
-
-ELDER_KEYS = {
-    "Malakk": ["malakk"],
-    "Mar'li": ["mar", "li"],
-    "Kazra'jin": ["kazra"],
-    "Sul": ["sul", "sand"],
-}
-
-
-def get_token(client_id: str, client_secret: str) -> str:
-    if not client_id or not client_secret:
-        raise SystemExit("Missing CLIENT_ID / CLIENT_SECRET.")
-    r = requests.post(
-        TOKEN_URL,
-        data={"grant_type": "client_credentials"},
-        auth=(client_id, client_secret),
-        timeout=30,
-    )
-    r.raise_for_status()
-    return r.json()["access_token"]
-
-
-def gql(headers: Dict[str, str], query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
-    r = requests.post(API_URL, json={"query": query, "variables": variables}, headers=headers, timeout=30)
-    r.raise_for_status()
-    payload = r.json()
-    if payload.get("errors"):
-        raise RuntimeError(payload["errors"])
-    return payload["data"]
+ANALYZER_VERSION = 1
 
 
 def mmss_from_ms(ms: int) -> str:
@@ -52,142 +27,45 @@ def rel_mmss(ts_abs: int, fight_start: int) -> str:
     return mmss_from_ms(ts_abs - fight_start)
 
 
-def _norm(s: str) -> str:
-    return (s or "").lower().replace("’", "'")
-
-
-def iter_events(
-    headers: Dict[str, str],
-    code: str,
-    fight_id: int,
-    fight_start: int,
-    fight_end: int,
-    data_type: str,
-) -> Iterable[Dict[str, Any]]:
-    query = f"""
-    query($code: String!, $fightID: Int!, $pageStart: Float!, $end: Float!) {{
-      reportData {{
-        report(code: $code) {{
-          events(
-            fightIDs: [$fightID]
-            startTime: $pageStart
-            endTime: $end
-            dataType: {data_type}
-            limit: 5000
-          ) {{
-            data
-            nextPageTimestamp
-          }}
-        }}
-      }}
-    }}
-    """
-
-    page_start = fight_start
-    while True:
-        data = gql(headers, query, {"code": code, "fightID": fight_id, "pageStart": page_start, "end": fight_end})
-        ev = data["reportData"]["report"]["events"]
-
-        for e in ev.get("data") or []:
-            if isinstance(e, dict):
-                yield e
-
-        nxt = ev.get("nextPageTimestamp")
-        if not nxt:
-            break
-        page_start = nxt
-
-
-def fetch_report(headers: Dict[str, str], code: str):
-    query = """
-    query($code: String!) {
-      reportData {
-        report(code: $code) {
-          title
-          fights { id name kill startTime endTime }
-          masterData { actors { id name type subType } }
-        }
-      }
-    }
-    """
-    data = gql(headers, query, {"code": code})
-    rep = data["reportData"]["report"]
-    return rep["title"], (rep["fights"] or []), (rep["masterData"]["actors"] or [])
-
-
-def find_actor_ids_fuzzy(actors: List[Dict[str, Any]], required_substrings: List[str]) -> List[Dict[str, Any]]:
-    req = [_norm(x) for x in required_substrings]
-    hits: List[Dict[str, Any]] = []
-
-    for a in actors:
-        if not isinstance(a, dict):
-            continue
-        name = a.get("name")
-        if not isinstance(name, str):
-            continue
-        n = _norm(name)
-        if all(r in n for r in req):
-            hits.append(a)
-
-    # Prefer non-players
-    def score(a: Dict[str, Any]) -> Tuple[int, int]:
-        t = _norm(str(a.get("type") or ""))
-        st = _norm(str(a.get("subType") or ""))
-        is_player = (t == "player") or (st == "player")
-        return (1 if is_player else 0, len(_norm(a.get("name") or "")))
-
-    hits.sort(key=score)
-    return hits
-
-
-def build_elder_id_map(actors: List[Dict[str, Any]]) -> Dict[str, List[int]]:
-    out: Dict[str, List[int]] = {}
-    for label, subs in ELDER_KEYS.items():
-        hits = find_actor_ids_fuzzy(actors, subs)
-        out[label] = [h["id"] for h in hits if isinstance(h.get("id"), int)]
-    return out
-
-
 def council_death_times_for_kill(
     headers: Dict[str, str],
     code: str,
     fight: Dict[str, Any],
-    elder_ids: Dict[str, List[int]],
+    shards: int = 1,
+    workers: int = 1,
 ) -> Dict[str, Optional[int]]:
     """
     Use dataType: All and filter event types for NPC deaths.
     This avoids cases where dataType: Deaths only returns player deaths.
+    The Council spec keeps only each elder's first death.
     """
-    start = fight["startTime"]
-    end = fight["endTime"]
-    fight_id = fight["id"]
+    spec = ENCOUNTERS[COUNCIL_FIGHT_NAME]
+    deaths = run_encounter(headers, code, fight, spec, shards=shards, workers=workers)["deaths"]
+    return {label: (ts[0] if ts else None) for label, ts in deaths.items()}
 
-    wanted = {i for ids in elder_ids.values() for i in ids}
-    deaths: Dict[str, Optional[int]] = {k: None for k in elder_ids.keys()}
 
-    if not wanted:
-        return deaths
+def kill_result(headers: Dict[str, str], code: str, fight: Dict[str, Any], shards: int = SHARDS) -> Dict[str, Optional[int]]:
+    """
+    council_death_times_for_kill() through the memo.
+    """
+    return memoized(
+        code, fight, "council",
+        lambda: council_death_times_for_kill(headers, code, fight, shards=shards, workers=shards),
+        source=__file__, config={"version": ANALYZER_VERSION}, streams=["All"],
+    )
 
-    for e in iter_events(headers, code, fight_id, start, end, "All"):
-        et = (e.get("type") or "").lower()
-        if et not in {"death", "destroy"}:
-            continue
 
-        ts = e.get("timestamp")
-        tid = e.get("targetID")
-        if not isinstance(ts, int) or not isinstance(tid, int):
-            continue
-        if tid not in wanted:
-            continue
+def add_kill_steps(dag: Dag, headers: Dict[str, str], code: str, fight: Dict[str, Any]) -> str:
+    """
+    Registers this kill on overall.py's DAG; returns the step holding kill_result().
+    Unsharded: the DAG's workers already bound how many streams run at once.
+    """
+    return dag.add(f"{fight['id']}:council", lambda: kill_result(headers, code, fight, shards=1))
 
-        for elder, ids in elder_ids.items():
-            if tid in ids:
-                cur = deaths[elder]
-                if cur is None or ts < cur:
-                    deaths[elder] = ts
-                break
 
-    return deaths
+def kill_summary(result: Dict[str, Optional[int]], fight: Dict[str, Any]) -> str:
+    died = sorted((ts, label) for label, ts in result.items() if isinstance(ts, int))
+    return ", ".join(f"{label} {rel_mmss(ts, fight['startTime'])}" for ts, label in died) or "-"
 
 
 def main():
@@ -207,8 +85,6 @@ def main():
         print("No Council of Elders kills found.")
         return
 
-    elder_ids = build_elder_id_map(actors)
-
     print()
     print("Council of Elders — Elder death times (KILLS ONLY)")
     print("--------------------------------------------------")
@@ -217,7 +93,11 @@ def main():
         start = f["startTime"]
         dur = mmss_from_ms(f["endTime"] - start)
 
-        deaths = council_death_times_for_kill(headers, REPORT_CODE, f, elder_ids)
+        deaths = kill_result(headers, REPORT_CODE, f)
+        record(REPORT_CODE, f, "council", ANALYZER_VERSION, {
+            "duration_ms": f["endTime"] - start,
+            "elder_death_ms": {k: (ts - start if isinstance(ts, int) else None) for k, ts in deaths.items()},
+        })
 
         # Determine kill order (earliest death first)
         ordered = sorted(
@@ -242,5 +122,10 @@ def main():
         row = [dur] + [fmt(ts) for _, ts in ordered]
         print(row_fmt.format(*row))
 
+    summary = memo_report()
+    if summary:
+        print("\n" + summary)
+
+
 if __name__ == "__main__":
     main()
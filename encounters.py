@@ -0,0 +1,202 @@
+"""
+Declarative encounter specs (encounters/*.json) and the shared engine that runs them.
+
+A spec names the fight and, optionally:
+  - "labels": NPC labels -> gameIDs, either inline ({"Malakk": [69131]}) or the
+    name of a table in tot_npcs ("COUNCIL_ELDERS")
+  - "deaths": "first" or "all" death/destroy timestamps per label
+  - "abilities": tracked abilities {"Wind Storm": {"id", "types", "target"}}, where
+    target is "player", "enemy" or omitted for any
+  - "phases": a phases.py spec; death/hp boundaries may name "labels" (or "*")
+    instead of gameIDs
+
+CompiledEncounter resolves a spec against one fight into flat dicts keyed by
+actor id and (ability id, event type), so the engine does one hash lookup per
+event no matter how many labels or abilities the encounter has. The engine is a
+Group of aggregators.py aggregators (per-label death timestamps, ability hits), so
+adding a boss is a new JSON file; paging, sharding and merging come from there.
+"""
+import json
+import os
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+import tot_npcs
+from aggregators import Aggregator, Group, MinTimestampByLabel, TimestampsByLabel, run_fight
+from memo import register_data
+from wcl import fight_player_ids
+
+ENCOUNTER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "encounters")
+
+DEATH_TYPES = {"death", "destroy"}
+
+
+def encounter_files(directory: str = ENCOUNTER_DIR) -> List[str]:
+    return [os.path.join(directory, fn) for fn in sorted(os.listdir(directory)) if fn.endswith(".json")]
+
+
+def load_encounters(directory: str = ENCOUNTER_DIR) -> Dict[str, Dict[str, Any]]:
+    """
+    {fight name: raw spec} for every *.json in directory.
+    """
+    out: Dict[str, Dict[str, Any]] = {}
+    for path in encounter_files(directory):
+        fn = os.path.basename(path)
+        with open(path, "r", encoding="utf-8") as fh:
+            spec = json.load(fh)
+        if not isinstance(spec.get("name"), str):
+            raise ValueError(f"{fn}: encounter spec needs a 'name'")
+        out[spec["name"]] = spec
+    return out
+
+
+def label_game_ids(spec: Dict[str, Any]) -> Dict[str, Set[int]]:
+    labels = spec.get("labels") or {}
+    if isinstance(labels, str):
+        table = getattr(tot_npcs, labels, None)
+        if not isinstance(table, dict):
+            raise ValueError(f"{spec.get('name')}: unknown NPC table {labels!r}")
+        return {k: set(v) for k, v in table.items()}
+    return {k: {v} if isinstance(v, int) else set(v) for k, v in labels.items()}
+
+
+def phase_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The spec's "phases" block with label references replaced by gameIDs.
+    """
+    raw = spec.get("phases") or {}
+    gids = label_game_ids(spec)
+    out = dict(raw)
+    out["boundaries"] = []
+    for b in raw.get("boundaries") or []:
+        b = dict(b)
+        names = b.pop("labels", None)
+        if names is not None:
+            names = list(gids) if names == "*" else names
+            b["npcs"] = set().union(*(gids[n] for n in names))
+        elif "npcs" in b:
+            b["npcs"] = set(b["npcs"])
+        out["boundaries"].append(b)
+    return out
+
+
+def fight_labels(spec: Dict[str, Any], fight: Dict[str, Any]) -> Dict[str, Set[int]]:
+    """
+    {label: report actor ids} for the spec's labels in this fight.
+    """
+    return tot_npcs.resolve_fight_labels(fight, label_game_ids(spec))
+
+
+class CompiledEncounter:
+    def __init__(self, spec: Dict[str, Any], fight: Dict[str, Any]):
+        self.name = spec["name"]
+        self.labels: List[str] = list(label_game_ids(spec))
+        self.first_death_only = spec.get("deaths") == "first"
+        self.track_deaths = spec.get("deaths") in {"first", "all"}
+
+        # actor id -> label
+        self.label_of: Dict[int, str] = {
+            aid: label
+            for label, ids in fight_labels(spec, fight).items()
+            for aid in ids
+        }
+
+        # (ability id, event type) -> [(tracker name, required target side or None)]
+        self.abilities: Dict[Tuple[int, str], List[Tuple[str, Optional[str]]]] = {}
+        for name, a in (spec.get("abilities") or {}).items():
+            for et in a.get("types") or ["cast"]:
+                self.abilities.setdefault((a["id"], et.lower()), []).append((name, a.get("target")))
+
+        self.players: Set[int] = fight_player_ids(fight)
+        self.enemies: Set[int] = {
+            n["id"] for n in (fight.get("enemyNPCs") or [])
+            if isinstance(n, dict) and isinstance(n.get("id"), int)
+        }
+        self.phases = phase_spec(spec)
+
+
+class AbilityHits(TimestampsByLabel):
+    """
+    {tracker name: sorted timestamps} for the encounter's tracked abilities; one event can
+    feed several trackers (same ability id and type), so update() appends to each.
+    """
+
+    def __init__(self, enc: CompiledEncounter):
+        super().__init__(lambda e: None)
+        self.enc = enc
+
+    def _side_ok(self, side: Optional[str], actor: Any) -> bool:
+        if side is None:
+            return True
+        if side == "player":
+            return actor in self.enc.players
+        if side == "enemy":
+            return actor in self.enc.enemies
+        return False
+
+    def update(self, state: Dict[Hashable, List[int]], e: Dict[str, Any]) -> Dict[Hashable, List[int]]:
+        ts = e.get("timestamp")
+        if not isinstance(ts, int):
+            return state
+        abid = e.get("abilityGameID")
+        if abid is None and isinstance(e.get("ability"), dict):
+            abid = e["ability"].get("gameID")
+        for name, side in self.enc.abilities.get((abid, (e.get("type") or "").lower()), ()):
+            if self._side_ok(side, e.get("targetID")):
+                state.setdefault(name, []).append(ts)
+        return state
+
+
+class EncounterAggregator(Group):
+    """
+    Result: {"deaths": {label: [ts, ...]}, "abilities": {name: [ts, ...]}}, from
+    TimestampsByLabel (or MinTimestampByLabel with deaths == "first", so each label's
+    list holds at most its earliest death) and AbilityHits.
+    """
+
+    def __init__(self, enc: CompiledEncounter):
+        self.enc = enc
+        aggs: Dict[str, Aggregator] = {"abilities": AbilityHits(enc)}
+        if enc.track_deaths:
+            by_label = MinTimestampByLabel if enc.first_death_only else TimestampsByLabel
+            aggs["deaths"] = by_label(self._death_label, enc.labels)
+        super().__init__(**aggs)
+
+    def _death_label(self, e: Dict[str, Any]) -> Optional[str]:
+        if (e.get("type") or "").lower() not in DEATH_TYPES:
+            return None
+        return self.enc.label_of.get(e.get("targetID"))
+
+    def finalize(self, state: Dict[str, Any]) -> Dict[str, Dict[Hashable, List[int]]]:
+        out = super().finalize(state)
+        deaths = out.get("deaths", {})
+        if self.enc.first_death_only:
+            deaths = {k: [] if ts is None else [ts] for k, ts in deaths.items()}
+        return {"deaths": deaths, "abilities": out["abilities"]}
+
+
+def run_encounter(
+    headers: Dict[str, str],
+    code: str,
+    fight: Dict[str, Any],
+    spec: Optional[Dict[str, Any]] = None,
+    shards: int = 1,
+    workers: int = 1,
+    **iter_kwargs: Any,
+) -> Dict[str, Dict[Hashable, List[int]]]:
+    """
+    One All-events pass (or `shards` parallel ones) for the fight's encounter spec.
+    spec defaults to the file whose "name" matches the fight.
+    """
+    if spec is None:
+        spec = ENCOUNTERS.get(fight.get("name") or "")
+        if spec is None:
+            raise KeyError(f"no encounter spec for {fight.get('name')!r}")
+    agg = EncounterAggregator(CompiledEncounter(spec, fight))
+    if not agg.enc.label_of and not agg.enc.abilities:
+        return agg.finalize(agg.init())
+    return run_fight(agg, headers, code, fight, "All", shards=shards, workers=workers, **iter_kwargs)
+
+
+ENCOUNTERS: Dict[str, Dict[str, Any]] = load_encounters()
+# edited specs invalidate memoized results of every analyzer that imports this module
+register_data(__file__, encounter_files())
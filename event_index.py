@@ -0,0 +1,167 @@
+"""
+Inverted indexes over one stored fight: ability / target / source / type -> row ids.
+
+Rows are the fight's events in time order, so a row id range is a time range.
+Each column's postings are kept CSR-style (sorted distinct keys, offsets, and one
+uint32 array of row ids grouped by key, ascending within a key), built with a
+single stable argsort. A query unions the postings of each predicate's keys,
+then intersects predicates smallest-first by binary-searching the smaller list
+into the larger, so selective lookups ("Wind Storm applydebuffs on players")
+touch only matching rows. Both local backends (event_store.EventStore and
+archive.Archive) build these lazily per fight and answer fetch_events_page with
+them; indexed_events() exposes them directly for analyzers.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+import wcl
+
+# integer columns use this for "field absent"
+MISSING = -(2 ** 31)
+
+EMPTY = np.empty(0, dtype=np.uint32)
+
+
+def contains(sorted_rows: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Boolean mask: which of rows are in sorted_rows.
+    """
+    if len(sorted_rows) == 0 or len(rows) == 0:
+        return np.zeros(len(rows), dtype=bool)
+    pos = np.searchsorted(sorted_rows, rows)
+    pos[pos == len(sorted_rows)] = 0
+    return sorted_rows[pos] == rows
+
+
+def intersect(lists: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Intersection of sorted, duplicate-free row lists, smallest first.
+    """
+    if not lists:
+        return EMPTY
+    ordered = sorted(lists, key=len)
+    acc = ordered[0]
+    for other in ordered[1:]:
+        if len(acc) == 0:
+            break
+        acc = acc[contains(other, acc)]
+    return acc
+
+
+class Postings:
+    def __init__(self, values: np.ndarray):
+        order = np.argsort(values, kind="stable")
+        self.keys, starts = np.unique(values[order], return_index=True)
+        self.offsets = np.r_[starts, len(values)]
+        self.rows = order.astype(np.uint32)
+
+    def get(self, key: int) -> np.ndarray:
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.rows[self.offsets[i]:self.offsets[i + 1]]
+        return EMPTY
+
+    def union(self, keys: Iterable[int]) -> np.ndarray:
+        parts = [p for p in (self.get(k) for k in set(keys)) if len(p)]
+        if len(parts) <= 1:
+            return parts[0] if parts else EMPTY
+        # keys are distinct, so their row sets are disjoint
+        return np.sort(np.concatenate(parts))
+
+    def count(self, key: int) -> int:
+        return len(self.get(key))
+
+
+class FightEventIndex:
+    """
+    ts must be sorted; types are codes into type_names; missing ids are MISSING.
+    amount (missing -> 0) is kept as a plain column for aggregation (query.py).
+    """
+
+    def __init__(
+        self,
+        ts: np.ndarray,
+        types: np.ndarray,
+        type_names: List[str],
+        source: np.ndarray,
+        target: np.ndarray,
+        ability: np.ndarray,
+        amount: Optional[np.ndarray] = None,
+    ):
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.type_names = type_names
+        self.type = np.asarray(types)
+        self.source = np.asarray(source)
+        self.target = np.asarray(target)
+        self.ability = np.asarray(ability)
+        self.amount = np.zeros(len(self.ts), dtype=np.int64) if amount is None else np.asarray(amount, dtype=np.int64)
+        self.by_type = Postings(self.type)
+        self.by_source = Postings(self.source)
+        self.by_target = Postings(self.target)
+        self.by_ability = Postings(self.ability)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def type_codes(self, types: Iterable[str]) -> List[int]:
+        wanted = {t.lower() for t in types}
+        return [i for i, name in enumerate(self.type_names) if name.lower() in wanted]
+
+    def rows(
+        self,
+        types: Optional[Iterable[str]] = None,
+        abilities: Optional[Iterable[int]] = None,
+        targets: Optional[Iterable[int]] = None,
+        sources: Optional[Iterable[int]] = None,
+        not_targets: Optional[Iterable[int]] = None,
+        not_sources: Optional[Iterable[int]] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Sorted row ids matching every given predicate (each one an "any of" set);
+        start/end are inclusive timestamps.
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.ts, start, side="left"))
+        hi = len(self.ts) if end is None else int(np.searchsorted(self.ts, end, side="right"))
+        if lo >= hi:
+            return EMPTY
+
+        lists: List[np.ndarray] = []
+        if types is not None:
+            lists.append(self.by_type.union(self.type_codes(types)))
+        for postings, keys in ((self.by_ability, abilities), (self.by_target, targets), (self.by_source, sources)):
+            if keys is not None:
+                lists.append(postings.union(keys))
+
+        if lists:
+            rows = intersect(lists)
+            rows = rows[np.searchsorted(rows, lo):np.searchsorted(rows, hi)]
+        else:
+            rows = np.arange(lo, hi, dtype=np.uint32)
+
+        for postings, keys in ((self.by_target, not_targets), (self.by_source, not_sources)):
+            if keys is not None and len(rows):
+                rows = rows[~contains(postings.union(keys), rows)]
+        return rows
+
+
+def indexed_events(
+    code: str,
+    fight_id: int,
+    limit: Optional[int] = None,
+    **predicates: Any,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Events of a locally stored fight matching FightEventIndex.rows(**predicates), in
+    time order, or None when wcl is talking to the API (callers fall back to paging).
+    """
+    backend = wcl.get_backend()
+    if backend is None or not hasattr(backend, "event_index"):
+        return None
+    idx = backend.event_index(code, fight_id)
+    rows = idx.rows(**predicates)
+    if limit is not None:
+        rows = rows[:limit]
+    return backend.events_at(code, fight_id, rows)
@@ -0,0 +1,420 @@
+"""
+Local SQLite event store: ingest a report once, re-analyze it offline.
+
+    py event_store.py ingest vFYGaXZgdTk9P6tz           # fetch fights, actors, events
+    py event_store.py refresh vFYGaXZgdTk9P6tz          # live report: only new / still-open fights
+    py event_store.py list
+    $env:WCL_EVENT_STORE="wcl_events.sqlite"; py tortos.py   # any script, no API calls
+
+Each fight is stored from two All-events passes (default and Enemies hostility,
+de-duplicated), with the raw event JSON plus indexed columns. With
+WCL_EVENT_STORE set (or wcl.set_backend(EventStore(...))), wcl.fetch_report and
+wcl.fetch_events_page are answered from here: dataType, hostilityType,
+abilityID and targetID are resolved against per-fight inverted indexes
+(event_index.py) and only matching rows are loaded. wcl applies
+filterExpression and limit to the rows afterwards (filter_expr.py). Credentials
+are still needed for queries the store can't answer (e.g. ability names).
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+import wcl
+from aura_engine import AURA_EVENT_KINDS
+from event_index import MISSING, FightEventIndex
+from npc_stats import get_stats
+
+DEFAULT_DB = os.getenv("WCL_EVENT_STORE", "wcl_events.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    code TEXT PRIMARY KEY,
+    title TEXT,
+    ingested_at REAL,
+    end_time INTEGER
+);
+CREATE TABLE IF NOT EXISTS fights (
+    code TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT,
+    kill INTEGER,
+    start_time INTEGER,
+    end_time INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (code, id)
+);
+CREATE TABLE IF NOT EXISTS actors (
+    code TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (code, id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    code TEXT NOT NULL,
+    fight INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    type TEXT,
+    source INTEGER,
+    target INTEGER,
+    ability INTEGER,
+    amount INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_fight_ts ON events (code, fight, timestamp);
+CREATE INDEX IF NOT EXISTS events_fight_type ON events (code, fight, type);
+CREATE INDEX IF NOT EXISTS events_fight_target ON events (code, fight, target);
+CREATE INDEX IF NOT EXISTS events_fight_ability ON events (code, fight, ability);
+"""
+
+BUFF_TYPES = sorted(t for t in AURA_EVENT_KINDS if "debuff" not in t)
+DEBUFF_TYPES = sorted(t for t in AURA_EVENT_KINDS if "debuff" in t)
+
+# dataType -> (event types or None for all, whose hostility the filter applies to)
+DATA_TYPES: Dict[str, Tuple[Optional[List[str]], Optional[str]]] = {
+    "All": (None, None),
+    "DamageDone": (["damage"], "source"),
+    "DamageTaken": (["damage"], "target"),
+    "Healing": (["heal", "absorbed"], "source"),
+    "Deaths": (["death"], "target"),
+    "Buffs": (BUFF_TYPES, "target"),
+    "Debuffs": (DEBUFF_TYPES, "target"),
+    "Casts": (["begincast", "cast"], "source"),
+}
+
+
+def _int(v: Any) -> Optional[int]:
+    return v if isinstance(v, int) else None
+
+
+def _ability(e: Dict[str, Any]) -> Optional[int]:
+    abid = e.get("abilityGameID")
+    if isinstance(abid, int):
+        return abid
+    ab = e.get("ability")
+    if isinstance(ab, dict) and isinstance(ab.get("gameID"), int):
+        return ab["gameID"]
+    return None
+
+
+def page_rows(
+    idx: FightEventIndex,
+    enemies: Set[int],
+    start: int,
+    end: int,
+    data_type: str,
+    hostility_type: Optional[str] = None,
+    ability_id: Optional[int] = None,
+    target_id: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Row ids of one stored fight that an API events query with these arguments returns.
+    """
+    if data_type not in DATA_TYPES:
+        raise ValueError(f"local backends can't serve dataType {data_type!r}")
+    types, subject = DATA_TYPES[data_type]
+    preds: Dict[str, Any] = {"types": types, "start": start, "end": end}
+    if ability_id is not None:
+        preds["abilities"] = [int(ability_id)]
+    if target_id is not None:
+        preds["targets"] = [int(target_id)]
+    if subject is not None:
+        key = subject + "s"
+        if (hostility_type or "Friendlies") == "Enemies":
+            preds[key] = enemies if preds.get(key) is None else enemies & set(preds[key])
+        else:
+            preds["not_" + key] = enemies
+    return idx.rows(**preds)
+
+
+class EventStore:
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        if "end_time" not in {r[1] for r in self.db.execute("PRAGMA table_info(reports)")}:
+            self.db.execute("ALTER TABLE reports ADD COLUMN end_time INTEGER")  # stores from before refresh()
+        self._enemies: Dict[Tuple[str, int], Set[int]] = {}
+        self._indexes: Dict[Tuple[str, int], Tuple[FightEventIndex, np.ndarray]] = {}
+
+    def close(self) -> None:
+        self.db.close()
+
+    # -------------------- INGEST --------------------
+
+    @staticmethod
+    def _fetch_fight_events(headers: Dict[str, str], code: str, f: Dict[str, Any], api_url: str) -> List[Dict[str, Any]]:
+        """
+        The default pass plus the Enemies pass. Identical events within a pass (multi-hit
+        ticks) are all kept; an Enemies-pass event is dropped only while the default pass
+        still has an unmatched copy of it.
+        """
+        evs = list(wcl.iter_events(headers, code, f["id"], f["startTime"], f["endTime"], "All", api_url=api_url))
+        first = Counter(json.dumps(e, sort_keys=True) for e in evs)
+        for e in wcl.iter_events(headers, code, f["id"], f["startTime"], f["endTime"], "All",
+                                 hostility_type="Enemies", api_url=api_url):
+            raw = json.dumps(e, sort_keys=True)
+            if first[raw] > 0:
+                first[raw] -= 1
+            else:
+                evs.append(e)
+        return evs
+
+    def ingest(self, headers: Dict[str, str], code: str, kills_only: bool = False, api_url: str = wcl.API_URL) -> int:
+        """
+        Fetches the report and (re)writes its fights, actors and events. Returns events stored.
+        """
+        head = wcl.fetch_report_header(headers, code, api_url=api_url)
+        title, fights, actors = wcl.fetch_report(headers, code, api_url=api_url)
+        if kills_only:
+            fights = [f for f in fights if isinstance(f, dict) and f.get("kill") is True]
+
+        events_by_fight = {
+            f["id"]: self._fetch_fight_events(headers, code, f, api_url)
+            for f in fights
+            if isinstance(f, dict) and isinstance(f.get("id"), int)
+        }
+        return self.import_report(code, title, fights, actors, events_by_fight, end_time=head["endTime"])
+
+    def refresh(
+        self,
+        headers: Dict[str, str],
+        code: str,
+        kills_only: bool = False,
+        api_url: str = wcl.API_URL,
+    ) -> Dict[str, Any]:
+        """
+        Brings a stored (possibly still live) report up to date. One header query decides:
+        if the report's endTime, fight count and last fight endTime match, nothing else is
+        fetched. Otherwise only new fights and fights whose endTime moved (the one that was
+        still open) are re-fetched; finished, unchanged fights are never touched again.
+        Returns {"status": "new" | "unchanged" | "updated", "refetched": [fight ids], "events"}.
+        """
+        if not self.has_report(code):
+            n = self.ingest(headers, code, kills_only=kills_only, api_url=api_url)
+            return {"status": "new", "refetched": [], "events": n}
+
+        (stored_end,) = self.db.execute("SELECT end_time FROM reports WHERE code = ?", (code,)).fetchone()
+        stored = dict(self.db.execute("SELECT id, end_time FROM fights WHERE code = ?", (code,)).fetchall())
+        head = wcl.fetch_report_header(headers, code, api_url=api_url)
+        live = [f for f in head["fights"] if isinstance(f, dict) and isinstance(f.get("id"), int)]
+        if kills_only:
+            live = [f for f in live if f.get("kill") is True]
+
+        last = max(live, key=lambda f: f["id"], default=None)
+        if (
+            stored_end == head["endTime"]
+            and len(live) == len(stored)
+            and (last is None or stored.get(last["id"]) == last["endTime"])
+        ):
+            return {"status": "unchanged", "refetched": [], "events": 0}
+
+        changed = {f["id"] for f in live if stored.get(f["id"], -1) != f["endTime"]}
+        title, fights, actors = wcl.fetch_report(headers, code, api_url=api_url)
+        fights = [f for f in fights if isinstance(f, dict) and f.get("id") in changed]
+        events_by_fight = {f["id"]: self._fetch_fight_events(headers, code, f, api_url) for f in fights}
+        n = self.import_report(code, title, fights, actors, events_by_fight, end_time=head["endTime"], only_fights=changed)
+        return {"status": "updated", "refetched": sorted(changed), "events": n}
+
+    def import_report(
+        self,
+        code: str,
+        title: str,
+        fights: List[Dict[str, Any]],
+        actors: List[Dict[str, Any]],
+        events_by_fight: Dict[int, List[Dict[str, Any]]],
+        end_time: Optional[int] = None,
+        only_fights: Optional[Set[int]] = None,
+    ) -> int:
+        """
+        Replaces everything stored for code, or with only_fights just those fights (plus the
+        report row and actors). Returns events written. NPC max HP seen on the way is
+        learned into npc_stats.
+        """
+        cur = self.db.cursor()
+        if only_fights is None:
+            cur.execute("DELETE FROM events WHERE code = ?", (code,))
+            cur.execute("DELETE FROM fights WHERE code = ?", (code,))
+        else:
+            for fid in only_fights:
+                cur.execute("DELETE FROM events WHERE code = ? AND fight = ?", (code, fid))
+                cur.execute("DELETE FROM fights WHERE code = ? AND id = ?", (code, fid))
+        cur.execute("DELETE FROM actors WHERE code = ?", (code,))
+        cur.execute(
+            "INSERT OR REPLACE INTO reports (code, title, ingested_at, end_time) VALUES (?, ?, ?, ?)",
+            (code, title, time.time(), end_time),
+        )
+        cur.executemany(
+            "INSERT INTO actors VALUES (?, ?, ?, ?)",
+            [(code, a["id"], a.get("name"), json.dumps(a)) for a in actors if isinstance(a, dict) and isinstance(a.get("id"), int)],
+        )
+
+        total = 0
+        npc_stats = get_stats()
+        for f in fights:
+            if not isinstance(f, dict) or not isinstance(f.get("id"), int):
+                continue
+            cur.execute(
+                "INSERT INTO fights VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (code, f["id"], f.get("name"), 1 if f.get("kill") else 0, f.get("startTime"), f.get("endTime"), json.dumps(f)),
+            )
+            rows = [
+                (
+                    code, f["id"], e["timestamp"], (e.get("type") or "").lower(),
+                    _int(e.get("sourceID")), _int(e.get("targetID")), _ability(e), _int(e.get("amount")),
+                    json.dumps(e, sort_keys=True),
+                )
+                for e in npc_stats.tap(f, events_by_fight.get(f["id"], []))
+                if isinstance(e.get("timestamp"), int)
+            ]
+            rows.sort(key=lambda r: r[2])
+            cur.executemany(
+                "INSERT INTO events (code, fight, timestamp, type, source, target, ability, amount, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            total += len(rows)
+        self.db.commit()
+        self._enemies.clear()
+        self._indexes.clear()
+        return total
+
+    # -------------------- wcl BACKEND --------------------
+
+    def has_report(self, code: str) -> bool:
+        return self.db.execute("SELECT 1 FROM reports WHERE code = ?", (code,)).fetchone() is not None
+
+    def fetch_report(self, code: str) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+        row = self.db.execute("SELECT title FROM reports WHERE code = ?", (code,)).fetchone()
+        if row is None:
+            raise KeyError(f"report {code!r} is not in the event store {self.path!r}; ingest it first")
+        fights = [json.loads(d) for (d,) in self.db.execute("SELECT data FROM fights WHERE code = ? ORDER BY id", (code,))]
+        actors = [json.loads(d) for (d,) in self.db.execute("SELECT data FROM actors WHERE code = ? ORDER BY id", (code,))]
+        return row[0], fights, actors
+
+    def _enemy_ids(self, code: str, fight_id: int) -> Set[int]:
+        key = (code, fight_id)
+        if key not in self._enemies:
+            row = self.db.execute("SELECT data FROM fights WHERE code = ? AND id = ?", key).fetchone()
+            fight = json.loads(row[0]) if row else {}
+            self._enemies[key] = {
+                n["id"] for n in (fight.get("enemyNPCs") or [])
+                if isinstance(n, dict) and isinstance(n.get("id"), int)
+            }
+        return self._enemies[key]
+
+    def _fight_index(self, code: str, fight_id: int) -> Tuple[FightEventIndex, np.ndarray]:
+        key = (code, fight_id)
+        if key not in self._indexes:
+            rows = self.db.execute(
+                "SELECT id, timestamp, type, source, target, ability, amount FROM events "
+                "WHERE code = ? AND fight = ? ORDER BY timestamp, id",
+                key,
+            ).fetchall()
+            ids = np.asarray([r[0] for r in rows], dtype=np.int64)
+            type_names, type_codes = np.unique(np.asarray([r[2] or "" for r in rows], dtype=object), return_inverse=True)
+
+            def col(i: int) -> np.ndarray:
+                return np.asarray([MISSING if r[i] is None else r[i] for r in rows], dtype=np.int64)
+
+            idx = FightEventIndex(
+                np.asarray([r[1] for r in rows], dtype=np.int64),
+                type_codes, [str(t) for t in type_names], col(3), col(4), col(5),
+                np.asarray([r[6] or 0 for r in rows], dtype=np.int64),
+            )
+            self._indexes[key] = (idx, ids)
+        return self._indexes[key]
+
+    def event_index(self, code: str, fight_id: int) -> FightEventIndex:
+        return self._fight_index(code, fight_id)[0]
+
+    def events_at(self, code: str, fight_id: int, rows: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Event dicts for index row ids, in the given order.
+        """
+        ids = self._fight_index(code, fight_id)[1][rows].tolist()
+        data: Dict[int, str] = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            q = f"SELECT id, data FROM events WHERE id IN ({', '.join('?' * len(chunk))})"
+            data.update(self.db.execute(q, chunk).fetchall())
+        return [json.loads(data[i]) for i in ids]
+
+    def fetch_events_page(
+        self,
+        code: str,
+        fight_id: Union[int, Sequence[int]],
+        start: int,
+        end: int,
+        data_type: str,
+        hostility_type: Optional[str] = None,
+        ability_id: Optional[int] = None,
+        target_id: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Same contract as wcl.fetch_events_page; the whole range comes back as one page.
+        """
+        out: List[Tuple[int, int, Dict[str, Any]]] = []
+        for fid in ([fight_id] if isinstance(fight_id, int) else list(fight_id)):
+            idx, ids = self._fight_index(code, fid)
+            rows = page_rows(idx, self._enemy_ids(code, fid), start, end, data_type,
+                             hostility_type=hostility_type, ability_id=ability_id, target_id=target_id)
+            for rid, e in zip(ids[rows].tolist(), self.events_at(code, fid, rows)):
+                out.append((e["timestamp"], rid, e))
+        out.sort(key=lambda r: (r[0], r[1]))
+        return [e for _, _, e in out], None
+
+
+# -------------------- CLI --------------------
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Local SQLite store of WCL report events.")
+    ap.add_argument("--db", default=DEFAULT_DB, help=f"SQLite file (default: {DEFAULT_DB})")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ing = sub.add_parser("ingest", help="Fetch a report into the store")
+    ing.add_argument("code", help="Warcraft Logs report code")
+    ing.add_argument("--kills-only", action="store_true", help="Only store kill pulls")
+    ref = sub.add_parser("refresh", help="Update a stored report that is still being logged")
+    ref.add_argument("code", help="Warcraft Logs report code")
+    ref.add_argument("--kills-only", action="store_true", help="Only store kill pulls")
+    sub.add_parser("list", help="List stored reports")
+    args = ap.parse_args(None if argv is None else list(argv))
+
+    wcl.set_backend(None)  # ingest always talks to the API
+    store = EventStore(args.db)
+    try:
+        if args.cmd in {"ingest", "refresh"}:
+            token = wcl.get_token(os.getenv("WCL_CLIENT_ID", ""), os.getenv("WCL_CLIENT_SECRET", ""))
+            headers = {"Authorization": f"Bearer {token}"}
+            t0 = time.perf_counter()
+            if args.cmd == "ingest":
+                n = store.ingest(headers, args.code, kills_only=args.kills_only)
+                what = f"Stored {n:,} events for {args.code}"
+            else:
+                r = store.refresh(headers, args.code, kills_only=args.kills_only)
+                what = f"{args.code}: {r['status']}"
+                if r["refetched"]:
+                    what += f", re-fetched fights {', '.join(map(str, r['refetched']))} ({r['events']:,} events)"
+            print(f"{what} in {time.perf_counter() - t0:.1f}s "
+                  f"({wcl.REQUEST_STATS['requests']} requests) -> {args.db}")
+        else:
+            for code, title, at in store.db.execute("SELECT code, title, ingested_at FROM reports ORDER BY ingested_at"):
+                n = store.db.execute("SELECT COUNT(*) FROM events WHERE code = ?", (code,)).fetchone()[0]
+                print(f"{code}  {n:>9,} events  {time.strftime('%Y-%m-%d %H:%M', time.localtime(at))}  {title}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
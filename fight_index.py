@@ -0,0 +1,69 @@
+"""
+FightIndex: one pass over fetch_report() fights for pull numbering, wipe counts
+and timestamp -> fight lookup.
+"""
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional
+
+# Per-boss corrections applied to "wipes before this pull".
+# Ji-Kun: the first pull is usually a reset on the nest platform, not a real wipe.
+WIPE_ADJUSTMENTS: Dict[str, int] = {
+    "Ji-Kun": -1,
+}
+
+
+class FightIndex:
+    def __init__(self, fights: List[Dict[str, Any]], wipe_adjustments: Optional[Dict[str, int]] = None):
+        adjust = WIPE_ADJUSTMENTS if wipe_adjustments is None else wipe_adjustments
+
+        self.fights: List[Dict[str, Any]] = sorted(
+            (
+                f for f in fights
+                if isinstance(f, dict)
+                and isinstance(f.get("id"), int)
+                and isinstance(f.get("startTime"), int)
+                and isinstance(f.get("endTime"), int)
+            ),
+            key=lambda f: (f["startTime"], f["id"]),
+        )
+        self.starts: List[int] = [f["startTime"] for f in self.fights]
+        self.ends: List[int] = [f["endTime"] for f in self.fights]
+        self.by_id: Dict[int, Dict[str, Any]] = {f["id"]: f for f in self.fights}
+
+        # fight id -> 1-based pull number on that boss
+        self.pull_number: Dict[int, int] = {}
+        # fight id -> wipes on that boss before this pull (adjusted, never negative)
+        self.wipes_before: Dict[int, int] = {}
+        # boss name -> fights in pull order
+        self.pulls: Dict[str, List[Dict[str, Any]]] = {}
+
+        wipes: Dict[str, int] = {}
+        for f in self.fights:
+            boss = f.get("name") or ""
+            pulls = self.pulls.setdefault(boss, [])
+            pulls.append(f)
+            self.pull_number[f["id"]] = len(pulls)
+            self.wipes_before[f["id"]] = max(0, wipes.get(boss, 0) + adjust.get(boss, 0))
+            if not f.get("kill"):
+                wipes[boss] = wipes.get(boss, 0) + 1
+
+    def kills(self, boss: Optional[str] = None) -> List[Dict[str, Any]]:
+        src = self.fights if boss is None else self.pulls.get(boss, [])
+        return [f for f in src if f.get("kill") is True]
+
+    def fight_at(self, ts: int) -> Optional[Dict[str, Any]]:
+        """
+        Fight whose [startTime, endTime] contains ts, or None if ts falls between pulls.
+        """
+        i = bisect_right(self.starts, ts) - 1
+        if i >= 0 and ts <= self.ends[i]:
+            return self.fights[i]
+        return None
+
+    def fights_between(self, start: int, end: int) -> List[Dict[str, Any]]:
+        """
+        Fights overlapping [start, end], in time order.
+        """
+        lo = bisect_right(self.ends, start - 1)
+        hi = bisect_right(self.starts, end)
+        return self.fights[lo:hi]
@@ -0,0 +1,190 @@
+"""
+Local evaluation of WCL events filterExpression strings.
+
+The API filters events server-side; a local backend (event store, archive or
+bundle) serves whole pages, so wcl.fetch_events_page applies the same expression
+to them here. Only the subset the scripts use is understood:
+
+    type = "damage" and target.id in (1, 2)
+    (type = "cast" and ability.id in (2825, 32182)) or type = "applydebuff"
+    ability.name in ("Wind Storm") and not source.id = 5
+
+Fields: type, ability.id, ability.name, source.id, target.id, and any bare event
+key (amount, absorbed, hitType, ...). Operators: = != < <= > >=, in / not in,
+and / or / not, parentheses. String comparisons ignore case. Anything else
+raises ValueError rather than silently matching every event.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Event = Dict[str, Any]
+Predicate = Callable[[Event], bool]
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<num>-?\d+(?:\.\d+)?)
+      | "(?P<dq>[^"]*)"
+      | '(?P<sq>[^']*)'
+      | (?P<op><=|>=|!=|=|<|>|\(|\)|,)
+      | (?P<word>[A-Za-z_][A-Za-z0-9_.]*)
+    )""",
+    re.VERBOSE,
+)
+
+_COMPARE: Dict[str, Callable[[Any, Any], bool]] = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+KEYWORDS = {"and", "or", "not", "in"}
+
+
+def _tokens(expr: str) -> List[Tuple[str, Any]]:
+    out: List[Tuple[str, Any]] = []
+    pos = 0
+    expr = expr.rstrip()
+    while pos < len(expr):
+        m = _TOKEN.match(expr, pos)
+        if m is None:
+            raise ValueError(f"filter expression: can't parse at {expr[pos:pos + 20]!r}")
+        pos = m.end()
+        if m.group("num") is not None:
+            n = m.group("num")
+            out.append(("lit", float(n) if "." in n else int(n)))
+        elif m.group("dq") is not None or m.group("sq") is not None:
+            out.append(("lit", m.group("dq") if m.group("dq") is not None else m.group("sq")))
+        elif m.group("op") is not None:
+            out.append(("op", m.group("op")))
+        else:
+            word = m.group("word")
+            out.append(("kw", word.lower()) if word.lower() in KEYWORDS else ("field", word))
+    return out
+
+
+def _ability_name(e: Event) -> Optional[str]:
+    ab = e.get("ability")
+    if isinstance(ab, dict) and isinstance(ab.get("name"), str):
+        return ab["name"]
+    from abilities import get_dictionary  # only loaded for name filters
+
+    return get_dictionary().name(_ability_id(e))
+
+
+def _ability_id(e: Event) -> Optional[int]:
+    abid = e.get("abilityGameID")
+    if abid is None and isinstance(e.get("ability"), dict):
+        abid = e["ability"].get("gameID")
+    return abid
+
+
+FIELDS: Dict[str, Callable[[Event], Any]] = {
+    "type": lambda e: e.get("type"),
+    "ability.id": _ability_id,
+    "ability.name": _ability_name,
+    "source.id": lambda e: e.get("sourceID"),
+    "target.id": lambda e: e.get("targetID"),
+}
+
+
+def _norm(v: Any) -> Any:
+    return v.lower() if isinstance(v, str) else v
+
+
+def _getter(name: str) -> Callable[[Event], Any]:
+    if name.lower() in FIELDS:
+        return FIELDS[name.lower()]
+    if "." in name:
+        raise ValueError(f"filter expression: unsupported field {name!r}")
+    return lambda e: e.get(name)
+
+
+class _Parser:
+    def __init__(self, expr: str):
+        self.toks = _tokens(expr)
+        self.i = 0
+
+    def _peek(self) -> Optional[Tuple[str, Any]]:
+        return self.toks[self.i] if self.i < len(self.toks) else None
+
+    def _take(self, kind: str, value: Any = None) -> Any:
+        tok = self._peek()
+        if tok is None or tok[0] != kind or (value is not None and tok[1] != value):
+            raise ValueError(f"filter expression: expected {value or kind}, got {tok[1] if tok else 'end'!r}")
+        self.i += 1
+        return tok[1]
+
+    def _accept(self, kind: str, value: Any) -> bool:
+        if self._peek() == (kind, value):
+            self.i += 1
+            return True
+        return False
+
+    def parse(self) -> Predicate:
+        pred = self._or()
+        if self._peek() is not None:
+            raise ValueError(f"filter expression: unexpected {self._peek()[1]!r}")
+        return pred
+
+    def _or(self) -> Predicate:
+        parts = [self._and()]
+        while self._accept("kw", "or"):
+            parts.append(self._and())
+        return parts[0] if len(parts) == 1 else (lambda e: any(p(e) for p in parts))
+
+    def _and(self) -> Predicate:
+        parts = [self._not()]
+        while self._accept("kw", "and"):
+            parts.append(self._not())
+        return parts[0] if len(parts) == 1 else (lambda e: all(p(e) for p in parts))
+
+    def _not(self) -> Predicate:
+        if self._accept("kw", "not"):
+            inner = self._not()
+            return lambda e: not inner(e)
+        if self._accept("op", "("):
+            inner = self._or()
+            self._take("op", ")")
+            return inner
+        return self._compare()
+
+    def _compare(self) -> Predicate:
+        get = _getter(self._take("field"))
+        negate = self._accept("kw", "not")
+        if self._accept("kw", "in"):
+            self._take("op", "(")
+            values = {_norm(self._take("lit"))}
+            while self._accept("op", ","):
+                values.add(_norm(self._take("lit")))
+            self._take("op", ")")
+            return lambda e: (_norm(get(e)) in values) != negate
+        if negate:
+            raise ValueError("filter expression: 'not' must precede 'in' here")
+        op = self._take("op")
+        if op not in _COMPARE:
+            raise ValueError(f"filter expression: unsupported operator {op!r}")
+        cmp = _COMPARE[op]
+        value = _norm(self._take("lit"))
+
+        def check(e: Event) -> bool:
+            v = _norm(get(e))
+            if v is None:
+                return op == "!="
+            try:
+                return cmp(v, value)
+            except TypeError:
+                return False
+
+        return check
+
+
+@lru_cache(maxsize=64)
+def compile_filter(expr: str) -> Predicate:
+    """
+    Event predicate for a filterExpression; ValueError if it uses syntax not listed above.
+    """
+    return _Parser(expr).parse()
@@ -0,0 +1,80 @@
+"""
+First-occurrence search over a fight's event stream.
+
+Instead of paging the whole pull until something matches, ask the server for
+only the candidate events (abilityID / targetID / filterExpression, at least one
+is required) and start at the smallest page the events API accepts (limit=100;
+the documented range is 100-10000): pages come back in time order, so that one
+request already lands on the earliest event passing the filter. Only when the
+local predicate is stricter than the filter does the search page on from the
+cursor, doubling the page size (100, 200, 400, ... up to limit) so a sparse
+filtered stream costs a handful of small requests and a dense one converges on
+full pages.
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import wcl
+
+
+def first_event(
+    headers: Dict[str, str],
+    code: str,
+    fight: Dict[str, Any],
+    data_type: str,
+    predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    limit: int = 1000,
+    hostility_type: Optional[str] = None,
+    translate: bool = False,
+    ability_id: Optional[int] = None,
+    target_id: Optional[int] = None,
+    filter_expression: Optional[str] = None,
+    api_url: str = wcl.API_URL,
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, int]]:
+    """
+    Returns (earliest event matching the server filter and predicate, stats).
+    limit caps the doubling page size and is clamped to the API's 100-10000.
+    stats = {"requests", "bytes", "events"}; bytes is the response size seen by
+    wcl.gql on this thread (0 when a local backend answers), so searches running
+    beside other fetches count only their own pages.
+    """
+    if ability_id is None and target_id is None and not filter_expression:
+        raise ValueError("first_event needs a server-side filter (ability_id, target_id or filter_expression)")
+
+    cursor = fight["startTime"] if start is None else start
+    hi = fight["endTime"] if end is None else end
+    limit = min(max(limit, wcl.EVENTS_MIN_LIMIT), wcl.EVENTS_MAX_LIMIT)
+    page = wcl.EVENTS_MIN_LIMIT
+
+    bytes_before = wcl.thread_stats()["bytes"]
+    stats = {"requests": 0, "bytes": 0, "events": 0}
+
+    found: Optional[Dict[str, Any]] = None
+    while found is None:
+        events, nxt = wcl.fetch_events_page(
+            headers, code, fight["id"], cursor, hi, data_type,
+            limit=page, hostility_type=hostility_type, translate=translate,
+            ability_id=ability_id, target_id=target_id,
+            filter_expression=filter_expression, api_url=api_url,
+        )
+        stats["requests"] += 1
+        stats["events"] += len(events)
+        found = next((e for e in events if predicate is None or predicate(e)), None)
+        if not nxt or nxt > hi:
+            break
+        cursor = nxt
+        page = min(limit, page * 2)
+
+    stats["bytes"] = wcl.thread_stats()["bytes"] - bytes_before
+    return found, stats
+
+
+def add_stats(total: Optional[Dict[str, int]], stats: Dict[str, int]) -> None:
+    """
+    Accumulate first_event() stats into a caller-owned dict (no-op when total is None).
+    """
+    if total is None:
+        return
+    for k, v in stats.items():
+        total[k] = total.get(k, 0) + v
@@ -0,0 +1,188 @@
+"""
+Per-actor HP timeline built in one pass over an event stream.
+
+Snapshots come from:
+  - type="health" events (hitPoints / maxHitPoints on the target)
+  - type="resource(s)" events with resourceType 0 (amount / max on the target)
+  - any event carrying hitPoints / maxHitPoints (damage, heal, cast ...);
+    resourceActor tells us whose HP it is (1 = source, 2 = target)
+
+Once finalized, queries are bisects over sorted per-actor arrays, so callers can
+ask many "HP% at t" / "first time <= X%" questions without refetching.
+"""
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+def hp_snapshot(e: Dict[str, Any]) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Returns (actor_id, timestamp, hp, max_hp) for events that carry an HP snapshot.
+    """
+    ts = e.get("timestamp")
+    if not isinstance(ts, int):
+        return None
+
+    et = (e.get("type") or "").lower()
+
+    if et in {"resource", "resources"}:
+        rt = e.get("resourceType")
+        if isinstance(rt, int) and rt != 0:
+            return None  # usually 0 == health
+        actor, hp, mhp = e.get("targetID"), e.get("amount"), e.get("max")
+    else:
+        hp, mhp = e.get("hitPoints"), e.get("maxHitPoints")
+        ra = e.get("resourceActor")
+        if et == "health" or ra == 2:
+            actor = e.get("targetID")
+        elif ra == 1:
+            actor = e.get("sourceID")
+        elif et == "damage":
+            actor = e.get("targetID")
+        else:
+            return None
+
+    if not (isinstance(actor, int) and isinstance(hp, int) and isinstance(mhp, int) and mhp > 0):
+        return None
+    return actor, ts, hp, mhp
+
+
+class HpTimeline:
+    def __init__(self) -> None:
+        self._pending: Dict[int, List[Tuple[int, int, int]]] = {}
+        self.ts: Dict[int, List[int]] = {}
+        self.hp: Dict[int, List[int]] = {}
+        self.max_hp: Dict[int, List[int]] = {}
+        self.pct: Dict[int, List[float]] = {}
+        # running minimum of pct, negated so it is non-decreasing (bisect-able)
+        self._neg_min_pct: Dict[int, List[float]] = {}
+        # sparse table: _min_pct_span[actor][k][i] = min(pct[i:i + 2**k]), built on first use
+        self._min_pct_span: Dict[int, List[List[float]]] = {}
+
+    @classmethod
+    def from_events(cls, events: Iterable[Dict[str, Any]]) -> "HpTimeline":
+        tl = cls()
+        for e in events:
+            tl.add_event(e)
+        tl.finalize()
+        return tl
+
+    def add_event(self, e: Dict[str, Any]) -> None:
+        snap = hp_snapshot(e)
+        if snap is None:
+            return
+        actor, ts, hp, mhp = snap
+        self._pending.setdefault(actor, []).append((ts, hp, mhp))
+
+    def finalize(self) -> "HpTimeline":
+        for actor, rows in self._pending.items():
+            rows.extend(zip(self.ts.get(actor, []), self.hp.get(actor, []), self.max_hp.get(actor, [])))
+            rows.sort(key=lambda r: r[0])
+
+            ts = [r[0] for r in rows]
+            hp = [r[1] for r in rows]
+            mhp = [r[2] for r in rows]
+            pct = [100.0 * h / m for h, m in zip(hp, mhp)]
+
+            neg_min: List[float] = []
+            lo = float("inf")
+            for p in pct:
+                lo = min(lo, p)
+                neg_min.append(-lo)
+
+            self.ts[actor], self.hp[actor], self.max_hp[actor] = ts, hp, mhp
+            self.pct[actor] = pct
+            self._neg_min_pct[actor] = neg_min
+            self._min_pct_span.pop(actor, None)
+        self._pending = {}
+        return self
+
+    def actors(self) -> Set[int]:
+        return set(self.ts)
+
+    def pct_at(self, actor_ids: Iterable[int], ts: int, lookback_ms: Optional[int] = None) -> Optional[float]:
+        """
+        HP% (0-100) from the latest snapshot <= ts across actor_ids.
+        With lookback_ms, snapshots older than ts - lookback_ms are ignored.
+        """
+        best_ts = -1
+        best_pct: Optional[float] = None
+        for actor in actor_ids:
+            arr = self.ts.get(actor)
+            if not arr:
+                continue
+            i = bisect_right(arr, ts) - 1
+            if i < 0:
+                continue
+            if lookback_ms is not None and arr[i] < ts - lookback_ms:
+                continue
+            if arr[i] > best_ts:
+                best_ts = arr[i]
+                best_pct = self.pct[actor][i]
+        return best_pct
+
+    def max_hp_of(self, actor_ids: Iterable[int]) -> Optional[int]:
+        best: Optional[int] = None
+        for actor in actor_ids:
+            for m in self.max_hp.get(actor, []):
+                if best is None or m > best:
+                    best = m
+        return best
+
+    def _spans(self, actor: int) -> List[List[float]]:
+        spans = self._min_pct_span.get(actor)
+        if spans is None:
+            spans = [self.pct[actor]]
+            width = 1
+            while width * 2 <= len(spans[0]):
+                prev = spans[-1]
+                spans.append([min(prev[i], prev[i + width]) for i in range(len(prev) - width)])
+                width *= 2
+            self._min_pct_span[actor] = spans
+        return spans
+
+    def _first_index_at_or_below(self, actor: int, lo: int, pct: float) -> int:
+        """
+        Smallest i >= lo with pct[i] <= pct (len if none): skip the largest spans whose
+        minimum is still above pct, O(log n).
+        """
+        spans = self._spans(actor)
+        n = len(spans[0])
+        i = lo
+        for k in range(len(spans) - 1, -1, -1):
+            if i + (1 << k) <= n and spans[k][i] > pct:
+                i += 1 << k
+        return i
+
+    def first_at_or_below(self, actor_ids: Iterable[int], pct: float, after_ts: Optional[int] = None) -> Optional[int]:
+        """
+        Earliest snapshot timestamp (>= after_ts, if given) where any of actor_ids is at or below pct.
+        """
+        first: Optional[int] = None
+        for actor in actor_ids:
+            arr = self.ts.get(actor)
+            if not arr:
+                continue
+            if after_ts is None:
+                i = bisect_left(self._neg_min_pct[actor], -pct)
+            else:
+                # running minimum is only valid from the start; bisect to the cut, then use span minima
+                i = self._first_index_at_or_below(actor, bisect_left(arr, after_ts), pct)
+            if i < len(arr) and (first is None or arr[i] < first):
+                first = arr[i]
+        return first
+
+    def crossings(self, actor_id: int, pct: float) -> List[Tuple[int, str]]:
+        """
+        [(timestamp, "down"|"up"), ...] each time actor_id crosses pct between consecutive snapshots.
+        "down" means the snapshot is at or below pct after being above it.
+        """
+        out: List[Tuple[int, str]] = []
+        ts = self.ts.get(actor_id, [])
+        pcts = self.pct.get(actor_id, [])
+        above: Optional[bool] = None
+        for t, p in zip(ts, pcts):
+            now_above = p > pct
+            if above is not None and now_above != above:
+                out.append((t, "up" if now_above else "down"))
+            above = now_above
+        return out
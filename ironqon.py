@@ -1,52 +1,30 @@
 import os
 import sys
-import requests
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 import argparse
 
-
-# Substring-based fuzzy match. We intentionally avoid punctuation dependency.
-
+from dag import Dag
+from damage_index import DamageIndex
+from encounters import ENCOUNTERS, fight_labels, run_encounter
+from event_index import indexed_events
+from first_search import add_stats, first_event
+from hp_timeline import HpTimeline
+from memo import cached, report as memo_report, store
+from npc_stats import get_stats
+from tot_npcs import BOSS_GAME_IDS, fight_npc_ids
+from warehouse import record
+from wcl import fetch_report, fight_player_ids, get_token, iter_events, pick_kills
 
 
 REPORT_CODE = "vFYGaXZgdTk9P6tz"
 CLIENT_ID = os.getenv("WCL_CLIENT_ID", "")
 CLIENT_SECRET = os.getenv("WCL_CLIENT_SECRET", "")
 
-API_URL = "https://classic.warcraftlogs.com/api/v2/client"
-TOKEN_URL = "https://classic.warcraftlogs.com/oauth/token"
-
-MEGAERA_FIGHT_NAME = "Iron Qon"
-DOG_KEYS: Dict[str, List[str]] = {
-    "Ro'Shak":  ["ro", "shak"],
-    "Quet'Zal": ["quet", "zal"],
-    "Dam'Ren":  ["dam", "ren"],
-}
-IRON_QON_KEYS = ["iron", "qon"]
-WIND_STORM_ID = 136577
-
-
-
-def get_token(client_id: str, client_secret: str) -> str:
-    if not client_id or not client_secret:
-        raise SystemExit("Missing CLIENT_ID / CLIENT_SECRET.")
-    r = requests.post(
-        TOKEN_URL,
-        data={"grant_type": "client_credentials"},
-        auth=(client_id, client_secret),
-        timeout=30,
-    )
-    r.raise_for_status()
-    return r.json()["access_token"]
+IRON_QON = ENCOUNTERS["Iron Qon"]
+WIND_STORM = IRON_QON["abilities"]["Wind Storm"]
+WIND_STORM_ID = WIND_STORM["id"]
 
-
-def gql(headers: Dict[str, str], query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
-    r = requests.post(API_URL, json={"query": query, "variables": variables}, headers=headers, timeout=30)
-    r.raise_for_status()
-    payload = r.json()
-    if payload.get("errors"):
-        raise RuntimeError(payload["errors"])
-    return payload["data"]
+ANALYZER_VERSION = 1
 
 
 def mmss_from_ms(ms: int) -> str:
@@ -63,332 +41,98 @@ def _norm(s: str) -> str:
     return (s or "").lower().replace("’", "'")
 
 
-def iter_events(
-    headers: Dict[str, str],
-    code: str,
-    fight_id: int,
-    fight_start: int,
-    fight_end: int,
-    data_type: str,
-    start_override: Optional[int] = None,
-    end_override: Optional[int] = None,
-) -> Iterable[Dict[str, Any]]:
-    """
-    Correct paging: startTime is ONLY the paging cursor; endTime fixed.
-    """
-    query = f"""
-    query($code: String!, $fightID: Int!, $pageStart: Float!, $end: Float!) {{
-      reportData {{
-        report(code: $code) {{
-          events(
-            fightIDs: [$fightID]
-            startTime: $pageStart
-            endTime: $end
-            dataType: {data_type}
-            limit: 5000
-          ) {{
-            data
-            nextPageTimestamp
-          }}
-        }}
-      }}
-    }}
-    """
-
-    page_start = start_override if isinstance(start_override, int) else fight_start
-    fixed_end = end_override if isinstance(end_override, int) else fight_end
-
-    while True:
-        data = gql(headers, query, {"code": code, "fightID": fight_id, "pageStart": page_start, "end": fixed_end})
-        ev = data["reportData"]["report"]["events"]
-
-        for e in ev.get("data") or []:
-            if isinstance(e, dict):
-                yield e
-
-        nxt = ev.get("nextPageTimestamp")
-        if not nxt:
-            break
-        page_start = nxt
-
-
-def fetch_report(headers: Dict[str, str], code: str) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
-    query = """
-    query($code: String!) {
-      reportData {
-        report(code: $code) {
-          title
-          fights { id name kill startTime endTime }
-          masterData { actors { id name type subType } }
-        }
-      }
-    }
-    """
-    data = gql(headers, query, {"code": code})
-    rep = data["reportData"]["report"]
-    return rep["title"], (rep["fights"] or []), (rep["masterData"]["actors"] or [])
-
-
-def find_actor_ids_fuzzy(actors: List[Dict[str, Any]], required_substrings: List[str]) -> List[Dict[str, Any]]:
-    req = [_norm(x) for x in required_substrings]
-    hits: List[Dict[str, Any]] = []
-
-    for a in actors:
-        if not isinstance(a, dict):
-            continue
-        name = a.get("name")
-        if not isinstance(name, str):
-            continue
-
-        n = _norm(name)
-        if all(r in n for r in req):
-            hits.append(a)
-
-    # Prefer non-players; then shorter names
-    def score(a: Dict[str, Any]) -> Tuple[int, int]:
-        t = _norm(str(a.get("type") or ""))
-        st = _norm(str(a.get("subType") or ""))
-        is_player = (t == "player") or (st == "player")
-        return (1 if is_player else 0, len(_norm(a.get("name") or "")))
-
-    hits.sort(key=score)
-    return hits
-
-
-def build_dog_id_map(actors: List[Dict[str, Any]]) -> Dict[str, List[int]]:
-    out: Dict[str, List[int]] = {}
-    for label, subs in DOG_KEYS.items():
-        hits = find_actor_ids_fuzzy(actors, subs)
-        out[label] = [h["id"] for h in hits if isinstance(h.get("id"), int)]
-    return out
-
-
 def iron_qon_dog_deaths_for_kill(
     headers: Dict[str, str],
     code: str,
     fight: Dict[str, Any],
-    dog_ids: Dict[str, List[int]],
+    shards: int = 1,
+    workers: int = 1,
 ) -> Dict[str, List[int]]:
     """
     Returns absolute death timestamps for each dog label during this pull.
-    Looks for type in {"death","destroy"} in dataType: All, filtering by targetID.
+    Runs the Iron Qon encounter spec: type in {"death","destroy"} in dataType: All, by targetID.
     """
-    start = fight["startTime"]
-    end = fight["endTime"]
-    fight_id = fight["id"]
-
-    wanted = {i for ids in dog_ids.values() for i in ids}
-    deaths: Dict[str, List[int]] = {k: [] for k in dog_ids.keys()}
-
-    if not wanted:
-        return deaths
-
-    for e in iter_events(headers, code, fight_id, start, end, "All"):
-        et = (e.get("type") or "").lower()
-        if et not in {"death", "destroy"}:
-            continue
-
-        ts = e.get("timestamp")
-        tid = e.get("targetID")
-        if not isinstance(ts, int) or not isinstance(tid, int):
-            continue
-        if tid not in wanted:
-            continue
+    return run_encounter(headers, code, fight, IRON_QON, shards=shards, workers=workers)["deaths"]
 
-        for label, ids in dog_ids.items():
-            if tid in ids:
-                deaths[label].append(ts)
-                break
-
-    for k in deaths:
-        deaths[k].sort()
-    return deaths
-
-
-def build_actor_by_id(actors: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
-    out: Dict[int, Dict[str, Any]] = {}
-    for a in actors:
-        if isinstance(a, dict) and isinstance(a.get("id"), int):
-            out[a["id"]] = a
-    return out
-
-
-def is_player_actor(actor: Optional[Dict[str, Any]]) -> bool:
-    if not actor:
-        return False
-    t = _norm(str(actor.get("type") or ""))
-    st = _norm(str(actor.get("subType") or ""))
-    return (t == "player") or (st == "player")
 
+def build_hp_timeline(headers: Dict[str, str], code: str, fight: Dict[str, Any]) -> HpTimeline:
+    """
+    One All-events pass over the pull; every health/resource/damage HP snapshot is indexed.
+    """
+    return HpTimeline.from_events(
+        iter_events(headers, code, fight["id"], fight["startTime"], fight["endTime"], "All")
+    )
 
-def find_single_actor_id_fuzzy(actors: List[Dict[str, Any]], subs: List[str]) -> Optional[int]:
-    hits = find_actor_ids_fuzzy(actors, subs)
-    for h in hits:
-        hid = h.get("id")
-        if isinstance(hid, int):
-            return hid
-    return None
 
 def roshak_first_25pct_time(
     headers: Dict[str, str],
     code: str,
     fight: Dict[str, Any],
-    roshak_ids: List[int],
+    roshak_ids: Set[int],
+    timeline: Optional[HpTimeline] = None,
 ) -> Optional[int]:
     """
     Returns abs timestamp of first moment Ro'Shak is <= 25% HP.
-    Tries:
-      1) type="health" events (hitPoints/maxHitPoints)
-      2) type="resource(s)" events for health snapshots (amount/max) if present
+    Uses health, resource(s) and damage-event HP snapshots from one timeline.
     """
     if not roshak_ids:
         return None
+    if timeline is None:
+        timeline = build_hp_timeline(headers, code, fight)
+    return timeline.first_at_or_below(roshak_ids, 25.0)
 
-    start = fight["startTime"]
-    end = fight["endTime"]
-    fight_id = fight["id"]
-
-    # ---- Pass 1: health events ----
-    for e in iter_events(headers, code, fight_id, start, end, "All"):
-        if (e.get("type") or "").lower() != "health":
-            continue
-        tid = e.get("targetID")
-        if not isinstance(tid, int) or tid not in roshak_ids:
-            continue
-
-        ts = e.get("timestamp")
-        hp = e.get("hitPoints")
-        mhp = e.get("maxHitPoints")
-        if not (isinstance(ts, int) and isinstance(hp, int) and isinstance(mhp, int) and mhp > 0):
-            continue
-
-        if hp * 4 <= mhp:   # hp/mhp <= 0.25 without floats
-            return ts
-
-    # ---- Pass 2: resources events (health snapshots) ----
-    for e in iter_events(headers, code, fight_id, start, end, "All"):
-        et = (e.get("type") or "").lower()
-        if et not in {"resource", "resources"}:
-            continue
-
-        tid = e.get("targetID")
-        if not isinstance(tid, int) or tid not in roshak_ids:
-            continue
-
-        # WCL commonly uses resourceType 0 for health in these snapshots
-        rt = e.get("resourceType")
-        if isinstance(rt, int) and rt != 0:
-            continue
-
-        ts = e.get("timestamp")
-        amt = e.get("amount")
-        mx = e.get("max")
-        if not (isinstance(ts, int) and isinstance(amt, int) and isinstance(mx, int) and mx > 0):
-            continue
-
-        if amt * 4 <= mx:
-            return ts
-
-    return None
-
-def find_single_actor_id_fuzzy(actors: List[Dict[str, Any]], subs: List[str]) -> Optional[int]:
-    hits = find_actor_ids_fuzzy(actors, subs)
-    for h in hits:
-        hid = h.get("id")
-        if isinstance(hid, int):
-            return hid
-    return None
 
 def target_hp_pct_at_time(
     headers: Dict[str, str],
     code: str,
     fight: Dict[str, Any],
-    target_ids: List[int],
+    target_ids: Set[int],
     ts_abs: int,
     lookback_ms: int = 60_000,
+    timeline: Optional[HpTimeline] = None,
 ) -> Optional[float]:
     """
-    Returns HP% (0-100) for target at ts_abs using the latest snapshot <= ts_abs.
-    Tries 'health' then 'resource(s)' snapshots within [ts_abs - lookback_ms, ts_abs].
+    Returns HP% (0-100) for target at ts_abs using the latest snapshot <= ts_abs
+    within [ts_abs - lookback_ms, ts_abs]. Pass a prebuilt timeline to avoid refetching.
     """
     if not target_ids or not isinstance(ts_abs, int):
         return None
-
-    fight_id = fight["id"]
-    fight_start = fight["startTime"]
-    fight_end = fight["endTime"]
-
-    start = max(fight_start, ts_abs - lookback_ms)
-    end = min(fight_end, ts_abs)
-
-    wanted = set(target_ids)
-
-    best_ts = -1
-    best_pct: Optional[float] = None
-
-    # Pull a tight window of All-events and keep the latest snapshot <= ts_abs.
-    for e in iter_events(headers, code, fight_id, fight_start, fight_end, "All", start_override=start, end_override=end):
-        tid = e.get("targetID")
-        if not isinstance(tid, int) or tid not in wanted:
-            continue
-
-        et = (e.get("type") or "").lower()
-        ts = e.get("timestamp")
-        if not isinstance(ts, int):
-            continue
-
-        if et == "health":
-            hp = e.get("hitPoints")
-            mhp = e.get("maxHitPoints")
-            if isinstance(hp, int) and isinstance(mhp, int) and mhp > 0:
-                if ts > best_ts:
-                    best_ts = ts
-                    best_pct = (hp / mhp) * 100.0
-
-        elif et in {"resource", "resources"}:
-            rt = e.get("resourceType")
-            if isinstance(rt, int) and rt != 0:
-                continue  # usually 0 == health
-            amt = e.get("amount")
-            mx = e.get("max")
-            if isinstance(amt, int) and isinstance(mx, int) and mx > 0:
-                if ts > best_ts:
-                    best_ts = ts
-                    best_pct = (amt / mx) * 100.0
-
-    return best_pct
+    if timeline is None:
+        timeline = build_hp_timeline(headers, code, fight)
+    return timeline.pct_at(target_ids, ts_abs, lookback_ms=lookback_ms)
 
 
 def quetzal_hp_pct_at_windstorm_by_damage(
     headers: Dict[str, str],
     code: str,
     fight: Dict[str, Any],
-    quet_ids: List[int],
+    quet_ids: Set[int],
     wind_ts_abs: int,
-    max_hp: int,
+    max_hp: Optional[int] = None,
+    damage: Optional[DamageIndex] = None,
 ) -> Optional[float]:
     """
     Approx HP% at windstorm timestamp by summing DamageDone to Quet'Zal up to wind_ts_abs.
     Uses amount only (absorbed doesn't reduce HP).
+    Pass a full-fight DamageIndex to answer from prefix sums instead of streaming.
+    max_hp defaults to Quet'Zal's learned max HP for this difficulty/size (npc_stats);
+    the damage pass itself feeds that cache, so a first report needs no extra scan.
     """
-    if not quet_ids or not isinstance(wind_ts_abs, int) or not isinstance(max_hp, int) or max_hp <= 0:
+    if not quet_ids or not isinstance(wind_ts_abs, int):
         return None
 
     start = fight["startTime"]
-    end = min(fight["endTime"], wind_ts_abs)
-    fight_id = fight["id"]
-    wanted = set(quet_ids)
+    if damage is None:
+        end = min(fight["endTime"], wind_ts_abs)
+        events = iter_events(headers, code, fight["id"], start, end, "DamageDone")
+        damage = DamageIndex.from_events(get_stats().tap(fight, events))
+
+    if max_hp is None:
+        max_hp = get_stats().max_hp(fight, quet_ids)
+    if not isinstance(max_hp, int) or max_hp <= 0:
+        return None
 
-    dmg = 0
-    for e in iter_events(headers, code, fight_id, start, end, "DamageDone"):
-        if (e.get("type") or "").lower() != "damage":
-            continue
-        tid = e.get("targetID")
-        if not isinstance(tid, int) or tid not in wanted:
-            continue
-        amt = e.get("amount")
-        if isinstance(amt, int) and amt > 0:
-            dmg += amt
+    dmg = damage.damage(quet_ids, start, wind_ts_abs)
 
     # clamp
     if dmg < 0:
@@ -403,55 +147,55 @@ def first_damage_to_targets(
     headers: Dict[str, str],
     code: str,
     fight: Dict[str, Any],
-    target_ids: List[int],
+    target_ids: Set[int],
+    search_stats: Optional[Dict[str, int]] = None,
 ) -> Optional[int]:
     if not target_ids:
         return None
 
-    start = fight["startTime"]
-    end = fight["endTime"]
-    fight_id = fight["id"]
     wanted = set(target_ids)
 
-    for e in iter_events(headers, code, fight_id, start, end, "DamageDone"):
+    def is_hit(e: Dict[str, Any]) -> bool:
         if (e.get("type") or "").lower() != "damage":
-            continue
-
+            return False
         tid = e.get("targetID")
         ts = e.get("timestamp")
         amt = e.get("amount")
-
         if not (isinstance(tid, int) and isinstance(ts, int) and isinstance(amt, int)):
-            continue
-        if tid not in wanted:
-            continue
-        if amt <= 0:
-            continue
-
-        return ts
-
-    return None
+            return False
+        return tid in wanted and amt > 0
 
+    targets = ", ".join(str(i) for i in sorted(wanted))
+    hit, stats = first_event(
+        headers, code, fight, "DamageDone", is_hit,
+        filter_expression=f'type = "damage" and target.id in ({targets})',
+    )
+    add_stats(search_stats, stats)
+    return hit["timestamp"] if hit else None
 
 
 def first_wind_storm_application(
     headers: Dict[str, str],
     code: str,
     fight: Dict[str, Any],
-    actor_by_id: Dict[int, Dict[str, Any]],
+    player_ids: Set[int],
+    search_stats: Optional[Dict[str, int]] = None,
 ) -> Optional[Tuple[int, int]]:
     """
-    Returns (timestamp_abs, targetID) for the FIRST applydebuff of Wind Storm (136577) on ANY player.
+    Returns (timestamp_abs, targetID) for the FIRST applydebuff of Wind Storm on ANY player
+    (event types and ability id from the Iron Qon spec).
     """
-    start = fight["startTime"]
-    end = fight["endTime"]
-    fight_id = fight["id"]
-
-    first: Optional[Tuple[int, int]] = None
+    types = {t.lower() for t in WIND_STORM["types"]}
+    hits = indexed_events(
+        code, fight["id"], limit=1, types=sorted(types), abilities=[WIND_STORM_ID], targets=player_ids,
+        start=fight["startTime"], end=fight["endTime"],
+    )
+    if hits is not None:
+        return (hits[0]["timestamp"], hits[0]["targetID"]) if hits else None
 
-    for e in iter_events(headers, code, fight_id, start, end, "Debuffs"):
-        if (e.get("type") or "").lower() != "applydebuff":
-            continue
+    def is_hit(e: Dict[str, Any]) -> bool:
+        if (e.get("type") or "").lower() not in types:
+            return False
 
         # robust ability id extraction
         ability_id = e.get("abilityGameID")
@@ -461,34 +205,87 @@ def first_wind_storm_application(
                 ability_id = ab["gameID"]
 
         if ability_id != WIND_STORM_ID:
-            continue
-
-        ts = e.get("timestamp")
-        tid = e.get("targetID")
-        if not (isinstance(ts, int) and isinstance(tid, int)):
-            continue
+            return False
 
         # ONLY care if target is a player
-        if not is_player_actor(actor_by_id.get(tid)):
-            continue
+        return (
+            isinstance(e.get("timestamp"), int)
+            and isinstance(e.get("targetID"), int)
+            and e["targetID"] in player_ids
+        )
 
-        first = (ts, tid)
-        break  # first instance only
+    hit, stats = first_event(headers, code, fight, "Debuffs", is_hit, ability_id=WIND_STORM_ID)
+    add_stats(search_stats, stats)
+    return (hit["timestamp"], hit["targetID"]) if hit else None
 
-    return first
 
 
+def add_kill_steps(
+    dag: Dag,
+    headers: Dict[str, str],
+    code: str,
+    fight: Dict[str, Any],
+    step_stats: Optional[Dict[str, Dict[str, int]]] = None,
+) -> str:
+    """
+    Registers one kill's steps on dag (main()'s, or overall.py's); returns the step
+    whose output is the kill's memoized result. A memo hit goes into dag.cache, so
+    nothing runs for that kill. step_stats collects each search step's first_event stats.
+    """
+    fid = fight["id"]
+    step_stats = {} if step_stats is None else step_stats
+    dog_ids = fight_labels(IRON_QON, fight)
+    # the learned Quet'Zal max HP is config, so learning it recomputes
+    memo_spec = {
+        "source": __file__,
+        "config": {"version": ANALYZER_VERSION, "quetzal_max_hp": get_stats().max_hp(fight, dog_ids["Quet'Zal"])},
+        "streams": ["DamageDone", "Debuffs", "All"],
+    }
+    result = f"{fid}:iron_qon"
+    hit, res = cached(code, fight, "iron_qon", **memo_spec)
+    if hit:
+        dag.cache[result] = res
+        return dag.add(result, lambda: res)
+    iron_qon_ids = fight_npc_ids(fight, BOSS_GAME_IDS["Iron Qon"])
+    players = fight_player_ids(fight)
+
+    def quet_hp_at(wind):
+        if wind is None:
+            return None
+        wind_ts, _ = wind
+        return quetzal_hp_pct_at_windstorm_by_damage(
+            headers, code, fight,
+            dog_ids.get("Quet'Zal", set()),
+            wind_ts,
+        )
 
-def pick_fight_ids(fights: List[Dict[str, Any]], fight_name: str) -> List[Dict[str, Any]]:
-    return [
-        f for f in fights
-        if isinstance(f, dict)
-        and (f.get("name") == fight_name)
-        and (f.get("kill") is True)
-        and isinstance(f.get("startTime"), int)
-        and isinstance(f.get("endTime"), int)
-        and isinstance(f.get("id"), int)
-    ]
+    def store_kill(ro25_ts, wind, quet_hp, deaths):
+        # the damage pass may just have learned Quet'Zal's max HP: key on what was used
+        memo_spec["config"]["quetzal_max_hp"] = get_stats().max_hp(fight, dog_ids["Quet'Zal"])
+        return store(code, fight, "iron_qon", {
+            "ro25_ts": ro25_ts,
+            "wind": wind,
+            "quet_hp": quet_hp,
+            "deaths": deaths,
+        }, **memo_spec)
+
+    # Ro'Shak 25% time
+    # ro25_ts = roshak_first_25pct_time(headers, report_code, f, dog_ids.get("Ro'Shak", []))
+    st = step_stats.setdefault(f"{fid}:ro25", {})
+    dag.add(f"{fid}:ro25", lambda: first_damage_to_targets(headers, code, fight, iron_qon_ids, st))
+    # First Wind Storm application
+    st_wind = step_stats.setdefault(f"{fid}:wind", {})
+    dag.add(f"{fid}:wind", lambda: first_wind_storm_application(headers, code, fight, players, st_wind))
+    dag.add(f"{fid}:quet_hp", quet_hp_at, deps=[f"{fid}:wind"])
+    # unsharded: the DAG's workers already bound how many streams run at once
+    dag.add(f"{fid}:deaths", lambda: iron_qon_dog_deaths_for_kill(headers, code, fight))
+    return dag.add(result, store_kill, deps=[f"{fid}:ro25", f"{fid}:wind", f"{fid}:quet_hp", f"{fid}:deaths"])
+
+
+def kill_summary(result: Dict[str, Any], fight: Dict[str, Any]) -> str:
+    start = fight["startTime"]
+    merged = sorted((ts, label) for label, ts_list in result["deaths"].items() for ts in ts_list)
+    return ", ".join(f"{label} {rel_mmss(ts, start)}" for ts, label in merged) or "-"
 
 
 def main() -> None:
@@ -496,6 +293,8 @@ def main() -> None:
     ap.add_argument("code", nargs="?", help="Warcraft Logs report code (e.g. vFYGaXZgdTk9P6tz)")
     ap.add_argument("--code", dest="code2", help="Same as positional code")
     ap.add_argument("--fight", default="Iron Qon", help="Fight name as it appears in WCL (default: Iron Qon)")
+    ap.add_argument("--workers", type=int, default=4, help="Concurrent analysis steps (default: 4)")
+    ap.add_argument("--timings", action="store_true", help="Print the step critical-path report")
     args = ap.parse_args()
     report_code = REPORT_CODE
     if not report_code:
@@ -508,12 +307,10 @@ def main() -> None:
     headers = {"Authorization": f"Bearer {token}"}
 
     title, fights, actors = fetch_report(headers, report_code)
-    actor_by_id = build_actor_by_id(actors)
-    iron_qon_id = find_single_actor_id_fuzzy(actors, IRON_QON_KEYS)  # optional; used only for debug/printing if you want
 
     print(f"\nReport: {title} ({report_code})\n")
 
-    kills = pick_fight_ids(fights, args.fight)
+    kills = pick_kills(fights, args.fight)
     if not kills:
         # helpful hint: show unique fight names containing 'qon' if name mismatch
         names = sorted({str(f.get("name")) for f in fights if isinstance(f, dict) and isinstance(f.get("name"), str)})
@@ -525,52 +322,22 @@ def main() -> None:
                 print("  -", n)
         return
 
-    dog_ids = build_dog_id_map(actors)
-
-    # print("Matched dog actor IDs (fuzzy):")
-    # for label, subs in DOG_KEYS.items():
-    #     hits = find_actor_ids_fuzzy(actors, subs)[:6]
-    #     if not hits:
-    #         print(f"  {label:8s}: (no matches for substrings {subs})")
-    #     else:
-    #         printable = ", ".join(f"{h.get('name')}#{h.get('id')}" for h in hits)
-    #         print(f"  {label:8s}: {printable}")
-    # print()
-
-    # print("Iron Qon — dog death times (KILLS ONLY)")
-    # print("---------------------------------------")
+    # one stats dict per search step: steps run concurrently
+    step_stats: Dict[str, Dict[str, int]] = {}
+    dag = Dag()
+    done = {f["id"]: add_kill_steps(dag, headers, report_code, f, step_stats) for f in kills}
+    out = dag.run(workers=args.workers)
+    results: Dict[int, Dict[str, Any]] = {fid: out[step] for fid, step in done.items()}
 
     for f in kills:
         fight_id = f["id"]
         start = f["startTime"]
         end = f["endTime"]
         dur = mmss_from_ms(end - start)
-        # Ro'Shak 25% time
-        # ro25_ts = roshak_first_25pct_time(headers, report_code, f, dog_ids.get("Ro'Shak", []))
-        ro25_ts = first_damage_to_targets(
-            headers, report_code, f,
-            [iron_qon_id] if isinstance(iron_qon_id, int) else []
-        )
-
-
-        # First Wind Storm application
-        wind = first_wind_storm_application(headers, report_code, f, actor_by_id)
-        QUETZAL_MAX_HP = 399_065_355
-
-        quet_hp = None
-        if wind is not None:
-            wind_ts, _ = wind
-            quet_hp = quetzal_hp_pct_at_windstorm_by_damage(
-                headers, report_code, f,
-                dog_ids.get("Quet'Zal", []),
-                wind_ts,
-                QUETZAL_MAX_HP
-            )
-
-
-
-
-        deaths = iron_qon_dog_deaths_for_kill(headers, report_code, f, dog_ids)
+        ro25_ts = results[fight_id]["ro25_ts"]
+        wind = results[fight_id]["wind"]
+        quet_hp = results[fight_id]["quet_hp"]
+        deaths = results[fight_id]["deaths"]
         print(f"\nKill duration: {dur}   (fight id {fight_id})")
 
         if ro25_ts is None:
@@ -604,6 +371,30 @@ def main() -> None:
         else:
             print("  Order   : -")
 
+        record(report_code, f, "iron_qon", ANALYZER_VERSION, {
+            "duration_ms": end - start,
+            "ro25_ms": None if ro25_ts is None else ro25_ts - start,
+            "wind_storm_ms": None if wind is None else wind[0] - start,
+            "quetzal_hp_pct": quet_hp,
+            "dog_death_ms": {label: [ts - start for ts in ts_list] for label, ts_list in deaths.items()},
+        })
+
+    search_stats: Dict[str, int] = {}
+    for st in step_stats.values():
+        add_stats(search_stats, st)
+    if search_stats:
+        print(
+            f"\nFirst-occurrence searches: {search_stats.get('requests', 0)} requests, "
+            f"{search_stats.get('bytes', 0)} bytes"
+        )
+    if args.timings:
+        print()
+        print(dag.report())
+    summary = memo_report()
+    if summary:
+        print()
+        print(summary)
+
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,115 @@
+"""
+Bloodlust / Heroism detection for many fights in one filtered event stream.
+
+Casts of every lust ability and applications of every lust lockout debuff
+(Sated, Exhaustion, Temporal Displacement, Insanity) are requested together
+with a server-side filterExpression over all the given fightIDs, so a whole
+report costs a few pages instead of one query per kill. The lockout debuffs
+also catch lusts whose cast is missing from the log (e.g. pet or drums), and
+the number of players that received one is the raid coverage.
+"""
+from typing import Any, Dict, List, Optional
+
+from fight_index import FightIndex
+from wcl import API_URL, fight_player_ids, iter_events
+
+LUST_CAST_IDS: Dict[int, str] = {
+    32182: "Heroism",
+    2825: "Bloodlust",
+    80353: "Time Warp",
+    90355: "Ancient Hysteria",
+    146555: "Drums of Rage",
+}
+
+LUST_LOCKOUT_DEBUFF_IDS: Dict[int, str] = {
+    57724: "Sated",
+    57723: "Exhaustion",
+    80354: "Temporal Displacement",
+    95809: "Insanity",
+}
+
+# lockout applications this long after the lust count toward its coverage
+COVERAGE_WINDOW_MS = 5_000
+
+
+def _ids(d: Dict[int, str]) -> str:
+    return ", ".join(str(i) for i in sorted(d))
+
+
+LUST_FILTER = (
+    f'(type = "cast" and ability.id in ({_ids(LUST_CAST_IDS)}))'
+    f' or (type = "applydebuff" and ability.id in ({_ids(LUST_LOCKOUT_DEBUFF_IDS)}))'
+)
+
+
+def detect_lust(
+    headers: Dict[str, str],
+    code: str,
+    fights: List[Dict[str, Any]],
+    api_url: str = API_URL,
+) -> Dict[int, Dict[str, Any]]:
+    """
+    {fight_id: {"timestamp", "source_id", "ability_id", "ability", "via", "covered", "raid_size"}}
+    for the earliest lust in each fight that had one. "via" is "cast", or "debuff" when
+    only lockout applications were logged; "covered" counts players that got a lockout
+    within COVERAGE_WINDOW_MS of it.
+    """
+    fights = [f for f in fights if isinstance(f, dict) and isinstance(f.get("id"), int)]
+    if not fights:
+        return {}
+    index = FightIndex(fights)
+    start = min(f["startTime"] for f in fights)
+    end = max(f["endTime"] for f in fights)
+
+    casts: Dict[int, List[Dict[str, Any]]] = {}
+    lockouts: Dict[int, List[Dict[str, Any]]] = {}
+    stream = iter_events(
+        headers, code, [f["id"] for f in fights], start, end, "All",
+        filter_expression=LUST_FILTER, api_url=api_url,
+    )
+    for e in stream:
+        ts = e.get("timestamp")
+        if not isinstance(ts, int):
+            continue
+        fid = e.get("fight")
+        if fid not in index.by_id:
+            f = index.fight_at(ts)
+            fid = f["id"] if f else None
+        if fid is None:
+            continue
+        abid = e.get("abilityGameID")
+        et = (e.get("type") or "").lower()
+        if et == "cast" and abid in LUST_CAST_IDS:
+            casts.setdefault(fid, []).append(e)
+        elif et == "applydebuff" and abid in LUST_LOCKOUT_DEBUFF_IDS:
+            lockouts.setdefault(fid, []).append(e)
+
+    out: Dict[int, Dict[str, Any]] = {}
+    for f in fights:
+        fid = f["id"]
+        first: Optional[Dict[str, Any]] = min(casts.get(fid, []), key=lambda e: e["timestamp"], default=None)
+        via = "cast"
+        if first is None:
+            first = min(lockouts.get(fid, []), key=lambda e: e["timestamp"], default=None)
+            via = "debuff"
+        if first is None:
+            continue
+
+        ts = first["timestamp"]
+        players = fight_player_ids(f)
+        covered = {
+            e.get("targetID") for e in lockouts.get(fid, [])
+            if ts <= e["timestamp"] <= ts + COVERAGE_WINDOW_MS
+            and (not players or e.get("targetID") in players)
+        }
+        abid = first.get("abilityGameID")
+        out[fid] = {
+            "timestamp": ts,
+            "source_id": first.get("sourceID"),
+            "ability_id": abid,
+            "ability": LUST_CAST_IDS.get(abid) or LUST_LOCKOUT_DEBUFF_IDS.get(abid),
+            "via": via,
+            "covered": len(covered),
+            "raid_size": len(players),
+        }
+    return out
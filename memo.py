@@ -0,0 +1,388 @@
+"""
+Per-fight result memoization for the analysis scripts.
+
+    py memo.py log                      # what the last runs reused / recomputed, and why
+    py memo.py log --analyzer megaera
+    py memo.py clear [--analyzer megaera]
+
+Each analyzer's per-kill result (a JSON-able dict) is stored under (report,
+fight, analyzer) together with three fingerprints:
+
+  code    sha256 of the analyzer script and every repo module it imports,
+          transitively (parsed, not executed), one hash per file, plus the
+          data files those modules register (register_data: encounters/*.json)
+  config  the analyzer's version and options (fight name, ability ids, ...)
+  inputs  the fight header (times, kill flag, actors, difficulty/size) and, per
+          event stream the analyzer declares it reads, the row count and a
+          checksum of the stored events when a local backend serves them; from
+          the API the header stands in (a live report whose fight moved on gets
+          a new header, so its results are recomputed)
+
+A stored result is reused only when all three match, so editing megaera.py
+recomputes Megaera and nothing else, while editing a shared module (e.g.
+encounters.py) recomputes every analyzer that imports it. Every decision is
+logged with its reason (new, code changed: megaera.py, config changed: ability,
+inputs changed) and report() summarizes the current run.
+
+Results pass through JSON even when freshly computed, so a reused result looks
+exactly like a new one (tuples come back as lists, dict keys as strings).
+
+Set WCL_MEMO to choose the file (default wcl_memo.sqlite); set it to an empty
+string to turn memoization off.
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_MEMO = os.getenv("WCL_MEMO", "wcl_memo.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    code TEXT NOT NULL,
+    fight INTEGER NOT NULL,
+    analyzer TEXT NOT NULL,
+    code_hash TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    inputs_hash TEXT NOT NULL,
+    files TEXT NOT NULL,
+    config TEXT NOT NULL,
+    result TEXT NOT NULL,
+    computed_at REAL,
+    PRIMARY KEY (code, fight, analyzer)
+);
+CREATE TABLE IF NOT EXISTS log (
+    at REAL NOT NULL,
+    code TEXT NOT NULL,
+    fight INTEGER NOT NULL,
+    analyzer TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    reason TEXT
+);
+"""
+
+_CODE_HASHES: Dict[str, Dict[str, str]] = {}
+# module path -> data files it loads (register_data)
+_DATA_FILES: Dict[str, List[str]] = {}
+# (backend id, code, fight, stream) -> stored stream checksum
+_STREAM_HASHES: Dict[Tuple[int, str, int, str], Optional[str]] = {}
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _local_imports(path: str) -> List[str]:
+    """
+    Repo modules (siblings of path) that path imports.
+    """
+    with open(path, "rb") as fh:
+        tree = ast.parse(fh.read(), filename=path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(a.name.split(".")[0] for a in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split(".")[0])
+    base = os.path.dirname(os.path.abspath(path))
+    return [p for p in (os.path.join(base, f"{n}.py") for n in sorted(names)) if os.path.exists(p)]
+
+
+def register_data(module: str, paths: Iterable[str]) -> None:
+    """
+    Declares data files module loads (e.g. encounter specs); they join the code
+    fingerprint of every analyzer that imports module.
+    """
+    _DATA_FILES[os.path.abspath(module)] = sorted(os.path.abspath(p) for p in paths)
+    _CODE_HASHES.clear()
+
+
+def code_fingerprint(source: str) -> Dict[str, str]:
+    """
+    {file name: sha256} for source and the repo modules it imports, transitively,
+    and their registered data files (named relative to the module, e.g. encounters/megaera.json).
+    """
+    source = os.path.abspath(source)
+    if source not in _CODE_HASHES:
+        files: Dict[str, str] = {}
+        todo = [source]
+        while todo:
+            path = todo.pop()
+            name = os.path.basename(path)
+            if name in files:
+                continue
+            with open(path, "rb") as fh:
+                files[name] = _sha(fh.read())
+            for data in _DATA_FILES.get(path, ()):
+                with open(data, "rb") as fh:
+                    files[os.path.relpath(data, os.path.dirname(path)).replace(os.sep, "/")] = _sha(fh.read())
+            todo.extend(_local_imports(path))
+        _CODE_HASHES[source] = dict(sorted(files.items()))
+    return _CODE_HASHES[source]
+
+
+def stream_fingerprint(code: str, fight: Dict[str, Any], stream: str) -> Optional[str]:
+    """
+    sha256 of the row count and columns (ts, type, source, target, ability, amount) of the
+    events a whole-fight query for stream returns from the local backend; None from the API.
+    """
+    import wcl  # only needed once something is memoized
+
+    backend = wcl.get_backend()
+    if backend is None or not hasattr(backend, "event_index"):
+        return None
+    key = (id(backend), code, fight["id"], stream)
+    if key not in _STREAM_HASHES:
+        from event_store import DATA_TYPES, page_rows
+
+        if stream not in DATA_TYPES:
+            _STREAM_HASHES[key] = None
+        else:
+            idx = backend.event_index(code, fight["id"])
+            enemies = {
+                n["id"] for n in (fight.get("enemyNPCs") or [])
+                if isinstance(n, dict) and isinstance(n.get("id"), int)
+            }
+            rows = page_rows(idx, enemies, fight["startTime"], fight["endTime"], stream)
+            h = hashlib.sha256(f"{len(rows)}".encode("utf-8"))
+            types = sorted({int(t) for t in idx.type[rows].tolist()})
+            h.update(json.dumps({t: idx.type_names[t] for t in types}).encode("utf-8"))
+            for col in (idx.ts, idx.type, idx.source, idx.target, idx.ability, idx.amount):
+                h.update(col[rows].tobytes())
+            _STREAM_HASHES[key] = h.hexdigest()
+    return _STREAM_HASHES[key]
+
+
+def inputs_fingerprint(code: str, fight: Dict[str, Any], streams: Sequence[str] = ()) -> str:
+    contents = {s: stream_fingerprint(code, fight, s) for s in sorted(streams)}
+    return _sha(json.dumps([code, fight, contents], sort_keys=True, default=str).encode("utf-8"))
+
+
+def _json(v: Any) -> str:
+    return json.dumps(v, sort_keys=True, default=str)
+
+
+class Memo:
+    def __init__(self, path: str = DEFAULT_MEMO):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        # this process's decisions: (analyzer, code, fight, "reused" | "computed", reason)
+        self.decisions: List[Tuple[str, str, int, str, str]] = []
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _key(
+        self,
+        code: str,
+        fight: Dict[str, Any],
+        source: str,
+        config: Optional[Dict[str, Any]],
+        streams: Sequence[str],
+    ) -> Dict[str, Any]:
+        files = code_fingerprint(source)
+        return {
+            "files": files,
+            "code_hash": _sha(_json(files).encode("utf-8")),
+            "config": config or {},
+            "config_hash": _sha(_json(config or {}).encode("utf-8")),
+            "inputs_hash": inputs_fingerprint(code, fight, streams),
+        }
+
+    def _log(self, code: str, fight_id: int, analyzer: str, outcome: str, reason: str) -> None:
+        self.decisions.append((analyzer, code, fight_id, outcome, reason))
+        self.db.execute("INSERT INTO log VALUES (?, ?, ?, ?, ?, ?)", (time.time(), code, fight_id, analyzer, outcome, reason))
+        self.db.commit()
+
+    def get(
+        self,
+        code: str,
+        fight: Dict[str, Any],
+        analyzer: str,
+        source: str,
+        config: Optional[Dict[str, Any]] = None,
+        streams: Sequence[str] = (),
+    ) -> Tuple[bool, Any]:
+        """
+        (True, result) when a stored result matches code, config and inputs; else (False, None),
+        logging why it has to be recomputed.
+        """
+        key = self._key(code, fight, source, config, streams)
+        with self._lock:
+            row = self.db.execute(
+                "SELECT code_hash, config_hash, inputs_hash, files, config, result FROM results "
+                "WHERE code = ? AND fight = ? AND analyzer = ?",
+                (code, fight["id"], analyzer),
+            ).fetchone()
+            if row is None:
+                self._log(code, fight["id"], analyzer, "computed", "new")
+                return False, None
+            code_hash, config_hash, inputs_hash, files, old_config, result = row
+            reasons = []
+            if code_hash != key["code_hash"]:
+                old = json.loads(files)
+                changed = sorted(set(old) ^ set(key["files"]) | {f for f in old if key["files"].get(f, old[f]) != old[f]})
+                reasons.append(f"code changed: {', '.join(changed)}")
+            if config_hash != key["config_hash"]:
+                old = json.loads(old_config)
+                changed = sorted(k for k in set(old) | set(key["config"]) if old.get(k) != key["config"].get(k))
+                reasons.append(f"config changed: {', '.join(changed)}")
+            if inputs_hash != key["inputs_hash"]:
+                reasons.append("inputs changed")
+            if reasons:
+                self._log(code, fight["id"], analyzer, "computed", "; ".join(reasons))
+                return False, None
+            self._log(code, fight["id"], analyzer, "reused", "")
+            return True, json.loads(result)
+
+    def put(
+        self,
+        code: str,
+        fight: Dict[str, Any],
+        analyzer: str,
+        result: Any,
+        source: str,
+        config: Optional[Dict[str, Any]] = None,
+        streams: Sequence[str] = (),
+    ) -> Any:
+        """
+        Stores result; returns it as it will come back from get().
+        """
+        key = self._key(code, fight, source, config, streams)
+        data = json.dumps(result, default=str)  # key order kept: scripts print in dict order
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (code, fight["id"], analyzer, key["code_hash"], key["config_hash"], key["inputs_hash"],
+                 _json(key["files"]), _json(key["config"]), data, time.time()),
+            )
+            self.db.commit()
+        return json.loads(data)
+
+    def report(self) -> str:
+        """
+        One summary line for this process's decisions, plus one line per recomputed fight.
+        """
+        reused = sum(1 for d in self.decisions if d[3] == "reused")
+        computed = [d for d in self.decisions if d[3] == "computed"]
+        lines = [f"Memo: {reused} reused, {len(computed)} recomputed"]
+        for analyzer, code, fight_id, _, reason in computed:
+            lines.append(f"  {analyzer} {code} fight {fight_id}: {reason}")
+        return "\n".join(lines)
+
+
+_MEMO: Optional[Memo] = None
+
+
+def _memo() -> Optional[Memo]:
+    global _MEMO
+    if not DEFAULT_MEMO:
+        return None
+    if _MEMO is None:
+        _MEMO = Memo(DEFAULT_MEMO)
+    return _MEMO
+
+
+def cached(
+    code: str,
+    fight: Dict[str, Any],
+    analyzer: str,
+    source: str,
+    config: Optional[Dict[str, Any]] = None,
+    streams: Sequence[str] = (),
+) -> Tuple[bool, Any]:
+    """
+    Memo.get on the default memo; always a miss when WCL_MEMO is empty.
+    """
+    memo = _memo()
+    if memo is None:
+        return False, None
+    return memo.get(code, fight, analyzer, source, config, streams)
+
+
+def store(
+    code: str,
+    fight: Dict[str, Any],
+    analyzer: str,
+    result: Any,
+    source: str,
+    config: Optional[Dict[str, Any]] = None,
+    streams: Sequence[str] = (),
+) -> Any:
+    memo = _memo()
+    if memo is None:
+        return json.loads(json.dumps(result, default=str))
+    return memo.put(code, fight, analyzer, result, source, config, streams)
+
+
+def memoized(
+    code: str,
+    fight: Dict[str, Any],
+    analyzer: str,
+    compute: Callable[[], Any],
+    source: str,
+    config: Optional[Dict[str, Any]] = None,
+    streams: Sequence[str] = (),
+) -> Any:
+    """
+    The stored result for this fight and analyzer, or compute()'s (then stored).
+    """
+    hit, result = cached(code, fight, analyzer, source, config, streams)
+    if hit:
+        return result
+    return store(code, fight, analyzer, compute(), source, config, streams)
+
+
+def report() -> str:
+    """
+    Memo.report for the default memo ("" when memoization is off or unused).
+    """
+    return _MEMO.report() if _MEMO is not None and _MEMO.decisions else ""
+
+
+# -------------------- CLI --------------------
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Per-fight analyzer result memo.")
+    ap.add_argument("--db", default=DEFAULT_MEMO or "wcl_memo.sqlite", help="Memo SQLite file")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    lg = sub.add_parser("log", help="Recent reuse/recompute decisions")
+    lg.add_argument("--analyzer")
+    lg.add_argument("--limit", type=int, default=50)
+    cl = sub.add_parser("clear", help="Forget stored results (all, or one analyzer's)")
+    cl.add_argument("--analyzer")
+    args = ap.parse_args(None if argv is None else list(argv))
+
+    memo = Memo(args.db)
+    try:
+        if args.cmd == "clear":
+            if args.analyzer:
+                n = memo.db.execute("DELETE FROM results WHERE analyzer = ?", (args.analyzer,)).rowcount
+            else:
+                n = memo.db.execute("DELETE FROM results").rowcount
+            memo.db.commit()
+            print(f"Cleared {n} stored results.")
+            return
+        sql = "SELECT at, analyzer, code, fight, outcome, reason FROM log"
+        params: List[Any] = []
+        if args.analyzer:
+            sql += " WHERE analyzer = ?"
+            params.append(args.analyzer)
+        sql += " ORDER BY at DESC, rowid DESC LIMIT ?"
+        params.append(args.limit)
+        for at, analyzer, code, fight_id, outcome, reason in reversed(memo.db.execute(sql, params).fetchall()):
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(at))
+            print(f"{when}  {analyzer:<10s} {code:<18s} {fight_id:>4d}  {outcome:<9s} {reason or ''}")
+    finally:
+        memo.close()
+
+
+if __name__ == "__main__":
+    main()
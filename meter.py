@@ -0,0 +1,205 @@
+"""
+Per-kill damage / healing meter from one DamageDone and one Healing stream.
+
+Events are reduced to flat integer columns while streaming; totals per source,
+target, ability and (source, ability) are then np.bincount() over dense actor /
+ability indexes, so a full raid meter costs about one network pass. The same
+events also build the pull's rollups, whose 30s raid DPS / HPS series is the
+downsampled timeline printed under each kill.
+"""
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from rollups import Rollups
+from wcl import fetch_report, get_token, iter_events
+
+REPORT_CODE = "vFYGaXZgdTk9P6tz"
+CLIENT_ID = os.getenv("WCL_CLIENT_ID", "")
+CLIENT_SECRET = os.getenv("WCL_CLIENT_SECRET", "")
+
+DAMAGE_TYPES = {"damage"}
+HEALING_TYPES = {"heal", "absorbed"}
+
+
+def mmss_from_ms(ms: int) -> str:
+    s = ms // 1000
+    m, s = divmod(s, 60)
+    return f"{m}:{s:02d}"
+
+
+def _columns(events: Iterable[Dict[str, Any]], types: set, extra_key: str) -> Dict[str, np.ndarray]:
+    """
+    Flatten matching events to int64 columns: source, target, ability, amount, extra.
+    extra is absorbed (damage) or overheal (healing).
+    """
+    src: List[int] = []
+    tgt: List[int] = []
+    abl: List[int] = []
+    amt: List[int] = []
+    ext: List[int] = []
+    for e in events:
+        if (e.get("type") or "").lower() not in types:
+            continue
+        sid, tid, ab = e.get("sourceID"), e.get("targetID"), e.get("abilityGameID")
+        if not isinstance(sid, int) or not isinstance(tid, int):
+            continue
+        a = e.get("amount")
+        x = e.get(extra_key)
+        src.append(sid)
+        tgt.append(tid)
+        abl.append(ab if isinstance(ab, int) else 0)
+        amt.append(a if isinstance(a, int) and a > 0 else 0)
+        ext.append(x if isinstance(x, int) and x > 0 else 0)
+    return {
+        "source": np.asarray(src, dtype=np.int64),
+        "target": np.asarray(tgt, dtype=np.int64),
+        "ability": np.asarray(abl, dtype=np.int64),
+        "amount": np.asarray(amt, dtype=np.int64),
+        "extra": np.asarray(ext, dtype=np.int64),
+    }
+
+
+def _sum_by(keys: np.ndarray, *weights: np.ndarray) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    (unique keys, [per-key sum of each weight column]) via bincount on the dense index.
+    """
+    if len(keys) == 0:
+        return keys, [np.empty(0, dtype=np.int64) for _ in weights]
+    uniq, inv = np.unique(keys, return_inverse=True)
+    sums = [np.bincount(inv, weights=w, minlength=len(uniq)).astype(np.int64) for w in weights]
+    return uniq, sums
+
+
+def _table(
+    cols: Dict[str, np.ndarray], key: str, extra_name: str, seconds: float, rate_includes_extra: bool
+) -> Dict[int, Dict[str, Any]]:
+    uniq, (amount, extra, hits) = _sum_by(
+        cols[key], cols["amount"], cols["extra"], np.ones(len(cols[key]), dtype=np.int64)
+    )
+    out: Dict[int, Dict[str, Any]] = {}
+    rate = amount + extra if rate_includes_extra else amount
+    for i, k in enumerate(uniq):
+        out[int(k)] = {
+            "amount": int(amount[i]),
+            extra_name: int(extra[i]),
+            "hits": int(hits[i]),
+            "per_second": (int(rate[i]) / seconds) if seconds > 0 else 0.0,
+        }
+    return out
+
+
+def _breakdown(cols: Dict[str, np.ndarray]) -> Dict[int, Dict[int, int]]:
+    """
+    {source: {ability: amount}} keyed on a combined (source, ability) index.
+    """
+    if len(cols["source"]) == 0:
+        return {}
+    pair = np.stack([cols["source"], cols["ability"]], axis=1)
+    uniq, inv = np.unique(pair, axis=0, return_inverse=True)
+    sums = np.bincount(inv.ravel(), weights=cols["amount"], minlength=len(uniq)).astype(np.int64)
+    out: Dict[int, Dict[int, int]] = {}
+    for (sid, ab), v in zip(uniq.tolist(), sums.tolist()):
+        out.setdefault(sid, {})[ab] = v
+    return out
+
+
+def build_meter(
+    damage_events: Iterable[Dict[str, Any]],
+    healing_events: Iterable[Dict[str, Any]],
+    fight_start: int,
+    fight_end: int,
+) -> Dict[str, Any]:
+    """
+    Returns {"duration_ms", "damage": {...}, "healing": {...}} where each side has
+    by_source / by_target / by_ability tables and a by_source_ability breakdown.
+    Damage "amount" excludes absorbed (reported separately); per_second uses amount + absorbed
+    for damage and amount (effective healing) for healing.
+    """
+    duration_ms = max(0, fight_end - fight_start)
+    seconds = duration_ms / 1000.0
+
+    dmg = _columns(damage_events, DAMAGE_TYPES, "absorbed")
+    heal = _columns(healing_events, HEALING_TYPES, "overheal")
+
+    damage = {
+        "by_source": _table(dmg, "source", "absorbed", seconds, True),
+        "by_target": _table(dmg, "target", "absorbed", seconds, True),
+        "by_ability": _table(dmg, "ability", "absorbed", seconds, True),
+        "by_source_ability": _breakdown(dmg),
+        "total": int(dmg["amount"].sum() + dmg["extra"].sum()),
+    }
+
+    healing = {
+        "by_source": _table(heal, "source", "overheal", seconds, False),
+        "by_target": _table(heal, "target", "overheal", seconds, False),
+        "by_ability": _table(heal, "ability", "overheal", seconds, False),
+        "by_source_ability": _breakdown(heal),
+        "total": int(heal["amount"].sum()),
+    }
+
+    return {"duration_ms": duration_ms, "damage": damage, "healing": healing}
+
+
+def raid_timeline(rollups: Rollups, resolution_ms: Optional[int] = None) -> Dict[str, List[Tuple[int, float]]]:
+    """
+    {"damage": [(offset_ms, DPS), ...], "healing": [(offset_ms, HPS), ...]} per rollup bucket
+    (default the coarsest), damage including absorbed. The last bucket is rated over its real length.
+    """
+    out: Dict[str, List[Tuple[int, float]]] = {}
+    for side, metrics in (("damage", ("damage", "absorbed")), ("healing", ("healing",))):
+        ts, values = rollups.timeline(metrics[0], "source", resolution_ms=resolution_ms)
+        for metric in metrics[1:]:
+            values = values + rollups.timeline(metric, "source", resolution_ms=resolution_ms)[1]
+        res = rollups.resolutions[-1] if resolution_ms is None else resolution_ms
+        rows = []
+        for t, v in zip(ts.tolist(), values.tolist()):
+            span = min(res, rollups.fight_end - t)
+            rows.append((t - rollups.fight_start, v * 1000.0 / span if span > 0 else 0.0))
+        out[side] = rows
+    return out
+
+
+def kill_meter(headers: Dict[str, str], code: str, fight: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    build_meter for one kill plus its "timeline" (raid_timeline), from one pass over each stream.
+    """
+    start, end, fight_id = fight["startTime"], fight["endTime"], fight["id"]
+    damage = list(iter_events(headers, code, fight_id, start, end, "DamageDone"))
+    healing = list(iter_events(headers, code, fight_id, start, end, "Healing"))
+    m = build_meter(damage, healing, start, end)
+    m["timeline"] = raid_timeline(Rollups.from_events(damage, healing, start, end))
+    return m
+
+
+def main(top_n: int = 10) -> None:
+    token = get_token(CLIENT_ID, CLIENT_SECRET)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    title, fights, players = fetch_report(headers, REPORT_CODE)
+    names = {a["id"]: a.get("name") for a in players if isinstance(a, dict) and isinstance(a.get("id"), int)}
+    print(f"\nReport: {title} ({REPORT_CODE})\n")
+
+    for f in fights:
+        if not isinstance(f, dict) or f.get("kill") is not True:
+            continue
+        m = kill_meter(headers, REPORT_CODE, f)
+        print(f"{f['name']}  {mmss_from_ms(m['duration_ms'])}  (fight id {f['id']})")
+
+        for side, label in (("damage", "DPS"), ("healing", "HPS")):
+            rows = sorted(
+                ((sid, r) for sid, r in m[side]["by_source"].items() if sid in names),
+                key=lambda kv: -kv[1]["per_second"],
+            )[:top_n]
+            print(f"  {label}:")
+            for sid, r in rows:
+                print(f"    {str(names.get(sid)):<16s} {r['per_second']:>10,.0f}")
+        for side, label in (("damage", "DPS"), ("healing", "HPS")):
+            series = "  ".join(f"{mmss_from_ms(t)} {v / 1000:,.0f}k" for t, v in m["timeline"][side])
+            print(f"  Raid {label} by 30s: {series}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
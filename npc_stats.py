@@ -0,0 +1,112 @@
+"""
+Cross-report NPC stats: (gameID, difficulty, raid size) -> max HP, kept across
+runs in one JSON file.
+
+Nothing is fetched for this: any pass that already streams events can tap() them
+and every HP snapshot on a fight's enemy NPCs (health / resource events, and
+hitPoints/maxHitPoints on damage etc., see hp_timeline.hp_snapshot) is learned on
+the way through. The event store learns from every fight it ingests. Damage-based
+HP% estimates then read max_hp() instead of a hardcoded constant, and work for
+any difficulty or raid size once one report of it has been processed.
+
+Fights carry difficulty/size from wcl.REPORT_QUERY; fights stored before that
+field existed key as "?" and only match each other.
+
+WCL_NPC_STATS picks the file (default npc_stats.json).
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from hp_timeline import hp_snapshot
+
+NPC_STATS = os.getenv("WCL_NPC_STATS", "npc_stats.json")
+
+
+def stats_key(game_id: int, fight: Dict[str, Any]) -> str:
+    diff, size = fight.get("difficulty"), fight.get("size")
+    return f"{game_id}:{'?' if diff is None else diff}:{'?' if size is None else size}"
+
+
+def _game_ids(fight: Dict[str, Any]) -> Dict[int, int]:
+    return {
+        npc["id"]: npc["gameID"]
+        for npc in (fight.get("enemyNPCs") or [])
+        if isinstance(npc, dict) and isinstance(npc.get("id"), int) and isinstance(npc.get("gameID"), int)
+    }
+
+
+class NpcStats:
+    def __init__(self, path: str = NPC_STATS):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fh:
+                self.entries = json.load(fh).get("npcs") or {}
+
+    def _learn(self, key: str, max_hp: int) -> None:
+        entry = self.entries.setdefault(key, {"max_hp": 0})
+        if max_hp > entry["max_hp"]:
+            entry["max_hp"] = max_hp
+            self._dirty = True
+
+    def tap(self, fight: Dict[str, Any], events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Yields events unchanged, learning max HP from any snapshot on the fight's enemy NPCs.
+        Saves once the stream is exhausted (or closed).
+        """
+        game_ids = _game_ids(fight)
+        seen: Dict[str, int] = {}
+        try:
+            for e in events:
+                snap = hp_snapshot(e)
+                if snap is not None and snap[0] in game_ids:
+                    key = stats_key(game_ids[snap[0]], fight)
+                    if snap[3] > seen.get(key, 0):
+                        seen[key] = snap[3]
+                yield e
+        finally:
+            if seen:
+                with self._lock:
+                    for key, mhp in seen.items():
+                        self._learn(key, mhp)
+                    self.save()
+
+    def learn(self, fight: Dict[str, Any], events: Iterable[Dict[str, Any]]) -> None:
+        for _ in self.tap(fight, events):
+            pass
+
+    def max_hp(self, fight: Dict[str, Any], npc_ids: Iterable[int]) -> Optional[int]:
+        """
+        Largest known max HP of these report actor ids' NPCs at this fight's difficulty and size.
+        """
+        game_ids = _game_ids(fight)
+        best: Optional[int] = None
+        with self._lock:
+            for gid in {game_ids[i] for i in npc_ids if i in game_ids}:
+                entry = self.entries.get(stats_key(gid, fight))
+                if entry and (best is None or entry["max_hp"] > best):
+                    best = entry["max_hp"]
+        return best
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"npcs": dict(sorted(self.entries.items()))}, fh, indent=1)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+_STATS: Optional[NpcStats] = None
+
+
+def get_stats() -> NpcStats:
+    global _STATS
+    if _STATS is None:
+        _STATS = NpcStats()
+    return _STATS
@@ -1,25 +1,30 @@
+import argparse
+import importlib
 import os
-import requests
+
+from dag import Dag
+from fight_index import FightIndex
+from lust import detect_lust
+from memo import cached, report as memo_report, store
+from warehouse import record
+from wcl import fetch_report, fight_player_ids, get_token, iter_events
 
 REPORT_CODE = "vFYGaXZgdTk9P6tz"
 CLIENT_ID = os.getenv("WCL_CLIENT_ID", "")
 CLIENT_SECRET = os.getenv("WCL_CLIENT_SECRET", "")
 
-API_URL = "https://classic.warcraftlogs.com/api/v2/client"
-TOKEN_URL = "https://classic.warcraftlogs.com/oauth/token"
-
+ANALYZER_VERSION = 1
 
-def get_token(client_id: str, client_secret: str) -> str:
-    if not client_id or not client_secret:
-        raise SystemExit("Missing CLIENT_ID / CLIENT_SECRET.")
-    r = requests.post(
-        TOKEN_URL,
-        data={"grant_type": "client_credentials"},
-        auth=(client_id, client_secret),
-        timeout=30,
-    )
-    r.raise_for_status()
-    return r.json()["access_token"]
+# boss script per fight name; each has add_kill_steps(dag, headers, code, fight) -> step
+# and kill_summary(result, fight). Imported by name so this script's memo fingerprint
+# doesn't cover them: editing megaera.py recomputes Megaera, not the overall pass.
+BOSS_SCRIPTS = {
+    "Megaera": "megaera",
+    "Council of Elders": "elder_council",
+    "Lei Shen": "leishen",
+    "Tortos": "tortos",
+    "Iron Qon": "ironqon",
+}
 
 
 def mmss_from_ms(ms: int) -> str:
@@ -28,136 +33,75 @@ def mmss_from_ms(ms: int) -> str:
     return f"{m}:{s:02d}"
 
 
-def gql(headers: dict, query: str, variables: dict) -> dict:
-    r = requests.post(API_URL, json={"query": query, "variables": variables}, headers=headers, timeout=30)
-    r.raise_for_status()
-    payload = r.json()
-    if payload.get("errors"):
-        raise RuntimeError(payload["errors"])
-    return payload["data"]
-
-
-def fetch_report_fights_and_player_ids(headers: dict, code: str):
-    query = """
-    query($code: String!) {
-      reportData {
-        report(code: $code) {
-          title
-          fights {
-            id
-            name
-            kill
-            startTime
-            endTime
-          }
-          masterData {
-            actors {
-              id
-              type
-              subType
-            }
-          }
-        }
-      }
-    }
-    """
-    data = gql(headers, query, {"code": code})
-    report = data["reportData"]["report"]
-
-    player_ids = {
-        a["id"]
-        for a in report["masterData"]["actors"]
-        if isinstance(a, dict)
-        and ((a.get("type") or "").lower() == "player"
-             or (a.get("subType") or "").lower() == "player")
-    }
-
-    return report["title"], report["fights"], player_ids
-
-
-def get_deaths(headers: dict, code: str, fight_id: int, player_ids: set[int]) -> int:
-    query = """
-    query($code: String!, $fightID: Int!, $startTime: Float) {
-      reportData {
-        report(code: $code) {
-          events(dataType: Deaths, fightIDs: [$fightID], startTime: $startTime) {
-            data
-            nextPageTimestamp
-          }
-        }
-      }
-    }
-    """
-    start = None
+def get_deaths(headers: dict, code: str, fight: dict, player_ids: set[int]) -> int:
     count = 0
-
-    while True:
-        data = gql(headers, query, {"code": code, "fightID": fight_id, "startTime": start})
-        ev = data["reportData"]["report"]["events"]
-
-        for e in ev.get("data") or []:
-            tid = e.get("targetID")
-            if tid is None:
-                target = e.get("target")
-                tid = target.get("id") if isinstance(target, dict) else target
-            if isinstance(tid, int) and tid in player_ids:
-                count += 1
-
-        start = ev.get("nextPageTimestamp")
-        if not start:
-            break
-
+    for e in iter_events(headers, code, fight["id"], fight["startTime"], fight["endTime"], "Deaths"):
+        tid = e.get("targetID")
+        if tid is None:
+            target = e.get("target")
+            tid = target.get("id") if isinstance(target, dict) else target
+        if isinstance(tid, int) and tid in player_ids:
+            count += 1
     return count
 
 
-def get_heroism_timestamp(headers: dict, code: str, fight_id: int):
-    query = """
-    query($code: String!, $fightID: Int!) {
-      reportData {
-        report(code: $code) {
-          events(fightIDs: [$fightID], dataType: Casts, abilityID: 32182) {
-            data
-          }
-        }
-      }
-    }
-    """
-    data = gql(headers, query, {"code": code, "fightID": fight_id})
-    events = [
-        e for e in data["reportData"]["report"]["events"].get("data") or []
-        if isinstance(e, dict) and isinstance(e.get("timestamp"), int)
-    ]
-    if not events:
-        return None
-    return min(e["timestamp"] for e in events)
-
-
 def main():
+    ap = argparse.ArgumentParser(description="Per-kill overview of a report, with each boss script's analysis.")
+    ap.add_argument("--workers", type=int, default=4, help="Concurrent analysis steps across all kills (default: 4)")
+    ap.add_argument("--timings", action="store_true", help="Print the step critical-path report")
+    args = ap.parse_args()
+
     token = get_token(CLIENT_ID, CLIENT_SECRET)
     headers = {"Authorization": f"Bearer {token}"}
 
-    title, fights, player_ids = fetch_report_fights_and_player_ids(headers, REPORT_CODE)
+    title, fights, _ = fetch_report(headers, REPORT_CODE)
     print(f"\nReport: {title} ({REPORT_CODE})\n")
 
+    index = FightIndex(fights)
     kills = []
     total_wipes = 0
 
-    for i, f in enumerate(fights):
-        if not f["kill"]:
-            continue
-
+    # every kill's steps (deaths, lust, the boss script's analysis) go on one DAG, so
+    # independent work across kills and bosses runs concurrently; memo hits go into
+    # dag.cache and skip their steps. Lust detection is one pass over the kills still to do.
+    memo_spec = {"source": __file__, "config": {"version": ANALYZER_VERSION}, "streams": ["Deaths", "All"]}
+    dag = Dag()
+    todo = []
+    for f in index.kills():
+        hit, res = cached(REPORT_CODE, f, "overall", **memo_spec)
+        if hit:
+            dag.cache[f"{f['id']}:overall"] = res
+            dag.add(f"{f['id']}:overall", lambda res=res: res)
+        else:
+            todo.append(f)
+    if todo:
+        dag.add("lust", lambda: detect_lust(headers, REPORT_CODE, todo))
+    for f in todo:
+        dag.add(f"{f['id']}:player_deaths", lambda f=f: get_deaths(headers, REPORT_CODE, f, fight_player_ids(f)))
+        dag.add(
+            f"{f['id']}:overall",
+            lambda lust, deaths, f=f: store(REPORT_CODE, f, "overall", {"deaths": deaths, "lust": lust.get(f["id"])}, **memo_spec),
+            deps=["lust", f"{f['id']}:player_deaths"],
+        )
+    boss_steps = {}
+    for f in index.kills():
+        if f["name"] in BOSS_SCRIPTS:
+            script = importlib.import_module(BOSS_SCRIPTS[f["name"]])
+            boss_steps[f["id"]] = (script, script.add_kill_steps(dag, headers, REPORT_CODE, f))
+    out = dag.run(workers=args.workers)
+    results = {f["id"]: out[f"{f['id']}:overall"] for f in index.kills()}
+
+    for f in index.kills():
         boss = f["name"]
         fight_id = f["id"]
         duration_ms = f["endTime"] - f["startTime"]
 
-        wipes = sum(1 for prev in fights[:i] if prev["name"] == boss and not prev["kill"])
-        if boss == "Ji-Kun":
-            wipes = max(0, wipes - 1)
+        wipes = index.wipes_before[fight_id]
 
-        deaths = get_deaths(headers, REPORT_CODE, fight_id, player_ids)
+        deaths = results[fight_id]["deaths"]
 
-        hero_ts = get_heroism_timestamp(headers, REPORT_CODE, fight_id)
-        lust_at_ms = hero_ts - f["startTime"] if hero_ts else None
+        hero = results[fight_id]["lust"]
+        lust_at_ms = hero["timestamp"] - f["startTime"] if hero else None
 
         total_wipes += wipes
         kills.append({
@@ -167,6 +111,14 @@ def main():
             "wipes": wipes,
             "deaths": deaths,
             "lust_at_ms": lust_at_ms,
+            "lust_cov": f"{hero['covered']}/{hero['raid_size']}" if hero else "-",
+        })
+        record(REPORT_CODE, f, "overall", ANALYZER_VERSION, {
+            "duration_ms": duration_ms,
+            "wipes": wipes,
+            "deaths": deaths,
+            "lust_ms": lust_at_ms,
+            "lust_covered": hero["covered"] if hero else None,
         })
 
     kills.sort(key=lambda x: x["fight_id"])
@@ -174,9 +126,9 @@ def main():
     boss_w = max(12, min(32, max(len(k["boss"]) for k in kills)))
     print(
         f"{'Boss':{boss_w}s}  {'Dur':>6s}  {'Wipes':>5s}  "
-        f"{'Deaths':>6s}  {'Lust @':>6s}  {'FightID':>6s}"
+        f"{'Deaths':>6s}  {'Lust @':>6s}  {'Cov':>5s}  {'FightID':>6s}"
     )
-    print("-" * (boss_w + 35))
+    print("-" * (boss_w + 42))
 
     for k in kills:
         lust_at = mmss_from_ms(k["lust_at_ms"]) if isinstance(k["lust_at_ms"], int) else "-"
@@ -186,11 +138,26 @@ def main():
             f"{k['wipes']:>5d}  "
             f"{k['deaths']:>6d}  "
             f"{lust_at:>6s}  "
+            f"{k['lust_cov']:>5s}  "
             f"{k['fight_id']:>6d}"
         )
 
     print(f"\nTotal kills: {len(kills)} | Total wipes (before kills): {total_wipes}\n")
 
+    if boss_steps:
+        print("Boss details")
+        for f in index.kills():
+            if f["id"] in boss_steps:
+                script, step = boss_steps[f["id"]]
+                print(f"  {f['name']:{boss_w}s}  {script.kill_summary(out[step], f)}  (fight id {f['id']})")
+        print()
+    if args.timings:
+        print(dag.report())
+        print()
+    summary = memo_report()
+    if summary:
+        print(summary)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,180 @@
+"""
+Phase segmentation from declared boundary signals, with per-phase metrics.
+
+A phase spec is plain data:
+
+    {
+        "initial": "P1",
+        "boundaries": [
+            {"kind": "cast",  "ability": 137045, "label": "Intermission {n}", "debounce_ms": 15000},
+            {"kind": "death", "npcs": {68079},   "label": "P2"},
+            {"kind": "hp",    "npcs": {68078},   "pct": 25, "label": "Burn"},
+            {"kind": "aura",  "ability": 136577, "target": "player", "label": "Wind"},
+        ],
+        "track_auras": [136431],
+    }
+
+"npcs" are NPC gameIDs, resolved against the fight's enemyNPCs. Each signal may
+fire once ("once": True, default for death/hp) or repeatedly; "{n}" in the label
+is that signal's firing count. Metrics (duration, player damage done/taken,
+player deaths, tracked aura uptime) are accumulated into the current phase as
+the single stream goes by, so nothing is re-fetched per phase.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from aura_engine import AuraIntervals, union_intervals
+from encounters import ENCOUNTERS, phase_spec
+from hp_timeline import hp_snapshot
+from tot_npcs import fight_npc_ids
+from wcl import fight_player_ids, iter_events
+
+CAST_TYPES = {"begincast", "cast"}
+AURA_APPLY_TYPES = {"applybuff", "applydebuff"}
+
+# Boundaries live in the encounter files (encounters/*.json), with label names
+# resolved to gameIDs. Lei Shen's Supercharge Conduits is logged as begincast +
+# cast; its debounce folds the pair into one boundary.
+PHASE_SPECS: Dict[str, Dict[str, Any]] = {
+    name: phase_spec(spec) for name, spec in ENCOUNTERS.items() if spec.get("phases")
+}
+
+
+def _ability_id(e: Dict[str, Any]) -> Optional[int]:
+    abid = e.get("abilityGameID")
+    if isinstance(abid, int):
+        return abid
+    ab = e.get("ability")
+    if isinstance(ab, dict) and isinstance(ab.get("gameID"), int):
+        return ab["gameID"]
+    return None
+
+
+def _label(template: str, n: int) -> str:
+    return template.replace("{n+1}", str(n + 1)).replace("{n}", str(n))
+
+
+class PhaseTracker:
+    def __init__(self, spec: Dict[str, Any], fight: Dict[str, Any]):
+        self.fight = fight
+        self.players: Set[int] = fight_player_ids(fight)
+        self.track_auras: Set[int] = set(spec.get("track_auras") or [])
+
+        self.signals: List[Dict[str, Any]] = []
+        for b in spec.get("boundaries") or []:
+            sig = dict(b)
+            sig["actors"] = fight_npc_ids(fight, b.get("npcs") or set())
+            sig.setdefault("once", b["kind"] in {"death", "hp"})
+            sig["fired"] = 0
+            sig["last_ts"] = None
+            self.signals.append(sig)
+
+        self.phases: List[Dict[str, Any]] = []
+        self._open(spec.get("initial") or "P1", fight["startTime"])
+        self._aura_events: List[Dict[str, Any]] = []
+
+    def _open(self, label: str, ts: int) -> None:
+        if self.phases:
+            self.phases[-1]["end"] = ts
+        self.phases.append({
+            "label": label,
+            "start": ts,
+            "end": self.fight["endTime"],
+            "damage_done": 0,
+            "damage_taken": 0,
+            "deaths": 0,
+        })
+
+    def _matches(self, sig: Dict[str, Any], e: Dict[str, Any], et: str) -> bool:
+        kind = sig["kind"]
+        if kind == "cast":
+            return et in sig.get("types", CAST_TYPES) and _ability_id(e) == sig["ability"]
+        if kind == "death":
+            return et in {"death", "destroy"} and e.get("targetID") in sig["actors"]
+        if kind == "aura":
+            if et not in sig.get("types", AURA_APPLY_TYPES) or _ability_id(e) != sig["ability"]:
+                return False
+            tgt = sig.get("target")
+            tid = e.get("targetID")
+            if tgt == "player":
+                return tid in self.players
+            return not sig["actors"] or tid in sig["actors"]
+        if kind == "hp":
+            snap = hp_snapshot(e)
+            return snap is not None and snap[0] in sig["actors"] and snap[2] * 100 <= sig["pct"] * snap[3]
+        return False
+
+    def add_event(self, e: Dict[str, Any]) -> None:
+        ts = e.get("timestamp")
+        if not isinstance(ts, int):
+            return
+        et = (e.get("type") or "").lower()
+
+        for sig in self.signals:
+            if sig["once"] and sig["fired"]:
+                continue
+            if not self._matches(sig, e, et):
+                continue
+            debounce = sig.get("debounce_ms")
+            if debounce and sig["last_ts"] is not None and ts - sig["last_ts"] < debounce:
+                sig["last_ts"] = ts
+                continue
+            sig["last_ts"] = ts
+            sig["fired"] += 1
+            self._open(_label(sig["label"], sig["fired"]), ts)
+
+        cur = self.phases[-1]
+        sid, tid = e.get("sourceID"), e.get("targetID")
+        if et == "damage":
+            amt = (e.get("amount") or 0) + (e.get("absorbed") or 0)
+            if sid in self.players:
+                cur["damage_done"] += amt
+            if tid in self.players:
+                cur["damage_taken"] += amt
+        elif et == "death" and tid in self.players:
+            cur["deaths"] += 1
+
+        if self.track_auras and _ability_id(e) in self.track_auras and "buff" in et:
+            self._aura_events.append(e)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        auras = None
+        if self.track_auras:
+            auras = AuraIntervals.from_events(self._aura_events, self.fight["startTime"], self.fight["endTime"])
+
+        for p in self.phases:
+            p["duration_ms"] = max(0, p["end"] - p["start"])
+            if auras is None:
+                continue
+            p["aura_uptime_ms"] = {}
+            for abid in self.track_auras:
+                m = auras.ability == abid
+                seg_s, seg_e = union_intervals(auras.start[m], auras.end[m])
+                clipped = np.minimum(seg_e, p["end"]) - np.maximum(seg_s, p["start"])
+                p["aura_uptime_ms"][abid] = int(np.clip(clipped, 0, None).sum())
+        return self.phases
+
+
+def segment_phases(events: Iterable[Dict[str, Any]], spec: Dict[str, Any], fight: Dict[str, Any]) -> List[Dict[str, Any]]:
+    tracker = PhaseTracker(spec, fight)
+    for e in events:
+        tracker.add_event(e)
+    return tracker.finish()
+
+
+def fight_phases(
+    headers: Dict[str, str],
+    code: str,
+    fight: Dict[str, Any],
+    spec: Optional[Dict[str, Any]] = None,
+    **iter_kwargs: Any,
+) -> List[Dict[str, Any]]:
+    """
+    Phase timeline + metrics for one pull from a single All-events pass.
+    spec defaults to PHASE_SPECS[fight name].
+    """
+    if spec is None:
+        spec = PHASE_SPECS.get(fight.get("name") or "", {})
+    events = iter_events(headers, code, fight["id"], fight["startTime"], fight["endTime"], "All", **iter_kwargs)
+    return segment_phases(events, spec, fight)
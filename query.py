@@ -0,0 +1,465 @@
+"""
+Ad-hoc event queries over locally stored reports (event store or archive).
+
+    py query.py vFYGaXZgdTk9P6tz "first(type=applydebuff, ability=136577, target=player)" --fight "Iron Qon"
+    py query.py vFYGaXZgdTk9P6tz "sum(amount) where target in Heads group by target window 10s" --fight Megaera
+    py query.py vFYGaXZgdTk9P6tz "count() where type = death and target in players group by target"
+
+Grammar:
+
+    AGG "(" [FIELD | FIELD=VALUE, ...] ")" ["where" COND ("and" COND)*]
+        ["group by" FIELD ("," FIELD)*] ["window" DURATION]
+
+AGG is first, last, count, sum, min or max (the last three over amount).
+FIELD=VALUE inside the parentheses is shorthand for a where condition. COND is
+FIELD (= != < <= > >=) VALUE or FIELD [not] in (NAME | "(" VALUE, ... ")").
+Fields are type, ability, source, target, amount and time (since the pull:
+90s, 1:30, 2m or plain ms). A VALUE is a number, an event type, or a name
+resolved per fight: player(s), enemy/enemies, boss, a tot_npcs table ("Heads",
+"Dogs", "Elders", "MEGAERA_HEADS"), one of its labels ("Ro'Shak") or a player
+name.
+
+Planning: = / in on type, ability, source and target become inverted-index
+lookups (event_index.py), time becomes the row range, and everything else is a
+numpy mask over the matched rows only. Grouping and windows are one np.unique
+plus a bincount, so a query over many stored kills stays interactive.
+"""
+import argparse
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+import tot_npcs
+import wcl
+from archive import Archive
+from event_index import MISSING, FightEventIndex
+from event_store import DEFAULT_DB, EventStore
+
+AGGREGATES = {"first", "last", "count", "sum", "min", "max"}
+# field -> FightEventIndex.rows() keyword
+INDEXED_FIELDS = {"type": "types", "ability": "abilities", "source": "sources", "target": "targets"}
+FIELDS = set(INDEXED_FIELDS) | {"amount", "time"}
+COMPARISONS = {"=", "!=", "<", "<=", ">", ">="}
+
+_TOKEN = re.compile(
+    r"\s*(?:"
+    r"(?P<clock>\d+:\d{2})"
+    r"|(?P<num>-?\d+(?:\.\d+)?)(?P<unit>ms|s|m)?\b"
+    r"|(?P<quoted>\"[^\"]*\"|'[^']*')"
+    r"|(?P<op>!=|>=|<=|=|>|<|\(|\)|,)"
+    r"|(?P<word>[A-Za-z_][\w'-]*)"
+    r")"
+)
+
+# tot_npcs label tables, addressable by full name or by their last word ("Heads")
+NPC_TABLES: Dict[str, Dict[str, Set[int]]] = {
+    name: table for name, table in vars(tot_npcs).items()
+    if name.isupper() and isinstance(table, dict)
+}
+
+Value = Union[int, str]
+
+
+class QueryError(ValueError):
+    pass
+
+
+def _tokenize(text: str) -> List[Tuple[str, Value]]:
+    out: List[Tuple[str, Value]] = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m or m.end() == pos:
+            raise QueryError(f"can't parse query at {text[pos:]!r}")
+        pos = m.end()
+        if m.group("clock"):
+            mins, secs = m.group("clock").split(":")
+            out.append(("num", (int(mins) * 60 + int(secs)) * 1000))
+        elif m.group("num"):
+            scale = {"ms": 1, "s": 1000, "m": 60_000}.get(m.group("unit") or "", 1)
+            out.append(("num", int(round(float(m.group("num")) * scale))))
+        elif m.group("quoted"):
+            out.append(("word", m.group("quoted")[1:-1]))
+        elif m.group("op"):
+            out.append(("op", m.group("op")))
+        else:
+            out.append(("word", m.group("word")))
+    return out
+
+
+class Query:
+    def __init__(self, text: str):
+        self.text = text
+        self.agg = ""
+        self.conditions: List[Tuple[str, str, List[Value]]] = []
+        self.group_by: List[str] = []
+        self.window_ms: Optional[int] = None
+        self._tokens = _tokenize(text)
+        self._i = 0
+        self._parse()
+
+    # -------------------- PARSER --------------------
+
+    def _peek(self) -> Optional[Tuple[str, Value]]:
+        return self._tokens[self._i] if self._i < len(self._tokens) else None
+
+    def _next(self) -> Tuple[str, Value]:
+        tok = self._peek()
+        if tok is None:
+            raise QueryError(f"unexpected end of query: {self.text!r}")
+        self._i += 1
+        return tok
+
+    def _accept(self, value: str) -> bool:
+        tok = self._peek()
+        if tok is not None and isinstance(tok[1], str) and tok[1].lower() == value:
+            self._i += 1
+            return True
+        return False
+
+    def _expect(self, value: str) -> None:
+        if not self._accept(value):
+            raise QueryError(f"expected {value!r} in {self.text!r}")
+
+    def _field(self) -> str:
+        kind, v = self._next()
+        name = str(v).lower()
+        if kind != "word" or name not in FIELDS:
+            raise QueryError(f"unknown field {v!r} (fields: {', '.join(sorted(FIELDS))})")
+        return name
+
+    def _value(self) -> Value:
+        kind, v = self._next()
+        if kind == "op":
+            raise QueryError(f"expected a value, got {v!r}")
+        return v
+
+    def _condition(self) -> None:
+        field = self._field()
+        if self._accept("not"):
+            self._expect("in")
+            op = "not in"
+        elif self._accept("in"):
+            op = "in"
+        else:
+            kind, op_v = self._next()
+            op = str(op_v)
+            if kind != "op" or op not in COMPARISONS:
+                raise QueryError(f"expected a comparison after {field!r}")
+        if op in {"in", "not in"} and self._accept("("):
+            values = [self._value()]
+            while self._accept(","):
+                values.append(self._value())
+            self._expect(")")
+        else:
+            values = [self._value()]
+        self.conditions.append((field, op, values))
+
+    def _parse(self) -> None:
+        kind, agg = self._next()
+        self.agg = str(agg).lower()
+        if kind != "word" or self.agg not in AGGREGATES:
+            raise QueryError(f"query must start with one of {', '.join(sorted(AGGREGATES))}")
+        self._expect("(")
+        if not self._accept(")"):
+            while True:
+                field = self._field()
+                if self._accept("="):
+                    self.conditions.append((field, "=", [self._value()]))
+                elif field != "amount":
+                    raise QueryError(f"{self.agg}() aggregates amount, not {field!r}")
+                if self._accept(")"):
+                    break
+                self._expect(",")
+        if self._accept("where"):
+            self._condition()
+            while self._accept("and"):
+                self._condition()
+        if self._accept("group"):
+            self._expect("by")
+            self.group_by.append(self._field())
+            while self._accept(","):
+                self.group_by.append(self._field())
+            if not set(self.group_by) <= set(INDEXED_FIELDS):
+                raise QueryError("group by type, ability, source or target")
+        if self._accept("window"):
+            kind, w = self._next()
+            if kind != "num" or int(w) <= 0:
+                raise QueryError("window needs a duration, e.g. 10s")
+            self.window_ms = int(w)
+        if self._peek() is not None:
+            raise QueryError(f"unexpected {self._peek()[1]!r} in {self.text!r}")
+
+
+# -------------------- NAME RESOLUTION --------------------
+
+def resolve_actors(value: Value, fight: Dict[str, Any], actors: List[Dict[str, Any]]) -> Set[int]:
+    """
+    Report actor ids in this fight for a number, set name, NPC label or player name.
+    """
+    if isinstance(value, int):
+        return {value}
+    name = value.lower()
+    if name in {"player", "players"}:
+        return wcl.fight_player_ids(fight)
+    if name in {"enemy", "enemies", "npc", "npcs"}:
+        return {n["id"] for n in (fight.get("enemyNPCs") or []) if isinstance(n, dict) and isinstance(n.get("id"), int)}
+    if name == "boss":
+        return tot_npcs.boss_ids_for_fight(fight)
+    for tname, table in NPC_TABLES.items():
+        if name in {tname.lower(), tname.rsplit("_", 1)[-1].lower()}:
+            return set().union(*tot_npcs.resolve_fight_labels(fight, table).values())
+    for table in NPC_TABLES.values():
+        for label, gids in table.items():
+            if label.lower() == name:
+                return tot_npcs.fight_npc_ids(fight, gids)
+    ids = {a["id"] for a in actors if isinstance(a, dict) and str(a.get("name", "")).lower() == name}
+    if ids:
+        return ids
+    raise QueryError(f"unknown actor or set {value!r}")
+
+
+def actor_names(fight: Dict[str, Any], actors: List[Dict[str, Any]]) -> Dict[int, str]:
+    names = {a["id"]: str(a.get("name")) for a in actors if isinstance(a, dict) and isinstance(a.get("id"), int)}
+    by_gid: Dict[int, str] = {}
+    for table in NPC_TABLES.values():
+        for label, gids in table.items():
+            for g in gids:
+                by_gid.setdefault(g, label)
+    for n in fight.get("enemyNPCs") or []:
+        if isinstance(n, dict) and isinstance(n.get("id"), int):
+            names.setdefault(n["id"], by_gid.get(n.get("gameID"), f"npc {n.get('gameID')}"))
+    return names
+
+
+# -------------------- EXECUTION --------------------
+
+def _compare(col: np.ndarray, op: str, values: List[int]) -> np.ndarray:
+    if op in {"in", "not in", "=", "!="}:
+        m = np.isin(col, values)
+        return ~m if op in {"not in", "!="} else m
+    v = values[0]
+    return {"<": col < v, "<=": col <= v, ">": col > v, ">=": col >= v}[op]
+
+
+def plan(
+    q: Query,
+    idx: FightEventIndex,
+    fight: Dict[str, Any],
+    actors: List[Dict[str, Any]],
+) -> Tuple[Dict[str, Any], List[Tuple[str, str, List[int]]]]:
+    """
+    (index predicates for idx.rows(), [(column, op, values)] masks for the rest).
+    """
+    preds: Dict[str, Any] = {"start": fight["startTime"], "end": fight["endTime"]}
+    keys: Dict[str, Set[Any]] = {}
+    masks: List[Tuple[str, str, List[int]]] = []
+    for field, op, values in q.conditions:
+        if field == "time":
+            v = fight["startTime"] + int(values[0])
+            if op in {">", ">="}:
+                preds["start"] = max(preds["start"], v + (op == ">"))
+            elif op in {"<", "<="}:
+                preds["end"] = min(preds["end"], v - (op == "<"))
+            elif op == "=":
+                preds["start"], preds["end"] = max(preds["start"], v), min(preds["end"], v)
+            else:
+                raise QueryError(f"time doesn't support {op!r}")
+            continue
+
+        if field == "type":
+            resolved: List[Any] = [str(v).lower() for v in values]
+        elif field in {"source", "target"} and op in {"=", "!=", "in", "not in"}:
+            resolved = sorted(set().union(*(resolve_actors(v, fight, actors) for v in values)))
+        else:
+            if not all(isinstance(v, int) for v in values):
+                raise QueryError(f"{field} needs numbers, got {values!r}")
+            resolved = list(values)
+
+        if field in INDEXED_FIELDS and op in {"=", "in"}:
+            keys[field] = set(resolved) if field not in keys else keys[field] & set(resolved)
+        elif field == "type":
+            masks.append(("type", op, idx.type_codes(resolved)))
+        else:
+            masks.append((field, op, resolved))
+
+    for field, ks in keys.items():
+        preds[INDEXED_FIELDS[field]] = ks
+    return preds, masks
+
+
+def _rows(q: Query, idx: FightEventIndex, fight: Dict[str, Any], actors: List[Dict[str, Any]]) -> np.ndarray:
+    preds, masks = plan(q, idx, fight, actors)
+    rows = idx.rows(**preds)
+    for field, op, values in masks:
+        if not len(rows):
+            break
+        rows = rows[_compare(getattr(idx, field)[rows], op, values)]
+    return rows
+
+
+def _id(v: Any) -> Optional[int]:
+    return None if int(v) == MISSING else int(v)
+
+
+def _event(idx: FightEventIndex, row: int, fight_start: int) -> Dict[str, Any]:
+    return {
+        "time": int(idx.ts[row]) - fight_start,
+        "timestamp": int(idx.ts[row]),
+        "type": idx.type_names[int(idx.type[row])],
+        "source": _id(idx.source[row]),
+        "target": _id(idx.target[row]),
+        "ability": _id(idx.ability[row]),
+        "amount": int(idx.amount[row]),
+    }
+
+
+def _group_key(idx: FightEventIndex, field: str, v: int) -> Any:
+    return idx.type_names[v] if field == "type" else _id(v)
+
+
+def run_fight(q: Query, idx: FightEventIndex, fight: Dict[str, Any], actors: List[Dict[str, Any]]) -> Any:
+    """
+    first/last: event dict (or {group: event}); count/sum/min/max: a number, a list per
+    window, or {group: number or list}. Group keys are tuples when grouping by several fields.
+    """
+    rows = _rows(q, idx, fight, actors)
+    start = fight["startTime"]
+
+    if q.group_by:
+        cols = np.stack([getattr(idx, f)[rows].astype(np.int64) for f in q.group_by], axis=1)
+        uniq, inverse = np.unique(cols, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        groups = [
+            tuple(_group_key(idx, f, int(v)) for f, v in zip(q.group_by, u)) if len(q.group_by) > 1
+            else _group_key(idx, q.group_by[0], int(u[0]))
+            for u in uniq
+        ]
+    else:
+        inverse = np.zeros(len(rows), dtype=np.int64)
+        groups = [None]
+
+    if q.agg in {"first", "last"}:
+        order = np.arange(len(rows)) if q.agg == "first" else np.arange(len(rows))[::-1]
+        picked = {}
+        _, at = np.unique(inverse[order], return_index=True) if len(rows) else ([], [])
+        for g, i in zip(groups, np.asarray(at, dtype=np.int64)):
+            picked[g] = _event(idx, int(rows[order[i]]), start)
+        return picked if q.group_by else picked.get(None)
+
+    n_buckets = 1
+    bucket = np.zeros(len(rows), dtype=np.int64)
+    if q.window_ms:
+        n_buckets = (fight["endTime"] - start) // q.window_ms + 1
+        bucket = (idx.ts[rows] - start) // q.window_ms
+    slot = inverse * n_buckets + bucket
+    size = len(groups) * n_buckets
+    values = idx.amount[rows]
+
+    if q.agg in {"count", "sum"}:
+        weights = None if q.agg == "count" else values.astype(np.float64)
+        acc = np.bincount(slot, weights=weights, minlength=size).astype(np.int64).tolist()
+    else:
+        fill = np.iinfo(np.int64).max if q.agg == "min" else np.iinfo(np.int64).min
+        arr = np.full(size, fill, dtype=np.int64)
+        (np.minimum if q.agg == "min" else np.maximum).at(arr, slot, values)
+        acc = [None if v == fill else v for v in arr.tolist()]
+
+    per_group = [acc[i * n_buckets:(i + 1) * n_buckets] if q.window_ms else acc[i] for i in range(len(groups))]
+    if not q.group_by:
+        return per_group[0]
+    return dict(zip(groups, per_group))
+
+
+def query(
+    text: Union[str, Query],
+    code: str,
+    fights: Optional[List[Dict[str, Any]]] = None,
+    backend: Any = None,
+) -> List[Tuple[Dict[str, Any], Any]]:
+    """
+    [(fight, result)] for each stored fight (default: every kill in the report).
+    backend defaults to wcl's; it must be a local one (EventStore or Archive).
+    """
+    q = text if isinstance(text, Query) else Query(text)
+    backend = backend if backend is not None else wcl.get_backend()
+    if backend is None or not hasattr(backend, "event_index"):
+        raise QueryError("queries run over locally stored reports; set WCL_EVENT_STORE or pass a backend")
+    _, all_fights, actors = backend.fetch_report(code)
+    if fights is None:
+        fights = [f for f in all_fights if isinstance(f, dict) and f.get("kill") is True]
+    return [(f, run_fight(q, backend.event_index(code, f["id"]), f, actors)) for f in fights]
+
+
+# -------------------- CLI --------------------
+
+def mmss_from_ms(ms: int) -> str:
+    s = ms // 1000
+    m, s = divmod(s, 60)
+    return f"{m}:{s:02d}"
+
+
+def _fmt_key(key: Any, q: Query, names: Dict[int, str]) -> str:
+    parts = key if isinstance(key, tuple) else (key,)
+    return " / ".join(
+        names.get(p, str(p)) if f in {"source", "target"} else str(p)
+        for f, p in zip(q.group_by, parts)
+    )
+
+
+def _fmt_event(e: Optional[Dict[str, Any]], names: Dict[int, str]) -> str:
+    if e is None:
+        return "-"
+    return (f"{mmss_from_ms(e['time'])}  {e['type']}  ability={e['ability']}  "
+            f"{names.get(e['source'], e['source'])} -> {names.get(e['target'], e['target'])}  amount={e['amount']}")
+
+
+def _fmt_value(v: Any, q: Query) -> str:
+    if isinstance(v, list):
+        w = q.window_ms or 1
+        return "  ".join(f"{mmss_from_ms(i * w)}:{x:,}" for i, x in enumerate(v) if x)
+    return "-" if v is None else f"{v:,}"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Ad-hoc queries over a locally stored report.")
+    ap.add_argument("code", help="Warcraft Logs report code")
+    ap.add_argument("query", help='e.g. "first(type=applydebuff, ability=136577, target=player)"')
+    ap.add_argument("--fight", help="Only fights with this name")
+    ap.add_argument("--all-pulls", action="store_true", help="Include wipes (default: kills only)")
+    ap.add_argument("--db", default=DEFAULT_DB, help=f"SQLite event store (default: {DEFAULT_DB})")
+    ap.add_argument("--archive", help="Read a .wcla archive instead of the event store")
+    args = ap.parse_args()
+
+    q = Query(args.query)
+    if args.archive:
+        backend: Any = Archive(args.archive)
+    else:
+        backend = EventStore(args.db)
+    _, fights, actors = backend.fetch_report(args.code)
+    fights = [
+        f for f in fights
+        if isinstance(f, dict)
+        and (args.all_pulls or f.get("kill") is True)
+        and (not args.fight or f.get("name") == args.fight)
+    ]
+
+    for f, res in query(q, args.code, fights, backend=backend):
+        names = actor_names(f, actors)
+        head = f"{f.get('name')}  {mmss_from_ms(f['endTime'] - f['startTime'])}  (fight id {f['id']})"
+        if isinstance(res, dict) and q.group_by:
+            print(head)
+            items = sorted(res.items(), key=lambda kv: str(kv[0])) if q.agg in {"first", "last"} or q.window_ms \
+                else sorted(res.items(), key=lambda kv: -(kv[1] or 0))
+            for key, v in items:
+                shown = _fmt_event(v, names) if q.agg in {"first", "last"} else _fmt_value(v, q)
+                print(f"  {_fmt_key(key, q, names):<24s} {shown}")
+        else:
+            shown = _fmt_event(res, names) if q.agg in {"first", "last"} else _fmt_value(res, q)
+            print(f"{head}: {shown}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Multi-resolution time-bucket rollups (1s / 5s / 30s) for one pull.
+
+Built once from a DamageDone and a Healing stream: per-target and per-source
+sums of damage, absorbed, healing, overheal and event counts land in 1s bucket
+arrays (one row per actor), and the 5s / 30s levels are sums of the finer level.
+A window query is answered by covering it with the coarsest aligned buckets plus
+finer buckets at the edges, so cost depends on the number of buckets touched,
+not on the number of events. Windows snap outward to whole seconds from fight
+start; use DamageIndex when millisecond edges matter.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from wcl import iter_events
+
+RESOLUTIONS_MS: Tuple[int, ...] = (1000, 5000, 30_000)
+
+DAMAGE_METRICS = ("damage", "absorbed", "damage_events")
+HEALING_METRICS = ("healing", "overheal", "healing_events")
+SIDES = ("target", "source")
+
+
+def _int(v: Any) -> int:
+    return v if isinstance(v, int) and v > 0 else 0
+
+
+class Rollups:
+    def __init__(self, fight_start: int, fight_end: int, resolutions: Tuple[int, ...] = RESOLUTIONS_MS):
+        base = resolutions[0]
+        if any(r % base for r in resolutions) or any(b % a for a, b in zip(resolutions, resolutions[1:])):
+            raise ValueError("each resolution must be a multiple of the previous one")
+        self.fight_start = fight_start
+        self.fight_end = fight_end
+        self.resolutions = tuple(resolutions)
+        self.n_base = max(1, -(-(fight_end - fight_start) // base))
+        # actors[side] -> sorted actor ids (row order); buckets[(metric, side)][level] -> (n_actors, n_buckets)
+        self.actors: Dict[str, np.ndarray] = {}
+        self.buckets: Dict[Tuple[str, str], List[np.ndarray]] = {}
+
+    @classmethod
+    def from_events(
+        cls,
+        damage_events: Iterable[Dict[str, Any]],
+        healing_events: Iterable[Dict[str, Any]],
+        fight_start: int,
+        fight_end: int,
+        resolutions: Tuple[int, ...] = RESOLUTIONS_MS,
+    ) -> "Rollups":
+        r = cls(fight_start, fight_end, resolutions)
+        cols: Dict[str, List[int]] = {k: [] for k in ("ts", "source", "target", *DAMAGE_METRICS, *HEALING_METRICS)}
+
+        def push(e: Dict[str, Any], dmg: bool) -> None:
+            ts, sid, tid = e.get("timestamp"), e.get("sourceID"), e.get("targetID")
+            if not (isinstance(ts, int) and isinstance(sid, int) and isinstance(tid, int)):
+                return
+            cols["ts"].append(ts)
+            cols["source"].append(sid)
+            cols["target"].append(tid)
+            cols["damage"].append(_int(e.get("amount")) if dmg else 0)
+            cols["absorbed"].append(_int(e.get("absorbed")) if dmg else 0)
+            cols["damage_events"].append(1 if dmg else 0)
+            cols["healing"].append(0 if dmg else _int(e.get("amount")))
+            cols["overheal"].append(0 if dmg else _int(e.get("overheal")))
+            cols["healing_events"].append(0 if dmg else 1)
+
+        for e in damage_events:
+            if (e.get("type") or "").lower() == "damage":
+                push(e, True)
+        for e in healing_events:
+            if (e.get("type") or "").lower() in {"heal", "absorbed"}:
+                push(e, False)
+
+        r._build({k: np.asarray(v, dtype=np.int64) for k, v in cols.items()})
+        return r
+
+    def _build(self, cols: Dict[str, np.ndarray]) -> None:
+        base = self.resolutions[0]
+        nb = self.n_base
+        bucket = np.clip((cols["ts"] - self.fight_start) // base, 0, nb - 1)
+
+        for side in SIDES:
+            uniq, row = np.unique(cols[side], return_inverse=True)
+            self.actors[side] = uniq
+            flat = row * nb + bucket
+            size = len(uniq) * nb
+            for metric in DAMAGE_METRICS + HEALING_METRICS:
+                fine = np.bincount(flat, weights=cols[metric], minlength=size).astype(np.int64).reshape(len(uniq), nb)
+                levels = [fine]
+                for prev_res, res in zip(self.resolutions, self.resolutions[1:]):
+                    f = res // prev_res
+                    prev = levels[-1]
+                    pad = (-prev.shape[1]) % f
+                    if pad:
+                        prev = np.pad(prev, ((0, 0), (0, pad)))
+                    levels.append(prev.reshape(len(uniq), -1, f).sum(axis=2))
+                self.buckets[(metric, side)] = levels
+
+    # -------------------- QUERIES --------------------
+
+    def _cover(self, lo: int, hi: int, level: int) -> List[Tuple[int, int, int]]:
+        """
+        [(level, first_bucket, end_bucket), ...] covering base buckets [lo, hi),
+        using the coarsest aligned buckets available at or below level.
+        """
+        if lo >= hi:
+            return []
+        if level == 0:
+            return [(0, lo, hi)]
+        f = self.resolutions[level] // self.resolutions[0]
+        a, b = -(-lo // f), hi // f
+        if a >= b:
+            return self._cover(lo, hi, level - 1)
+        return self._cover(lo, a * f, level - 1) + [(level, a, b)] + self._cover(b * f, hi, level - 1)
+
+    def window(
+        self, metric: str, side: str, start: int, end: int, actor_ids: Optional[Iterable[int]] = None
+    ) -> Dict[int, int]:
+        """
+        {actor_id: total} for metric over [start, end] (snapped out to base buckets), actors with 0 omitted.
+        """
+        base = self.resolutions[0]
+        lo = max(0, (start - self.fight_start) // base)
+        hi = min(self.n_base, (end - self.fight_start) // base + 1)
+        levels = self.buckets.get((metric, side))
+        actors = self.actors.get(side)
+        if levels is None or actors is None or len(actors) == 0:
+            return {}
+
+        total = np.zeros(len(actors), dtype=np.int64)
+        for level, a, b in self._cover(lo, hi, len(self.resolutions) - 1):
+            total += levels[level][:, a:b].sum(axis=1)
+
+        if actor_ids is not None:
+            keep = np.isin(actors, np.fromiter(actor_ids, dtype=np.int64))
+        else:
+            keep = np.ones(len(actors), dtype=bool)
+        keep &= total != 0
+        return {int(k): int(v) for k, v in zip(actors[keep], total[keep])}
+
+    def damage_by_target(
+        self, target_ids: Iterable[int], start: int, end: int, include_absorbed: bool = False
+    ) -> Dict[int, int]:
+        """
+        Same shape as DamageIndex.damage_by_target, at bucket precision.
+        """
+        ids = list(target_ids)
+        out = self.window("damage", "target", start, end, ids)
+        if include_absorbed:
+            for tid, v in self.window("absorbed", "target", start, end, ids).items():
+                out[tid] = out.get(tid, 0) + v
+        return out
+
+    def top(
+        self, metric: str, side: str, start: int, end: int, n: int = 10, actor_ids: Optional[Iterable[int]] = None
+    ) -> List[Tuple[int, int]]:
+        return sorted(self.window(metric, side, start, end, actor_ids).items(), key=lambda kv: -kv[1])[:n]
+
+    def timeline(
+        self, metric: str, side: str, actor_ids: Optional[Iterable[int]] = None, resolution_ms: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (bucket start timestamps, values) at resolution_ms (default coarsest), summed over actor_ids
+        (all actors if None). This is the downsampled series for charts.
+        """
+        res = self.resolutions[-1] if resolution_ms is None else resolution_ms
+        level = self.resolutions.index(res)
+        arr = self.buckets[(metric, side)][level]
+        if actor_ids is not None:
+            arr = arr[np.isin(self.actors[side], np.fromiter(actor_ids, dtype=np.int64))]
+        values = arr.sum(axis=0)
+        return self.fight_start + np.arange(len(values), dtype=np.int64) * res, values
+
+
+def kill_rollups(headers: Dict[str, str], code: str, fight: Dict[str, Any], **iter_kwargs: Any) -> Rollups:
+    start, end, fight_id = fight["startTime"], fight["endTime"], fight["id"]
+    return Rollups.from_events(
+        iter_events(headers, code, fight_id, start, end, "DamageDone", **iter_kwargs),
+        iter_events(headers, code, fight_id, start, end, "Healing", **iter_kwargs),
+        start,
+        end,
+    )
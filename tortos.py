@@ -1,28 +1,9 @@
-import os
-import requests
-from collections import Counter
-from typing import Any, Dict, Iterable, List, Optional, Tuple
-
-REPORT_CODE = "vFYGaXZgdTk9P6tz"
-CLIENT_ID = os.getenv("WCL_CLIENT_ID", "")
-CLIENT_SECRET = os.getenv("WCL_CLIENT_SECRET", "")
-
-API_URL = "https://classic.warcraftlogs.com/api/v2/client"
-TOKEN_URL = "https://classic.warcraftlogs.com/oauth/token"
-
-TORTOS_FIGHT_NAME = "Tortos"
-SHELL_NAME = "Shell Concussion"
-
-AURA_TYPES = {
-    "applydebuff", "applydebuffstack", "refreshdebuff", "refreshdebuffstack", "removedebuff",
-    "applybuff", "applybuffstack", "refreshbuff", "refreshbuffstack", "removebuff",
-}
 #!/usr/bin/env python3
 """
 Tortos – Shell Concussion uptime/applications from a Warcraft Logs Classic report.
 
 Fixes vs your current version:
-- Uses translate: true so ability names populate reliably
+- Requests bare ability IDs; names come from the shared ability dictionary (abilities.py) when printed
 - Defaults to dataType=Debuffs (still works with All, but Debuffs is cleaner)
 - Robust ability extraction (name + id + guid fallbacks)
 - If Shell Concussion still shows 0, prints a small SANITY sample of debuff/aura events on Tortos
@@ -40,16 +21,31 @@ Optional overrides:
 """
 
 import os
-import requests
 from collections import Counter
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from abilities import ability_names
+from ability_catalog import AbilityCatalog, load_catalogs, save_catalogs
+from aggregators import SHARDS, Count, Group, IntervalUnion, TopK, run, run_fight
+from aura_engine import AURA_EVENT_KINDS, union_intervals
+from dag import Dag
+from event_index import indexed_events
+from event_store import DEBUFF_TYPES
+from memo import cached, report as memo_report, store
+from tot_npcs import BOSS_GAME_IDS, fight_npc_ids
+from warehouse import record
+from wcl import fetch_report, get_token
+from wcl import iter_events as _iter_events
 
 # ---- Config (defaults can be overridden by env vars) ----
 REPORT_CODE = os.getenv("WCL_REPORT_CODE", "vFYGaXZgdTk9P6tz")
+CLIENT_ID = os.getenv("WCL_CLIENT_ID", "")
+CLIENT_SECRET = os.getenv("WCL_CLIENT_SECRET", "")
 SHELL_ABILITY_ID = 136431
-
-API_URL = "https://classic.warcraftlogs.com/api/v2/client"
-TOKEN_URL = "https://classic.warcraftlogs.com/oauth/token"
+ANALYZER_VERSION = 1
+MEMO_SPEC = {"source": __file__, "config": {"version": ANALYZER_VERSION}, "streams": ["Debuffs"]}
 
 TORTOS_FIGHT_NAME = os.getenv("WCL_FIGHT_NAME", "Tortos")
 SHELL_NAME = os.getenv("WCL_AURA_NAME", "Shell Concussion")
@@ -70,33 +66,6 @@ AURA_TYPES = {
 }
 
 
-def get_token(client_id: str, client_secret: str) -> str:
-    if not client_id or not client_secret:
-        raise SystemExit(
-            "Missing WCL_CLIENT_ID / WCL_CLIENT_SECRET environment variables.\n"
-            "PowerShell example:\n"
-            '  $env:WCL_CLIENT_ID="..."\n'
-            '  $env:WCL_CLIENT_SECRET="..."\n'
-        )
-    r = requests.post(
-        TOKEN_URL,
-        data={"grant_type": "client_credentials"},
-        auth=(client_id, client_secret),
-        timeout=30,
-    )
-    r.raise_for_status()
-    return r.json()["access_token"]
-
-
-def gql(headers: Dict[str, str], query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
-    r = requests.post(API_URL, json={"query": query, "variables": variables}, headers=headers, timeout=30)
-    r.raise_for_status()
-    payload = r.json()
-    if payload.get("errors"):
-        raise RuntimeError(payload["errors"])
-    return payload["data"]
-
-
 def mmss_from_ms(ms: int) -> str:
     s = ms // 1000
     m, s = divmod(s, 60)
@@ -106,10 +75,6 @@ def mmss_since_pull(ts: int, pull_start: int) -> str:
     return mmss_from_ms(ts - pull_start)
 
 
-def _norm(s: str) -> str:
-    return (s or "").lower().replace("’", "'")
-
-
 def iter_events(
     headers: Dict[str, str],
     code: str,
@@ -120,104 +85,14 @@ def iter_events(
     hostility_type: str = "Enemies",
 ) -> Iterable[Dict[str, Any]]:
     """
-    Correct paging:
-      - startTime is ONLY the paging cursor
-      - endTime is fixed (fight_end)
     IMPORTANT:
-      - translate: true makes ability names reliable
       - hostilityType Enemies is required to see boss auras consistently
+      - no translate: names are looked up via abilities.ability_names() only for what gets printed
     """
-    query = """
-    query(
-      $code: String!,
-      $fightID: Int!,
-      $pageStart: Float!,
-      $end: Float!,
-      $hostility: HostilityType!,
-      $dt: EventDataType!
-    ) {
-      reportData {
-        report(code: $code) {
-          events(
-            fightIDs: [$fightID]
-            startTime: $pageStart
-            endTime: $end
-            dataType: $dt
-            hostilityType: $hostility
-            translate: true
-            limit: 5000
-          ) {
-            data
-            nextPageTimestamp
-          }
-        }
-      }
-    }
-    """
-
-    page_start = fight_start
-    while True:
-        data = gql(
-            headers,
-            query,
-            {
-                "code": code,
-                "fightID": fight_id,
-                "pageStart": page_start,
-                "end": fight_end,
-                "hostility": hostility_type,
-                "dt": data_type,
-            },
-        )
-        ev = data["reportData"]["report"]["events"]
-        for e in ev.get("data") or []:
-            if isinstance(e, dict):
-                yield e
-        nxt = ev.get("nextPageTimestamp")
-        if not nxt:
-            break
-        page_start = nxt
-
-
-def fetch_report(headers: Dict[str, str], code: str):
-    query = """
-    query($code: String!) {
-      reportData {
-        report(code: $code) {
-          title
-          fights { id name kill startTime endTime }
-          masterData { actors { id name type subType } }
-        }
-      }
-    }
-    """
-    data = gql(headers, query, {"code": code})
-    rep = data["reportData"]["report"]
-    return rep["title"], (rep["fights"] or []), (rep["masterData"]["actors"] or [])
-
-
-def find_actor_ids_fuzzy(actors: List[Dict[str, Any]], required_substrings: List[str]) -> List[Dict[str, Any]]:
-    req = [_norm(x) for x in required_substrings]
-    hits: List[Dict[str, Any]] = []
-    for a in actors:
-        if not isinstance(a, dict):
-            continue
-        name = a.get("name")
-        if not isinstance(name, str):
-            continue
-        n = _norm(name)
-        if all(r in n for r in req):
-            hits.append(a)
-
-    def score(a: Dict[str, Any]) -> Tuple[int, int]:
-        t = _norm(str(a.get("type") or ""))
-        st = _norm(str(a.get("subType") or ""))
-        is_player = (t == "player") or (st == "player")
-        # Prefer non-player (boss/NPC) and shorter exact-looking names
-        return (1 if is_player else 0, len(_norm(a.get("name") or "")))
-
-    hits.sort(key=score)
-    return hits
+    return _iter_events(
+        headers, code, fight_id, fight_start, fight_end, data_type,
+        hostility_type=hostility_type,
+    )
 
 
 def get_ability(e: Dict[str, Any]) -> Tuple[Optional[str], Optional[int]]:
@@ -269,119 +144,104 @@ def get_target_id(e: Dict[str, Any]) -> Optional[int]:
     return None
 
 
-def shell_stats_from_all_enemies(
-    headers: Dict[str, str],
-    code: str,
-    fight: Dict[str, Any],
-    tortos_ids: List[int],
-) -> Tuple[int, int, float, int, List[int]]:
-    fight_id = fight["id"]
-    start = fight["startTime"]
-    end = fight["endTime"]
-    fight_len = end - start
-
-    tortos_set = set(tortos_ids)
-    rows: List[Tuple[int, str]] = []
-
-    # Use Debuffs by default; Shell Concussion is a debuff.
-    for e in iter_events(headers, code, fight_id, start, end, data_type="Debuffs", hostility_type="Enemies"):
-        et = (e.get("type") or "").lower()
-        if et not in AURA_TYPES:
-            continue
-
-        tid = get_target_id(e)
-        ts = e.get("timestamp")
-        if not isinstance(tid, int) or tid not in tortos_set:
-            continue
-        if not isinstance(ts, int):
-            continue
-
-        ab_id = get_ability_id(e)
-
-        if ab_id != SHELL_ABILITY_ID:
-            continue
-
-        rows.append((ts, et))
-
-    rows.sort(key=lambda x: x[0])
-
-    active = False
-    active_start: Optional[int] = None
-    uptime_ms = 0
-    applications = 0
-    application_times: List[int] = []
-
-    def is_apply(t: str) -> bool:
-        return t in {"applydebuff", "applydebuffstack", "applybuff", "applybuffstack"}
+class ShellStats(Group):
+    """
+    Shell Concussion on Tortos as mergeable aggregators: per-target on/off intervals
+    (IntervalUnion, which settles an aura left up across a shard boundary on merge)
+    and a Count of matching aura events. finalize() unions the targets' intervals, so
+    overlaps count once, and returns
+    (applications, uptime_ms, uptime_pct, matched events, application timestamps).
+    """
 
-    def is_refresh(t: str) -> bool:
-        return t in {"refreshdebuff", "refreshdebuffstack", "refreshbuff", "refreshbuffstack"}
+    def __init__(self, fight: Dict[str, Any], tortos_ids: Set[int]):
+        self.fight = fight
+        self.tortos_ids = set(tortos_ids)
+        super().__init__(
+            intervals=IntervalUnion(lambda e: get_target_id(e) if self._on_tortos(e) else None, fight["endTime"]),
+            matched=Count(lambda e: (
+                (e.get("type") or "").lower() in AURA_EVENT_KINDS
+                and isinstance(e.get("timestamp"), int)
+                and self._on_tortos(e)
+            )),
+        )
 
-    def is_remove(t: str) -> bool:
-        return t in {"removedebuff", "removebuff"}
+    def _on_tortos(self, e: Dict[str, Any]) -> bool:
+        return get_ability_id(e) == SHELL_ABILITY_ID and get_target_id(e) in self.tortos_ids
 
-    for ts, et in rows:
-        if is_apply(et):
-            if not active:
-                applications += 1
-                application_times.append(ts)
-                active = True
-                active_start = ts
-        elif is_refresh(et):
-            if not active:
-                applications += 1
-                application_times.append(ts)
-                active = True
-                active_start = ts
-        elif is_remove(et):
-            if active and active_start is not None:
-                uptime_ms += max(0, ts - active_start)
-            active = False
-            active_start = None
+    def finalize(self, state: Dict[str, Any]) -> Tuple[int, int, float, int, List[int]]:
+        out = super().finalize(state)
+        segs = [seg for segs in out["intervals"].values() for seg in segs]
+        seg_s, seg_e = union_intervals(
+            np.asarray([s for s, _ in segs], dtype=np.int64),
+            np.asarray([e for _, e in segs], dtype=np.int64),
+        )
+        uptime_ms = int((seg_e - seg_s).sum())
+        fight_len = self.fight["endTime"] - self.fight["startTime"]
+        uptime_pct = (uptime_ms / fight_len * 100.0) if fight_len > 0 else 0.0
+        return len(seg_s), uptime_ms, uptime_pct, out["matched"], [int(t) for t in seg_s]
 
-    if active and active_start is not None:
-        uptime_ms += max(0, end - active_start)
 
-    uptime_pct = (uptime_ms / fight_len * 100.0) if fight_len > 0 else 0.0
-    return applications, uptime_ms, uptime_pct, len(rows), application_times
+def shell_stats_from_all_enemies(
+    headers: Dict[str, str],
+    code: str,
+    fight: Dict[str, Any],
+    tortos_ids: Set[int],
+    catalog: Optional[AbilityCatalog] = None,
+    shards: int = SHARDS,
+) -> Tuple[int, int, float, int, List[int]]:
+    """
+    ShellStats over the pull's Enemies/Debuffs stream. With catalog, one sequential pass
+    also fills it; a stored report reads only Shell Concussion rows on Tortos; otherwise
+    the stream is fetched as `shards` parallel time shards.
+    """
+    agg = ShellStats(fight, tortos_ids)
+    if catalog is not None:
+        return run(agg, catalog.tap(iter_events(headers, code, fight["id"], fight["startTime"], fight["endTime"])))
+    hits = indexed_events(
+        code, fight["id"], types=DEBUFF_TYPES, abilities=[SHELL_ABILITY_ID], targets=tortos_ids,
+        start=fight["startTime"], end=fight["endTime"],
+    )
+    if hits is not None:
+        return run(agg, hits)
+    return run_fight(agg, headers, code, fight, "Debuffs", shards=shards, workers=shards, hostility_type="Enemies")
 
 
 def discover_auras_on_tortos_enemies(
     headers: Dict[str, str],
     code: str,
     fight: Dict[str, Any],
-    tortos_ids: List[int],
+    tortos_ids: Set[int],
     top_n: int = 30,
+    catalog: Optional[AbilityCatalog] = None,
+    shards: int = SHARDS,
 ) -> List[Tuple[str, int]]:
-    fight_id = fight["id"]
-    start = fight["startTime"]
-    end = fight["endTime"]
-    tortos_set = set(tortos_ids)
-
-    c: Counter[str] = Counter()
-
-    for e in iter_events(headers, code, fight_id, start, end, data_type="Debuffs", hostility_type="Enemies"):
-        et = (e.get("type") or "").lower()
-        if et not in AURA_TYPES:
-            continue
-
-        tid = get_target_id(e)
-        if not isinstance(tid, int) or tid not in tortos_set:
-            continue
-
-        ab_name, ab_id = get_ability(e)
-        name = ab_name or "<?>"
-        key = f"{name} (id={ab_id})"
-        c[key] += 1
+    """
+    Most frequent aura abilities on Tortos: from the catalog when there is one, else a
+    TopK over the Enemies/Debuffs stream (sharded like shell_stats_from_all_enemies).
+    """
+    if catalog is not None:
+        counts: Counter[int] = Counter(catalog.counts_on_targets(tortos_ids, AURA_TYPES))
+        tops = counts.most_common(top_n)
+        known = catalog.names
+    else:
+        wanted = set(tortos_ids)
+        top = TopK(
+            lambda e: get_ability_id(e)
+            if (e.get("type") or "").lower() in AURA_TYPES and get_target_id(e) in wanted else None,
+            top_n,
+        )
+        tops = run_fight(top, headers, code, fight, "Debuffs", shards=shards, workers=shards, hostility_type="Enemies")
+        known = {}
 
-    return c.most_common(top_n)
+    names = ability_names(headers, [ab_id for ab_id, _ in tops if not known.get(ab_id)], code)
+    return [(f"{known.get(ab_id) or names.get(ab_id) or '<?>'} (id={ab_id})", n) for ab_id, n in tops]
 
 
 def sanity_print_some_tortos_auras(
     headers: Dict[str, str],
     code: str,
     fight: Dict[str, Any],
-    tortos_ids: List[int],
+    tortos_ids: Set[int],
     limit: int = 12,
 ) -> None:
     """
@@ -404,6 +264,8 @@ def sanity_print_some_tortos_auras(
             continue
 
         ab_name, ab_id = get_ability(e)
+        if ab_name is None and ab_id is not None:
+            ab_name = ability_names(headers, [ab_id], code).get(ab_id)
         ts = e.get("timestamp")
         print(f"  SANITY: {et:<18s} ts={ts}  ability={ab_name!r} id={ab_id}")
         shown += 1
@@ -436,6 +298,40 @@ def get_ability_id(e: Dict[str, Any]) -> Optional[int]:
     return None
 
 
+def kill_stats(
+    headers: Dict[str, str],
+    code: str,
+    fight: Dict[str, Any],
+    shards: int = SHARDS,
+) -> Optional[Tuple[int, int, float, int, List[int]]]:
+    """
+    shell_stats_from_all_enemies() through the memo; None when Tortos isn't among the enemies.
+    main() does the same with the pull's ability catalog.
+    """
+    tortos_ids = fight_npc_ids(fight, BOSS_GAME_IDS[TORTOS_FIGHT_NAME])
+    if not tortos_ids:
+        return None
+    hit, stats = cached(code, fight, "tortos", **MEMO_SPEC)
+    if hit:
+        return stats
+    return store(code, fight, "tortos", shell_stats_from_all_enemies(headers, code, fight, tortos_ids, shards=shards), **MEMO_SPEC)
+
+
+def add_kill_steps(dag: Dag, headers: Dict[str, str], code: str, fight: Dict[str, Any]) -> str:
+    """
+    Registers this kill on overall.py's DAG; returns the step holding kill_stats().
+    Unsharded: the DAG's workers already bound how many streams run at once.
+    """
+    return dag.add(f"{fight['id']}:tortos", lambda: kill_stats(headers, code, fight, shards=1))
+
+
+def kill_summary(stats: Optional[Tuple[int, int, float, int, List[int]]], fight: Dict[str, Any]) -> str:
+    if not stats or not stats[3]:
+        return "-"
+    applies, uptime_ms, uptime_pct, _, _ = stats
+    return f"{SHELL_NAME} x{applies}, uptime {mmss_from_ms(uptime_ms)} ({uptime_pct:.1f}%)"
+
+
 def main():
     token = get_token(CLIENT_ID, CLIENT_SECRET)
     headers = {"Authorization": f"Bearer {token}"}
@@ -451,20 +347,6 @@ def main():
         print(f"No '{TORTOS_FIGHT_NAME}' kills found.")
         return
 
-    tortos_hits = find_actor_ids_fuzzy(actors, ["tortos"])
-    tortos_ids = [h["id"] for h in tortos_hits if isinstance(h.get("id"), int)]
-
-    # print("Matched Tortos actor IDs (fuzzy):")
-    # if tortos_hits:
-    #     print("  " + ", ".join(f"{h.get('name')}#{h.get('id')}" for h in tortos_hits[:8]))
-    # else:
-    #     print("  (none)")
-    # print()
-
-    if not tortos_ids:
-        print("Could not find any Tortos actor IDs from masterData.actors.")
-        return
-
     print("Tortos — Shell Concussion stats (KILLS ONLY)")
     print("--------------------------------------------")
     # if SHELL_ABILITY_IDS is not None:
@@ -472,11 +354,41 @@ def main():
     # else:
     #     print(f"(Matching by ability ID: {SHELL_ABILITY_ID}  [{SHELL_NAME}])")
 
+    catalogs = load_catalogs(REPORT_CODE, tortos_kills)
+    fresh: Dict[int, AbilityCatalog] = {}
+
     for f in tortos_kills:
         dur = mmss_from_ms(f["endTime"] - f["startTime"])
-        applies, uptime_ms, uptime_pct, matched, app_times = shell_stats_from_all_enemies(headers, REPORT_CODE, f, tortos_ids)
+        tortos_ids = fight_npc_ids(f, BOSS_GAME_IDS[TORTOS_FIGHT_NAME])
+        if not tortos_ids:
+            print(f"\nKill duration: {dur}   (fight id {f.get('id')})")
+            print("  Could not find Tortos among this fight's enemyNPCs.")
+            continue
+
+        catalog = catalogs.get(f["id"])
+        if catalog is not None and not catalog.present(SHELL_ABILITY_ID, AURA_TYPES, target_side="enemy"):
+            print(f"\nKill duration: {dur}   (fight id {f.get('id')})")
+            print("  Shell Concussion never seen on enemies in this pull (ability catalog); skipped.")
+            continue
+        hit, stats = cached(REPORT_CODE, f, "tortos", **MEMO_SPEC)
+        if not hit:
+            new_catalog = None
+            if catalog is None:
+                # no catalog yet: one unsharded pass fills it along the way
+                catalog = new_catalog = fresh[f["id"]] = AbilityCatalog(f)
+            stats = store(REPORT_CODE, f, "tortos", shell_stats_from_all_enemies(
+                headers, REPORT_CODE, f, tortos_ids, catalog=new_catalog
+            ), **MEMO_SPEC)
+        applies, uptime_ms, uptime_pct, matched, app_times = stats
 
         print(f"\nKill duration: {dur}   (fight id {f.get('id')})")
+        record(REPORT_CODE, f, "tortos", ANALYZER_VERSION, {
+            "duration_ms": f["endTime"] - f["startTime"],
+            "shell_applications": applies,
+            "shell_uptime_ms": uptime_ms,
+            "shell_uptime_pct": uptime_pct,
+            "shell_application_ms": [t - f["startTime"] for t in app_times],
+        })
 
         if matched == 0:
             print(f"  Found 0 matching aura events on Tortos (Enemies/Debuffs stream).")
@@ -484,7 +396,7 @@ def main():
             sanity_print_some_tortos_auras(headers, REPORT_CODE, f, tortos_ids, limit=12)
 
             print("\n  Top aura names applied to Tortos (Enemies/Debuffs stream):")
-            tops = discover_auras_on_tortos_enemies(headers, REPORT_CODE, f, tortos_ids, top_n=25)
+            tops = discover_auras_on_tortos_enemies(headers, REPORT_CODE, f, tortos_ids, top_n=25, catalog=catalog)
             if not tops:
                 print("    (none)")
             else:
@@ -498,6 +410,12 @@ def main():
         print(f"  Uptime      : {mmss_from_ms(uptime_ms)} ({uptime_pct:.1f}%)")
         # print(f"  Matched aura events: {matched}")
 
+    if fresh:
+        save_catalogs(REPORT_CODE, fresh)
+    summary = memo_report()
+    if summary:
+        print("\n" + summary)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,67 @@
+"""
+Throne of Thunder NPC gameIDs and fight-scoped actor resolution.
+
+Actor ids in a report are per-report, but NPC gameIDs are fixed, so we resolve
+labels against each fight's enemyNPCs instead of fuzzy-matching names across the
+whole report (which picks up adds, pets and players with similar names).
+"""
+from typing import Any, Dict, Iterable, Set
+
+# Primary boss NPCs, keyed by fight name as it appears in WCL.
+BOSS_GAME_IDS: Dict[str, Set[int]] = {
+    "Jin'rokh the Breaker": {69465},
+    "Horridon": {68476},
+    "Council of Elders": {69131, 69132, 69134, 69078},
+    "Tortos": {67977},
+    "Megaera": {68065},
+    "Ji-Kun": {69712},
+    "Durumu the Forgotten": {68036},
+    "Primordius": {69017},
+    "Dark Animus": {69427},
+    "Iron Qon": {68078},
+    "Twin Consorts": {68904, 68905},
+    "Lei Shen": {68397},
+    "Ra-den": {69473},
+}
+
+COUNCIL_ELDERS: Dict[str, Set[int]] = {
+    "Malakk": {69131},
+    "Mar'li": {69132},
+    "Kazra'jin": {69134},
+    "Sul": {69078},
+}
+
+MEGAERA_HEADS: Dict[str, Set[int]] = {
+    "Flaming": {70212},
+    "Frozen": {70235},
+    "Arcane": {70248},
+    "Venomous": {70247},
+}
+
+IRON_QON_DOGS: Dict[str, Set[int]] = {
+    "Ro'Shak": {68079},
+    "Quet'Zal": {68080},
+    "Dam'Ren": {68081},
+}
+
+
+def fight_npc_ids(fight: Dict[str, Any], game_ids: Iterable[int]) -> Set[int]:
+    """
+    Report actor ids of this fight's enemy NPCs whose gameID is in game_ids.
+    """
+    wanted = set(game_ids)
+    return {
+        npc["id"]
+        for npc in (fight.get("enemyNPCs") or [])
+        if isinstance(npc, dict)
+        and isinstance(npc.get("id"), int)
+        and npc.get("gameID") in wanted
+    }
+
+
+def resolve_fight_labels(fight: Dict[str, Any], label_game_ids: Dict[str, Set[int]]) -> Dict[str, Set[int]]:
+    return {label: fight_npc_ids(fight, gids) for label, gids in label_game_ids.items()}
+
+
+def boss_ids_for_fight(fight: Dict[str, Any]) -> Set[int]:
+    return fight_npc_ids(fight, BOSS_GAME_IDS.get(fight.get("name") or "", set()))
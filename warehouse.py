@@ -0,0 +1,229 @@
+"""
+Local results warehouse: every analyzer's per-kill numbers, kept across runs.
+
+    py warehouse.py list
+    py warehouse.py trend megaera head_death_ms --label Flaming
+    py warehouse.py trend tortos shell_uptime_pct
+
+The per-boss scripts call record() after each kill with a flat metrics dict; the
+values are upserted into a long (code, fight, analyzer, version, metric, label,
+n) -> value table in SQLite, so trends across hundreds of kills read one small
+indexed table instead of re-running the API-heavy scripts. Times are ms since
+the pull (metrics named *_ms). Bumping an analyzer's version keeps the old rows;
+trends read the newest version unless asked otherwise.
+
+Set WCL_WAREHOUSE to choose the file (default wcl_results.sqlite); set it to an
+empty string to turn recording off.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+DEFAULT_WAREHOUSE = os.getenv("WCL_WAREHOUSE", "wcl_results.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fights (
+    code TEXT NOT NULL,
+    fight INTEGER NOT NULL,
+    analyzer TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    boss TEXT,
+    pull_start INTEGER,
+    duration_ms INTEGER,
+    recorded_at REAL,
+    data TEXT,
+    PRIMARY KEY (code, fight, analyzer, version)
+);
+CREATE TABLE IF NOT EXISTS reports (
+    code TEXT PRIMARY KEY,
+    first_recorded_at REAL
+);
+CREATE TABLE IF NOT EXISTS results (
+    code TEXT NOT NULL,
+    fight INTEGER NOT NULL,
+    analyzer TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    label TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (code, fight, analyzer, version, metric, label, n)
+);
+CREATE INDEX IF NOT EXISTS results_metric ON results (analyzer, metric, version);
+"""
+
+Number = Union[int, float]
+
+
+def flatten(metrics: Dict[str, Any]) -> List[Tuple[str, str, int, Number]]:
+    """
+    {metric: number | [number] | {label: number | [number]}} -> [(metric, label, n, value)].
+    None values are skipped.
+    """
+    out: List[Tuple[str, str, int, Number]] = []
+
+    def put(metric: str, label: str, v: Any) -> None:
+        vals = v if isinstance(v, (list, tuple)) else [v]
+        for n, x in enumerate(vals):
+            if isinstance(x, bool):
+                x = int(x)
+            if isinstance(x, (int, float)):
+                out.append((metric, label, n, x))
+
+    for metric, v in metrics.items():
+        if isinstance(v, dict):
+            for label, lv in v.items():
+                put(metric, str(label), lv)
+        else:
+            put(metric, "", v)
+    return out
+
+
+class Warehouse:
+    def __init__(self, path: str = DEFAULT_WAREHOUSE):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def record(
+        self,
+        code: str,
+        fight: Dict[str, Any],
+        analyzer: str,
+        version: int,
+        metrics: Dict[str, Any],
+    ) -> int:
+        """
+        Replaces this (report, fight, analyzer, version)'s results. Returns rows written.
+        """
+        key = (code, fight["id"], analyzer, version)
+        rows = flatten(metrics)
+        now = time.time()
+        cur = self.db.cursor()
+        cur.execute("INSERT OR IGNORE INTO reports VALUES (?, ?)", (code, now))
+        cur.execute("DELETE FROM results WHERE code = ? AND fight = ? AND analyzer = ? AND version = ?", key)
+        cur.execute(
+            "INSERT OR REPLACE INTO fights VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            key + (fight.get("name"), fight.get("startTime"), fight["endTime"] - fight["startTime"], now,
+                   json.dumps(metrics, sort_keys=True, default=str)),
+        )
+        cur.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [key + r for r in rows])
+        self.db.commit()
+        return len(rows)
+
+    def latest_version(self, analyzer: str) -> Optional[int]:
+        row = self.db.execute("SELECT MAX(version) FROM fights WHERE analyzer = ?", (analyzer,)).fetchone()
+        return row[0] if row else None
+
+    def trend(
+        self,
+        analyzer: str,
+        metric: str,
+        label: Optional[str] = None,
+        boss: Optional[str] = None,
+        version: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        [{"code", "fight", "boss", "label", "n", "value", "duration_ms"}], oldest report first
+        (by when it was first recorded), then by pull.
+        """
+        version = self.latest_version(analyzer) if version is None else version
+        sql = (
+            "SELECT r.code, r.fight, f.boss, r.label, r.n, r.value, f.duration_ms "
+            "FROM results r JOIN fights f USING (code, fight, analyzer, version) "
+            "JOIN reports p ON p.code = r.code "
+            "WHERE r.analyzer = ? AND r.version = ? AND r.metric = ?"
+        )
+        args: List[Any] = [analyzer, version, metric]
+        if label is not None:
+            sql += " AND r.label = ?"
+            args.append(label)
+        if boss is not None:
+            sql += " AND f.boss = ?"
+            args.append(boss)
+        sql += " ORDER BY p.first_recorded_at, f.pull_start, r.label, r.n"
+        cols = ("code", "fight", "boss", "label", "n", "value", "duration_ms")
+        return [dict(zip(cols, row)) for row in self.db.execute(sql, args)]
+
+    def metrics(self) -> List[Tuple[str, int, str, int]]:
+        """
+        [(analyzer, version, metric, kills with a value)].
+        """
+        return self.db.execute(
+            "SELECT analyzer, version, metric, COUNT(DISTINCT code || ':' || fight) FROM results "
+            "GROUP BY analyzer, version, metric ORDER BY analyzer, version, metric"
+        ).fetchall()
+
+
+_WAREHOUSE: Optional[Warehouse] = None
+
+
+def record(code: str, fight: Dict[str, Any], analyzer: str, version: int, metrics: Dict[str, Any]) -> None:
+    """
+    Upsert into the default warehouse; no-op when WCL_WAREHOUSE is empty.
+    """
+    global _WAREHOUSE
+    if not DEFAULT_WAREHOUSE:
+        return
+    if _WAREHOUSE is None:
+        _WAREHOUSE = Warehouse(DEFAULT_WAREHOUSE)
+    _WAREHOUSE.record(code, fight, analyzer, version, metrics)
+
+
+# -------------------- CLI --------------------
+
+def mmss_from_ms(ms: Number) -> str:
+    s = int(ms) // 1000
+    m, s = divmod(s, 60)
+    return f"{m}:{s:02d}"
+
+
+def _fmt(metric: str, v: Optional[Number]) -> str:
+    if v is None:
+        return "-"
+    if metric.endswith("_ms"):
+        return mmss_from_ms(v)
+    if metric.endswith("_pct"):
+        return f"{v:.1f}%"
+    return f"{v:,.0f}" if float(v).is_integer() else f"{v:,.2f}"
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Kill history recorded by the analysis scripts.")
+    ap.add_argument("--db", default=DEFAULT_WAREHOUSE or "wcl_results.sqlite", help="Warehouse SQLite file")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="Recorded analyzers and metrics")
+    tr = sub.add_parser("trend", help="One metric across recorded kills")
+    tr.add_argument("analyzer")
+    tr.add_argument("metric")
+    tr.add_argument("--label")
+    tr.add_argument("--boss")
+    tr.add_argument("--version", type=int)
+    args = ap.parse_args(None if argv is None else list(argv))
+
+    wh = Warehouse(args.db)
+    try:
+        if args.cmd == "list":
+            for analyzer, version, metric, kills in wh.metrics():
+                print(f"{analyzer:<12s} v{version:<3d} {metric:<24s} {kills:>5d} kills")
+            return
+        rows = wh.trend(args.analyzer, args.metric, label=args.label, boss=args.boss, version=args.version)
+        if not rows:
+            print(f"No recorded {args.analyzer}.{args.metric} values.")
+            return
+        for r in rows:
+            label = f"{r['label']}" + (f"[{r['n']}]" if r["n"] else "")
+            print(f"{r['code']:<18s} {r['fight']:>4d}  {str(r['boss']):<20s} {label:<12s} "
+                  f"{_fmt(args.metric, r['value']):>10s}   (kill {mmss_from_ms(r['duration_ms'])})")
+    finally:
+        wh.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Shared Warcraft Logs v2 client helpers used by the per-boss scripts.
+
+Reports and events can also be served from a local event store instead of the
+API: set WCL_EVENT_STORE to a database written by `event_store.py ingest`, or
+call set_backend(). WCL_BUNDLE (a file from `bundle.py export`) is stricter:
+everything comes from the bundle and any request it can't answer fails
+immediately instead of going to the network.
+"""
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import requests
+
+API_URL = "https://classic.warcraftlogs.com/api/v2/client"
+TOKEN_URL = "https://classic.warcraftlogs.com/oauth/token"
+
+# The events API accepts limit in [EVENTS_MIN_LIMIT, EVENTS_MAX_LIMIT] (its own default is 300).
+EVENTS_MIN_LIMIT = 100
+EVENTS_MAX_LIMIT = 10000
+
+# Running totals for every gql() call in this process (requests, response bytes).
+REQUEST_STATS: Dict[str, int] = {"requests": 0, "bytes": 0}
+_STATS_LOCK = threading.Lock()
+_THREAD = threading.local()
+
+
+_UNSET = object()
+_BACKEND: Any = _UNSET
+_OFFLINE = False
+
+
+class OfflineError(RuntimeError):
+    pass
+
+
+def set_backend(backend: Any, offline: bool = False) -> None:
+    """
+    Serve fetch_report / fetch_events_page from backend (e.g. an EventStore); None forces the API.
+    offline=True also makes gql() refuse to touch the network.
+    """
+    global _BACKEND, _OFFLINE
+    _BACKEND = backend
+    _OFFLINE = offline
+
+
+def get_backend() -> Any:
+    global _BACKEND, _OFFLINE
+    if _BACKEND is _UNSET:
+        bundle = os.getenv("WCL_BUNDLE")
+        path = os.getenv("WCL_EVENT_STORE")
+        if bundle:
+            from bundle import load_bundle
+            _BACKEND, _OFFLINE = load_bundle(bundle), True
+        elif path:
+            from event_store import EventStore
+            _BACKEND = EventStore(path)
+        else:
+            _BACKEND = None
+    return _BACKEND
+
+
+def is_offline() -> bool:
+    get_backend()
+    return _OFFLINE
+
+
+# -------------------- HTTP / GQL --------------------
+
+def get_token(client_id: str, client_secret: str, token_url: str = TOKEN_URL) -> str:
+    if is_offline():
+        return ""  # offline: nothing to authenticate against
+    if not client_id or not client_secret:
+        raise SystemExit("Missing WCL_CLIENT_ID / WCL_CLIENT_SECRET environment variables.")
+    r = requests.post(
+        token_url,
+        data={"grant_type": "client_credentials"},
+        auth=(client_id, client_secret),
+        timeout=30,
+    )
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+def thread_stats() -> Dict[str, int]:
+    """
+    Running totals like REQUEST_STATS, for gql() calls made on the current thread only.
+    Diff two reads to measure one step while other threads are fetching too.
+    """
+    stats = getattr(_THREAD, "stats", None)
+    if stats is None:
+        stats = _THREAD.stats = {"requests": 0, "bytes": 0}
+    return stats
+
+
+def gql(headers: Dict[str, str], query: str, variables: Dict[str, Any], api_url: str = API_URL) -> Dict[str, Any]:
+    if is_offline():
+        raise OfflineError(f"no local answer for query {' '.join(query.split())[:80]!r} {variables}")
+    r = requests.post(api_url, json={"query": query, "variables": variables}, headers=headers, timeout=30)
+    r.raise_for_status()
+    mine = thread_stats()
+    mine["requests"] += 1
+    mine["bytes"] += len(r.content)
+    with _STATS_LOCK:
+        REQUEST_STATS["requests"] += 1
+        REQUEST_STATS["bytes"] += len(r.content)
+    payload = r.json()
+    if payload.get("errors"):
+        raise RuntimeError(payload["errors"])
+    return payload["data"]
+
+
+# -------------------- REPORT / EVENTS --------------------
+
+REPORT_QUERY = """
+query($code: String!) {
+  reportData {
+    report(code: $code) {
+      title
+      fights {
+        id name kill startTime endTime difficulty size
+        enemyNPCs { id gameID }
+        friendlyPlayers
+      }
+      masterData { actors(type: "Player") { id name } }
+    }
+  }
+}
+"""
+
+
+def fetch_report(
+    headers: Dict[str, str],
+    code: str,
+    api_url: str = API_URL,
+) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Returns (title, fights, player_actors).
+    Fights carry enemyNPCs/friendlyPlayers so actors can be resolved per fight
+    (see tot_npcs); masterData is limited to player names.
+    """
+    backend = get_backend()
+    if backend is not None:
+        return backend.fetch_report(code)
+    data = gql(headers, REPORT_QUERY, {"code": code}, api_url=api_url)
+    rep = data["reportData"]["report"]
+    return rep["title"], (rep["fights"] or []), (rep["masterData"]["actors"] or [])
+
+
+REPORT_HEADER_QUERY = """
+query($code: String!) {
+  reportData {
+    report(code: $code) {
+      endTime
+      fights { id kill startTime endTime }
+    }
+  }
+}
+"""
+
+
+def fetch_report_header(headers: Dict[str, str], code: str, api_url: str = API_URL) -> Dict[str, Any]:
+    """
+    {"endTime", "fights": [{"id", "kill", "startTime", "endTime"}]}: the cheap query used to
+    tell whether a stored copy of a (possibly still live) report is current.
+    """
+    backend = get_backend()
+    if backend is not None:
+        _, fights, _ = backend.fetch_report(code)
+        fights = [{k: f.get(k) for k in ("id", "kill", "startTime", "endTime")} for f in fights]
+        return {"endTime": max((f["endTime"] or 0 for f in fights), default=0), "fights": fights}
+    data = gql(headers, REPORT_HEADER_QUERY, {"code": code}, api_url=api_url)
+    rep = data["reportData"]["report"]
+    return {"endTime": rep.get("endTime"), "fights": rep.get("fights") or []}
+
+
+def fetch_events_page(
+    headers: Dict[str, str],
+    code: str,
+    fight_id: Union[int, Sequence[int]],
+    start: int,
+    end: int,
+    data_type: str,
+    limit: Optional[int] = None,
+    hostility_type: Optional[str] = None,
+    translate: bool = False,
+    ability_id: Optional[int] = None,
+    target_id: Optional[int] = None,
+    filter_expression: Optional[str] = None,
+    api_url: str = API_URL,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    One events page for [start, end]: (events, nextPageTimestamp).
+    fight_id may be a list to read several fights as one stream.
+    Optional server-side filters are only added to the query when set.
+    limit must be 100-10000 for the API, which defaults to 300; this client asks
+    for 5000 when none is given. A local backend serves the whole range as one
+    page unless a limit is given, and applies filter_expression itself
+    (filter_expr.py; unsupported syntax raises ValueError).
+    """
+    backend = get_backend()
+    if backend is not None:
+        events, nxt = backend.fetch_events_page(
+            code, fight_id, start, end, data_type,
+            hostility_type=hostility_type, ability_id=ability_id, target_id=target_id,
+        )
+        if filter_expression:
+            from filter_expr import compile_filter
+
+            keep = compile_filter(filter_expression)
+            events = [e for e in events if keep(e)]
+        if limit is not None and len(events) > limit:
+            # like the API, never split a timestamp across pages: the next page starts at it
+            cut = max(1, limit)
+            last = events[cut - 1].get("timestamp")
+            while cut < len(events) and events[cut].get("timestamp") == last:
+                cut += 1
+            if cut < len(events):
+                events, nxt = events[:cut], events[cut].get("timestamp")
+        return events, nxt
+
+    args = ""
+    if hostility_type:
+        args += f"\n            hostilityType: {hostility_type}"
+    if translate:
+        args += "\n            translate: true"
+    if ability_id is not None:
+        args += f"\n            abilityID: {int(ability_id)}"
+    if target_id is not None:
+        args += f"\n            targetID: {int(target_id)}"
+    if filter_expression:
+        args += "\n            filterExpression: $filter"
+
+    query = f"""
+    query($code: String!, $fightIDs: [Int]!, $pageStart: Float!, $end: Float!{", $filter: String" if filter_expression else ""}) {{
+      reportData {{
+        report(code: $code) {{
+          events(
+            fightIDs: $fightIDs
+            startTime: $pageStart
+            endTime: $end
+            dataType: {data_type}{args}
+            limit: {5000 if limit is None else int(limit)}
+          ) {{
+            data
+            nextPageTimestamp
+          }}
+        }}
+      }}
+    }}
+    """
+    fight_ids = [fight_id] if isinstance(fight_id, int) else list(fight_id)
+    variables: Dict[str, Any] = {"code": code, "fightIDs": fight_ids, "pageStart": start, "end": end}
+    if filter_expression:
+        variables["filter"] = filter_expression
+
+    data = gql(headers, query, variables, api_url=api_url)
+    ev = data["reportData"]["report"]["events"]
+    events = [e for e in (ev.get("data") or []) if isinstance(e, dict)]
+    return events, (ev.get("nextPageTimestamp") or None)
+
+
+def iter_events(
+    headers: Dict[str, str],
+    code: str,
+    fight_id: Union[int, Sequence[int]],
+    fight_start: int,
+    fight_end: int,
+    data_type: str,
+    start_override: Optional[int] = None,
+    end_override: Optional[int] = None,
+    hostility_type: Optional[str] = None,
+    translate: bool = False,
+    filter_expression: Optional[str] = None,
+    api_url: str = API_URL,
+) -> Iterable[Dict[str, Any]]:
+    """
+    Correct paging: startTime is ONLY the paging cursor; endTime fixed.
+    """
+    page_start = start_override if isinstance(start_override, int) else fight_start
+    fixed_end = end_override if isinstance(end_override, int) else fight_end
+
+    while True:
+        events, nxt = fetch_events_page(
+            headers, code, fight_id, page_start, fixed_end, data_type,
+            hostility_type=hostility_type, translate=translate,
+            filter_expression=filter_expression, api_url=api_url,
+        )
+        yield from events
+
+        if not nxt:
+            break
+        page_start = nxt
+
+
+# -------------------- FIGHT SELECTION --------------------
+
+def pick_kills(fights: List[Dict[str, Any]], fight_name: str) -> List[Dict[str, Any]]:
+    return [
+        f for f in fights
+        if isinstance(f, dict)
+        and (f.get("name") == fight_name)
+        and (f.get("kill") is True)
+        and isinstance(f.get("startTime"), int)
+        and isinstance(f.get("endTime"), int)
+        and isinstance(f.get("id"), int)
+    ]
+
+
+def fight_player_ids(fight: Dict[str, Any]) -> Set[int]:
+    return {i for i in (fight.get("friendlyPlayers") or []) if isinstance(i, int)}